@@ -41,16 +41,27 @@ except ImportError:
     pass
 
 import atexit
+import cProfile
 import errno
 import getpass
+import heapq
+import itertools
+import json
 import logging
+import operator
 import os
+import pstats
+import re
 # Used by raw_input, when imported
 import readline  # NOQA: F401
+import shutil
 import sys
+import time
 
 from base64 import b64encode
-from typing import Callable, List, Optional
+from concurrent import futures
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
 
 import click
 import httplib2
@@ -64,7 +75,19 @@ logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(message)s',
 atexit.register(logging.shutdown)
 
 
-from . import (template, utils)
+from . import (cache, daemon, duplicates, journal, models, output, prefetch,
+               progress, proxy, snapshot, stats, store, template, timeline,
+               trace, utils, watch, webhook)
+
+#: Maximum number of projects to fetch concurrently
+MAX_WORKERS = 16
+
+#: Commands that support operating on multiple projects
+MULTI_PROJECT_COMMANDS = ('list', 'search', 'webhook-listen')
+
+#: Commands that can queue changes in the journal
+JOURNAL_COMMANDS = ('close', 'comment', 'edit', 'label', 'milestone', 'open',
+                    'reopen')
 
 
 class ProjectNameParamType(click.ParamType):
@@ -91,29 +114,97 @@ class ProjectNameParamType(click.ParamType):
              context_settings={'help_option_names': ['-h', '--help']})
 @click.version_option(_version.dotted)
 @click.option('--pager/--no-pager', help='Pass output through a pager.')
-@click.option('-p', '--project', type=ProjectNameParamType(),
-              default=utils.get_repo(),
-              help='GitHub project to operate on.')
+@click.option('-p', '--project', 'projects', type=ProjectNameParamType(),
+              multiple=True,
+              help='GitHub project to operate on, may be repeated for list '
+                   'and search.')
 @click.option('-u', '--host-url',
-              default=utils.get_git_config_val('hubugs.host-url',
-                                               'https://api.github.com'),
+              default=lambda: utils.get_git_config_val(
+                  'hubugs.host-url', 'https://api.github.com'),
               help='GitHub Enterprise host to connect to.')
+@click.option('--trace', 'trace_file', metavar='FILE',
+              type=click.Path(dir_okay=False, writable=True),
+              help='Write trace of requests and rendering to file.')
+@click.option('--profile', is_flag=True,
+              help='Profile command, and write statistics to stderr.')
+@click.option('--local', is_flag=True,
+              help='Read from the local issue store, without network access.')
+@click.option('--async', 'defer', is_flag=True,
+              help='Queue changes, and send them in the background.')
 @click.pass_context
-def cli(ctx: click.Context, pager: bool, project: str, host_url: str):
+def cli(ctx: click.Context, pager: bool, projects: List[str], host_url: str,
+        trace_file: str, profile: bool, local: bool, defer: bool):
     """Main command entry point.
 
     Args:
         ctx: Current command context
         pager: Whether to page output
-        project: GitHub project name
+        projects: GitHub project names
         host: Hostname to connect to
+        trace_file: File to write trace events to
+        profile: Whether to profile command
+        local: Whether to serve command from local store
+        defer: Whether to queue changes in the journal
     """
-    ctx.obj = utils.setup_environment(project, host_url)
+    if trace_file:
+        tracer = trace.enable()
+        start = tracer.timestamp()
+
+        def write_trace():
+            tracer.complete(ctx.invoked_subcommand, 'command', start,
+                            tracer.timestamp() - start)
+            trace.disable(trace_file)
+        ctx.call_on_close(write_trace)
+    if profile:
+        profiler = cProfile.Profile()
+
+        def write_profile():
+            profiler.disable()
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(40)
+        ctx.call_on_close(write_profile)
+        profiler.enable()
+    if ctx.invoked_subcommand in ('daemon', 'journal', 'prefetch', 'proxy'):
+        # Daemons, the journal, prefetching and the proxy aren’t tied to a
+        # project, they serve requests for any
+        return
+    if defer and ctx.invoked_subcommand not in JOURNAL_COMMANDS:
+        raise click.UsageError('Only {} support --async'.format(
+            ', '.join(JOURNAL_COMMANDS)))
+    projects = list(projects)
+    if not projects and ctx.invoked_subcommand in MULTI_PROJECT_COMMANDS:
+        setting = utils.get_git_config_val('hubugs.projects')
+        if setting:
+            projects = [ProjectNameParamType().convert(p, None, ctx)
+                        for p in re.split(r'[\s,]+', setting.strip())]
+    if not projects:
+        projects = [utils.get_repo(), ]
+    if len(projects) > 1 \
+            and ctx.invoked_subcommand not in MULTI_PROJECT_COMMANDS:
+        raise click.UsageError('Only {} support multiple projects'.format(
+            ', '.join(MULTI_PROJECT_COMMANDS)))
+    ctx.obj = utils.setup_environment(projects[0], host_url)
     ctx.obj.update({
         'host_url': host_url,
+        'local': False,
         'pager': pager,
-        'project': project,
+        'project': projects[0],
+        'projects': projects,
+        'queued': None,
     })
+    if local:
+        store.localise(ctx.obj)
+    queue = journal.Journal()
+    if defer:
+        journal.defer(ctx.obj, queue)
+
+        def flush():
+            if ctx.obj.queued:
+                journal.spawn_flusher()
+        ctx.call_on_close(flush)
+    elif not local and not queue.empty() and queue.pending():
+        # Changes left over from an earlier run, perhaps one that was offline
+        journal.spawn_flusher()
 
 
 # Convenience wrappers for defining command arguments
@@ -149,6 +240,42 @@ def text_parser(__f: Callable) -> Callable:
     return __f
 
 
+def format_parser(__f: Callable) -> Callable:
+    __f = click.option('-F', '--format', 'output_format', default='text',
+                       type=click.Choice(['text', ] + list(output.FORMATS)),
+                       help='Output format.')(__f)
+    __f = click.option('--fields', metavar='FIELDS',
+                       help='Comma separated fields for machine readable '
+                            'output.')(__f)
+    return __f
+
+
+def write_records(__pages: Iterable[List[Dict[str, Any]]], __format: str,
+                  __fields: Optional[str]):
+    """Write API objects in a machine readable format.
+
+    Args:
+        __pages: Batches of records to write
+        __format: Output format
+        __fields: Comma separated fields to write
+    """
+    fields = __fields.split(',') if __fields else None
+    with output.RecordWriter(click.get_text_stream('stdout'), __format,
+                             fields) as writer:
+        for page in __pages:
+            writer.write(page)
+
+
+def prefetch_parser(__f: Callable) -> Callable:
+    __f = click.option('--prefetch', 'prefetch_count', metavar='COUNT',
+                       type=click.IntRange(0),
+                       default=lambda: int(utils.get_git_config_val(
+                           'hubugs.prefetch', '0')),
+                       help='Fetch first COUNT bugs in the background, '
+                            'ready for show.')(__f)
+    return __f
+
+
 def label_parser(__f: Callable) -> Callable:
     __f = click.option('-a', '--add', multiple=True,
                        help='Add label to issue.')(__f)
@@ -196,64 +323,395 @@ def setup(globs: AttrDict, local: bool):
     success('Configuration complete!')
 
 
+def fan_out(__globs: AttrDict, __fetch: Callable[[str], Any]) -> List[Any]:
+    """Run a fetch for each of the selected projects concurrently.
+
+    Args:
+        __globs: Global argument configuration
+        __fetch: Function to call with each project name
+
+    Returns:
+        Results, in project order
+    """
+    if len(__globs.projects) == 1:
+        return [__fetch(__globs.projects[0]), ]
+    workers = min(len(__globs.projects), MAX_WORKERS)
+    with futures.ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(__fetch, __globs.projects))
+
+
+def write_merged(__streams: List[Iterable[List[Dict[str, Any]]]],
+                 __order: str, __format: str, __fields: Optional[str],
+                 __projects: List[str]):
+    """Write per-project record streams in merged order.
+
+    Each stream is consumed in a background thread, so all projects are
+    fetched concurrently, and records are written as soon as their position
+    in the merged output is known.
+
+    Args:
+        __streams: Batches of records for each project, in ``__order``
+        __order: Field streams are sorted by
+        __format: Output format
+        __fields: Comma separated fields to write
+        __projects: Project name for each stream
+    """
+    if len(__streams) == 1:
+        write_records(__streams[0], __format, __fields)
+        return
+    if __fields:
+        fields = __fields
+    elif __format in ('csv', 'tsv'):
+        fields = ','.join(('repository', ) + output.DEFAULT_FIELDS)
+    else:
+        fields = None
+    key = 'updated_at' if __order == 'updated' else 'number'
+    records = [utils.tag_records(utils.prefetch(stream), repository=project)
+               for stream, project in zip(__streams, __projects)]
+    merged = heapq.merge(*records, key=operator.itemgetter(key))
+    write_records(([record, ] for record in merged), __format, fields)
+
+
+def render_merged(__globs: AttrDict, __results: List[List[Any]],
+                  __order: str, **extras) -> Tuple[List[Tuple[str, Any]],
+                                                   str]:
+    """Render bugs from one or more projects.
+
+    Args:
+        __globs: Global argument configuration
+        __results: Sorted bugs for each project
+        __order: Sorting order for displaying bugs
+        extras: Additional values to pass to templates
+
+    Returns:
+        Project and bug for each displayed bug in display order, and the
+        rendered output
+    """
+    if len(__results) == 1:
+        merged = [(__globs.project, bug) for bug in __results[0]]
+        result = template.display_bugs(__results[0], __order,
+                                       project=__globs.repo_obj(), **extras)
+    else:
+        attr = 'updated_at' if __order == 'updated' else 'number'
+        streams = [[(project, bug) for bug in bugs]
+                   for project, bugs in zip(__globs.projects, __results)]
+        merged = list(heapq.merge(
+            *streams, key=lambda pair: getattr(pair[1], attr)))
+        result = template.display_bugs([bug for _, bug in merged], __order,
+                                       repos=[repo for repo, _ in merged],
+                                       project=None, **extras)
+    return merged, result
+
+
+def display_merged(__globs: AttrDict, __results: List[List[Any]],
+                   __order: str, **extras) -> List[Tuple[str, Any]]:
+    """Display bugs from one or more projects.
+
+    Args:
+        __globs: Global argument configuration
+        __results: Sorted bugs for each project
+        __order: Sorting order for displaying bugs
+        extras: Additional values to pass to templates
+
+    Returns:
+        Project and bug for each displayed bug, in display order
+    """
+    merged, result = render_merged(__globs, __results, __order, **extras)
+    if result:
+        utils.pager(result, pager=__globs.pager)
+    return merged
+
+
+def render_key(__globs: AttrDict, __command: str,
+               __validators: List[Optional[str]],
+               __templates: List[Tuple[str, str]], **args) -> Optional[str]:
+    """Build key for reusing rendered output.
+
+    Args:
+        __globs: Global argument configuration
+        __command: Command output is rendered for
+        __validators: ``ETag`` of each response output is rendered from
+        __templates: Group and name of each template used
+        args: Command arguments that change output
+
+    Returns:
+        Key for output, or ``None`` if output can’t be reused
+    """
+    if __globs.local or not all(__validators):
+        return None
+    return cache.RenderCache.key(
+        _version.dotted, __command, __globs.host_url, __globs.projects,
+        __validators, [template.template_sources(*t) for t in __templates],
+        # Width truncates titles, and colour and highlighting are only
+        # applied to terminals
+        shutil.get_terminal_size()[0], sys.stdout.isatty(), args)
+
+
+def reused_output(__globs: AttrDict,
+                  __key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Find earlier output that can be reused.
+
+    Stored output is only reused while the relative times it contains, such
+    as “about two hours ago”, still read the same.
+
+    Args:
+        __globs: Global argument configuration
+        __key: Key for output, see :func:`render_key`
+
+    Returns:
+        Stored output as ``text``, along with any values stored with it
+    """
+    if __key:
+        entry = __globs.rendered.get(__key)
+        if entry and template.relative_times_current(entry['relative']):
+            return entry
+    return None
+
+
+def render_cached(__globs: AttrDict, __key: Optional[str],
+                  __render: Callable[[], Tuple[str, Dict[str, Any]]]
+                  ) -> Dict[str, Any]:
+    """Reuse rendered output, or render and store it.
+
+    Args:
+        __globs: Global argument configuration
+        __key: Key for output, see :func:`render_key`
+        __render: Function returning output and any values needed alongside
+            it
+
+    Returns:
+        Output as ``text``, along with values from ``__render``
+    """
+    entry = reused_output(__globs, __key)
+    if entry:
+        return entry
+    with template.record_relative_times() as stamps:
+        text, extra = __render()
+    entry = dict(extra, text=text, relative=stamps)
+    if __key:
+        __globs.rendered.put(__key, entry)
+    return entry
+
+
+def refresh_indexes(__host_url: str, __project: str, __bugs: List[Any]):
+    """Update completion and duplicate indexes with fetched bugs.
+
+    Args:
+        __host_url: GitHub host bugs were fetched from
+        __project: GitHub project bugs belong to
+        __bugs: Fetched bugs
+    """
+    cache.CompletionIndex(__host_url, __project).refresh('issues', __bugs)
+    duplicates.DuplicateIndex(__host_url, __project).refresh(__bugs)
+
+
+def display_listing(__globs: AttrDict, __command: str,
+                    __responses: List[List[Tuple[httplib2.Response, bytes]]],
+                    __decode: Callable[[bytes], List[Any]], __order: str,
+                    __args: Dict[str, Any], **extras) -> List[Tuple[str, int]]:
+    """Display bugs from listing responses, reusing earlier output.
+
+    Responses are only decoded when the output must be rendered.
+
+    Args:
+        __globs: Global argument configuration
+        __command: Command output is rendered for
+        __responses: Responses for each project
+        __decode: Function to decode bugs from a response body
+        __order: Sorting order for displaying bugs
+        __args: Command arguments that change output, besides ``extras``
+        extras: Additional values to pass to templates
+
+    Returns:
+        Project and number for each displayed bug, in display order
+    """
+    key = render_key(__globs, __command,
+                     [r.get('etag') for rs in __responses for r, _ in rs],
+                     [('view', 'list.txt'), ], order=__order, args=__args,
+                     extras=extras)
+
+    def render():
+        results = []
+        for project, responses in zip(__globs.projects, __responses):
+            bugs = list(itertools.chain.from_iterable(
+                __decode(c) for _, c in responses))
+            refresh_indexes(__globs.host_url, project, bugs)
+            results.append(template.sort_bugs(bugs, __order))
+        merged, text = render_merged(__globs, results, __order, **extras)
+        return text, {'shown': [(p, bug.number) for p, bug in merged]}
+    entry = render_cached(__globs, key, render)
+    utils.pager(entry['text'], pager=__globs.pager)
+    return [tuple(target) for target in entry['shown']]
+
+
+def prefetch_bugs(__globs: AttrDict, __shown: List[Tuple[str, int]],
+                  __count: int):
+    """Start fetching the first displayed bugs in the background.
+
+    Args:
+        __globs: Global argument configuration
+        __shown: Project and number for each displayed bug
+        __count: Number of bugs to fetch
+    """
+    if __count:
+        prefetch.spawn(__globs.host_url, __shown[:__count])
+
+
+def snapshot_listing() -> bool:
+    """Check whether text listings can be read from local snapshots.
+
+    Returns:
+        Whether ``view/list.txt`` only uses fields kept in snapshots
+    """
+    fields = template.template_fields('view', 'list.txt')
+    if fields is None or not fields <= snapshot.FIELDS:
+        return False
+    # Snapshot labels and milestones only have names, which is all the
+    # built-in template uses
+    return not fields & {'labels', 'milestone'} \
+        or template.list_formatter() is not None
+
+
 @cli.command(name='list')
 @click.option('-l', '--label', multiple=True,
               help='List bugs with specified label.')
-@click.option('-p', '--page', help='Page number.', type=click.INT,
-              default=1)
+@click.option('-p', '--page', help='Page number.', type=click.INT)
 @click.option('-r', '--pull-requests', is_flag=True,
               help='List only pull requests.')
 @attrib_parser
+@format_parser
+@prefetch_parser
 @click.pass_obj
 def list_bugs(globs: AttrDict, label: List[str], page: int,
-              pull_requests: bool, order: str, state: str):
+              pull_requests: bool, order: str, state: str,
+              output_format: str, fields: str, prefetch_count: int):
     """Listing bugs."""
-    bugs = []
     params = {}
-    if pull_requests:
-        # FIXME: Dirty solution to supporting PRs only, needs rethink
-        url = '{}/repos/{}/pulls'.format(globs.host_url, globs.project)
-    else:
-        url = ''
-    if page != 1:
+    if page and page != 1:
         params['page'] = page
     if label:
         params['labels'] = ','.join(label)
 
+    def project_url(project):
+        # FIXME: Dirty solution to supporting PRs only, needs rethink
+        return '{}/repos/{}/{}'.format(globs.host_url, project,
+                                       'pulls' if pull_requests else 'issues')
+
+    if globs.local:
+        def fetch(project):
+            return globs.store.issues(project, state, label, pull_requests,
+                                      order)
+        if output_format != 'text':
+            write_merged([[fetch(p), ] for p in globs.projects], order,
+                         output_format, fields, globs.projects)
+        elif snapshot_listing():
+            def listing(project):
+                with snapshot.load(globs.store, globs.host_url,
+                                   project) as snap:
+                    return snap.issues(state, label, pull_requests, order)
+            display_merged(globs, [listing(p) for p in globs.projects], order,
+                           state=state)
+        else:
+            # Custom templates may use fields that snapshots don’t keep
+            display_merged(globs, [models.wrap(fetch(p), 'Issue')
+                                   for p in globs.projects],
+                           order, state=state)
+        return
+
+    if output_format != 'text':
+        # Let the API order results, so that they can be written as each page
+        # arrives.  All pages are fetched, unless a specific one is requested.
+        params.update({
+            'state': state,
+            'sort': 'updated' if order == 'updated' else 'created',
+            'direction': 'asc',
+        })
+        if not page:
+            params['per_page'] = 100
+        streams = []
+        for project in globs.projects:
+            pages = globs.req_pages(project_url(project), params=params)
+            if page:
+                pages = itertools.islice(pages, 1)
+            streams.append(pages)
+        write_merged(streams, order, output_format, fields, globs.projects)
+        return
+
     states = ['open', 'closed'] if state == 'all' else [state, ]
-    for state in states:
-        _params = params.copy()
-        _params['state'] = state
-        r, _bugs = globs.req_get(url, params=_params, model='Issue')
-        bugs.extend(_bugs)
-
-    result = template.display_bugs(bugs, order, state=state,
-                                   project=globs.repo_obj())
-    if result:
-        utils.pager(result, pager=globs.pager)
+    fields = template.listing_fields()
+
+    def fetch(project):
+        responses = []
+        for state in states:
+            _params = params.copy()
+            _params['state'] = state
+            responses.append(globs.req_get(project_url(project),
+                                           params=_params, is_json=False))
+        return responses
+
+    shown = display_listing(
+        globs, 'list', fan_out(globs, fetch),
+        lambda c: models.decode(c, 'Issue', fields=fields), order,
+        {'params': params, 'pull_requests': pull_requests}, state=states[-1])
+    prefetch_bugs(globs, shown, prefetch_count)
 
 
 @cli.command()
 @attrib_parser
+@format_parser
+@prefetch_parser
 @click.argument('term')
 @click.pass_obj
-def search(globs: AttrDict, order: str, state: str, term: str):
+def search(globs: AttrDict, order: str, state: str, output_format: str,
+           fields: str, prefetch_count: int, term: str):
     """Searching bugs."""
+    if globs.local:
+        def fetch(project):
+            return globs.store.search(project, term, state, order)
+        if output_format != 'text':
+            write_merged([[fetch(p), ] for p in globs.projects], order,
+                         output_format, fields, globs.projects)
+        else:
+            display_merged(globs, [models.wrap(fetch(p), 'Issue')
+                                   for p in globs.projects],
+                           order, term=term, state=state)
+        return
+
     search_url = '{}/search/issues'.format(globs.host_url)
+    if output_format != 'text':
+        streams = []
+        for project in globs.projects:
+            query = '{} repo:{}'.format(term, project)
+            if state != 'all':
+                query += ' state:{}'.format(state)
+            params = {
+                'q': query,
+                'sort': 'updated' if order == 'updated' else 'created',
+                'order': 'asc',
+                'per_page': 100,
+            }
+            streams.append(globs.req_pages(search_url, params=params,
+                                           key='items'))
+        write_merged(streams, order, output_format, fields, globs.projects)
+        return
     states = ['open', 'closed'] if state == 'all' else [state, ]
-    params = {
-        'q': term,
-        'repo': globs.project,
-    }
-    bugs = []
-    for state in states:
-        params['state'] = state
-        r, c = globs.req_get(search_url, params=params, model='issue')
-        bugs.extend(c.issues)
-    result = template.display_bugs(bugs, order, term=term, state=state,
-                                   project=globs.repo_obj())
-    if result:
-        utils.pager(result, pager=globs.pager)
+    fields = template.listing_fields()
+
+    def fetch(project):
+        responses = []
+        for state in states:
+            params = {
+                'q': '{} repo:{} state:{}'.format(term, project, state),
+            }
+            responses.append(globs.req_get(search_url, params=params,
+                                           is_json=False))
+        return responses
+
+    shown = display_listing(
+        globs, 'search', fan_out(globs, fetch),
+        lambda c: models.decode(c, 'Issue', fields=fields).items, order, {},
+        term=term, state=states[-1])
+    prefetch_bugs(globs, shown, prefetch_count)
 
 
 @cli.command()
@@ -264,49 +722,265 @@ def search(globs: AttrDict, order: str, state: str, term: str):
               help='Display only the patch content of pull requests.')
 @click.option('-b', '--browse', is_flag=True,
               help='Open bug in web browser.')
+@click.option('-H', '--history', is_flag=True,
+              help='Show bug’s timeline of events.')
+@format_parser
 @bugs_parser
 @click.pass_obj
 def show(globs: AttrDict, full: bool, patch: bool, patch_only: bool,
-         browse: bool, bugs: List[int]):
+         browse: bool, history: bool, output_format: str, fields: str,
+         bugs: List[int]):
     """Displaying bugs."""
-    results = []
+    if output_format != 'text' and not browse:
+        write_records((show_records(globs, bug_no, full, patch or patch_only,
+                                    history)
+                       for bug_no in bugs), output_format, fields)
+        return
+    results = []  # type: List[Optional[str]]
+    # Issues that must be rendered, as their position in results, key for
+    # storing output and template context
+    pending = []  # type: List[Tuple[int, Optional[str], Dict[str, Any]]]
     tmpl = template.get_template('view', '/issue.txt')
+    history_tmpl = template.get_template('view', 'timeline.txt')
     for bug_no in bugs:
         if browse:
             click.launch('https://github.com/{}/issues/{:d}'.format(
                 globs.project, bug_no))
             continue
-        r, bug = globs.req_get(bug_no, model='Issue')
-
-        if full and bug.comments:
-            r, comments = globs.req_get('{}/comments'.format(bug_no),
-                                        model='Comment')
+        if globs.local:
+            bug = models.wrap(local_bug(globs, bug_no), 'Issue')
+            comments = models.wrap(
+                globs.store.comments(globs.project, bug_no), 'Comment')
+            bug_patch = None
+            key = None
         else:
-            comments = []
-        if (patch or patch_only) and bug.pull_request:
-            url = '{}/repos/{}/pulls/{}'.format(globs.host_url, globs.project,
-                                                bug_no)
-            headers = {'Accept': 'application/vnd.github.patch'}
-            r, c = globs.req_get(url, headers=headers, is_json=False)
-            patch = c.decode('utf-8')
+            r, bug = globs.req_get(bug_no, model='Issue')
+            refresh_indexes(globs.host_url, globs.project, [bug, ])
+            validators = [r.get('etag'), ]
+
+            if full and bug.comments:
+                # All pages are needed to know whether earlier output is
+                # reusable
+                comments = list(fetch_comments(globs, bug_no, validators))
+            else:
+                comments = []
+            if (patch or patch_only) and bug.pull_request:
+                url = '{}/repos/{}/pulls/{}'.format(globs.host_url,
+                                                    globs.project, bug_no)
+                headers = {'Accept': 'application/vnd.github.patch'}
+                r, c = globs.req_get(url, headers=headers, is_json=False)
+                validators.append(r.get('etag'))
+                bug_patch = c.decode('utf-8')
+            else:
+                bug_patch = None
+            key = render_key(globs, 'show', validators,
+                             [('view', '/issue.txt'), ], bug=bug_no,
+                             full=full, patch=patch, patch_only=patch_only)
+        entry = reused_output(globs, key)
+        if entry:
+            results.append(entry['text'])
         else:
-            patch = None
-        results.append(tmpl.render(bug=bug, comments=comments, full=True,
-                                   patch=patch, patch_only=patch_only,
-                                   project=globs.repo_obj()))
+            pending.append((len(results), key, {
+                'bug': bug, 'comments': comments, 'full': True,
+                'patch': bug_patch, 'patch_only': patch_only,
+                'project': globs.repo_obj(),
+            }))
+            results.append(None)
+        if history:
+            results.append(history_tmpl.render(events=timeline.prepare(
+                fetch_history(globs, bug_no))))
+    # Rendering is independent for each issue, so large batches are spread
+    # over several processes
+    rendered = template.render_batch(tmpl.name,
+                                     [context for _, _, context in pending])
+    for (index, key, _), (text, stamps) in zip(pending, rendered):
+        results[index] = text
+        if key:
+            globs.rendered.put(key, {'text': text, 'relative': stamps})
     if results:
         utils.pager('\n'.join(results), pager=globs.pager)
 
 
+def fetch_comments(__globs: AttrDict, __bug_no: int,
+                   validators: Optional[List[Optional[str]]] = None
+                   ) -> Iterator[Any]:
+    """Fetch all of a bug’s comments.
+
+    Pages after the first are fetched concurrently, and comments are
+    returned as each page arrives so that rendering can start immediately.
+
+    Args:
+        __globs: Global argument configuration
+        __bug_no: Bug to fetch comments for
+        validators: List to append each page’s ``ETag`` to
+
+    Returns:
+        Comments, in order
+    """
+    pages = __globs.req_pages('{}/comments'.format(__bug_no),
+                              params={'per_page': 100},
+                              workers=utils.PAGE_WORKERS,
+                              validators=validators)
+    for page in pages:
+        yield from models.wrap(page, 'Comment')
+
+
+def fetch_history(__globs: AttrDict, __bug_no: int) -> List[Dict[str, Any]]:
+    """Fetch a bug’s timeline.
+
+    With ``--local`` only previously fetched events are available.
+
+    Args:
+        __globs: Global argument configuration
+        __bug_no: Bug to fetch timeline for
+
+    Returns:
+        Timeline events, oldest first
+    """
+    if __globs.local:
+        return timeline.TimelineCache(__globs.host_url,
+                                      __globs.project).get(__bug_no)
+    return timeline.fetch(__globs, __bug_no)[0]
+
+
+def show_records(__globs: AttrDict, __bug_no: int, __full: bool,
+                 __patch: bool,
+                 __history: bool = False) -> List[Dict[str, Any]]:
+    """Fetch a bug for machine readable output.
+
+    Args:
+        __globs: Global argument configuration
+        __bug_no: Bug to fetch
+        __full: Include comments
+        __patch: Include patch, for pull requests
+        __history: Include timeline events
+
+    Returns:
+        Bug, in a single record batch
+    """
+    if __globs.local:
+        bug = local_bug(__globs, __bug_no)
+        if __full:
+            bug['comments'] = __globs.store.comments(__globs.project,
+                                                     __bug_no)
+        if __history:
+            bug['timeline'] = fetch_history(__globs, __bug_no)
+        return [bug, ]
+    r, c = __globs.req_get(__bug_no, is_json=False)
+    bug = models.decode(c, raw=True)
+    if __full:
+        bug['comments'] = list(itertools.chain.from_iterable(
+            __globs.req_pages('{}/comments'.format(__bug_no),
+                              params={'per_page': 100},
+                              workers=utils.PAGE_WORKERS)))
+    if __patch and bug.get('pull_request'):
+        url = '{}/repos/{}/pulls/{}'.format(__globs.host_url, __globs.project,
+                                            __bug_no)
+        headers = {'Accept': 'application/vnd.github.patch'}
+        r, c = __globs.req_get(url, headers=headers, is_json=False)
+        bug['patch'] = c.decode('utf-8')
+    if __history:
+        bug['timeline'] = fetch_history(__globs, __bug_no)
+    return [bug, ]
+
+
+def local_bug(__globs: AttrDict, __bug_no: int) -> Dict[str, Any]:
+    """Fetch a bug from the local store.
+
+    Args:
+        __globs: Global argument configuration
+        __bug_no: Bug to fetch
+
+    Returns:
+        Bug
+
+    Raises:
+        LocalError: Bug isn’t in local store
+    """
+    bug = __globs.store.issue(__globs.project, __bug_no)
+    if not bug:
+        raise store.LocalError('No local copy of bug {:d}'.format(__bug_no))
+    return bug
+
+
+@cli.command(name='watch')
+@click.option('-l', '--label', multiple=True,
+              help='Watch bugs with specified label.')
+@click.option('-s', '--state', default='open',
+              type=click.Choice(['open', 'closed', 'all']),
+              help='State of bugs to list initially.')
+@click.option('-i', '--interval', default=watch.DEFAULT_INTERVAL,
+              metavar='SECONDS', type=click.IntRange(1),
+              help='Minimum delay between polls.')
+@click.option('-n', '--count', default=0, type=click.IntRange(0),
+              help='Exit after this many polls, 0 polls forever.')
+@format_parser
+@click.argument('bug', required=False, type=click.INT)
+@click.pass_obj
+def watch_cmd(globs: AttrDict, label: List[str], state: str, interval: int,
+              count: int, output_format: str, fields: str, bug: int):
+    """Watching for changes."""
+    params = {'state': state}
+    if label:
+        params['labels'] = ','.join(label)
+    watcher = watch.Watcher(globs, bug, params, interval)
+    if output_format != 'text':
+        writer = output.RecordWriter(click.get_text_stream('stdout'),
+                                     output_format,
+                                     fields.split(',') if fields else None)
+    else:
+        writer = None
+    polls = 0
+    try:
+        while True:
+            items = watcher.poll()
+            if writer:
+                writer.write(items)
+            elif bug and items:
+                tmpl = template.get_template('view', 'comments.txt')
+                click.echo(tmpl.render(bug=bug, comments=models.wrap(
+                    items, 'Comment')))
+            elif items:
+                click.echo(template.display_bugs(models.wrap(items, 'Issue'),
+                                                 'updated', state=state,
+                                                 project=globs.repo_obj()))
+            polls += 1
+            if count and polls >= count:
+                break
+            time.sleep(watcher.delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer:
+            writer.close()
+
+
+def save_draft(__title: str, __body: str) -> str:
+    """Keep text for a bug that wasn’t opened.
+
+    Args:
+        __title: Bug title
+        __body: Bug body
+
+    Returns:
+        Location of saved text
+    """
+    path = os.path.join(cache.cache_dir('drafts'), 'open-{}.mkd'.format(
+        time.strftime('%Y%m%dT%H%M%S')))
+    cache.write_atomic(path, '\n'.join([__title, __body]).encode('utf-8'))
+    return path
+
+
 @cli.command(name='open')
 @label_parser
 @stdin_parser
 @text_parser
+@click.option('--check/--no-check', default=True,
+              help='Warn about similar existing bugs.')
 @click.pass_obj
 def open_bug(globs: AttrDict, add: List[str], create: List[str], stdin: bool,
-             title: str, body: str):
+             title: str, body: str, check: bool):
     """Opening new bugs."""
-    utils.sync_labels(globs, add, create)
     if stdin:
         text = click.get_text_stream('stdin').readlines()
     elif not title:
@@ -317,8 +991,29 @@ def open_bug(globs: AttrDict, add: List[str], create: List[str], stdin: bool,
     else:
         title = title
         body = body
+    if check:
+        index = duplicates.DuplicateIndex(globs.host_url, globs.project)
+        matches = index.search(title, body)
+        if matches:
+            click.echo(warn('Possible duplicates:'), err=True)
+            for match in matches:
+                click.echo('  {:d} {}{} ({:.0%} similar)'.format(
+                    match['number'], match['title'],
+                    ' (closed)' if match['state'] == 'closed' else '',
+                    match['similarity']), err=True)
+            if not stdin and sys.stdin.isatty() \
+                    and not click.confirm('Open anyway?', default=True):
+                path = save_draft(title, body)
+                raise click.ClickException(
+                    'Bug not opened, text saved to {}'.format(path))
+    # Labels are only created once we know the bug will be opened
+    utils.sync_labels(globs, add, create)
     data = {'title': title, 'body': body, 'labels': add + create}
     r, bug = globs.req_post('', body=data, model='Issue')
+    if globs.queued is not None:
+        click.echo('Bug queued for opening')
+        return
+    refresh_indexes(globs.host_url, globs.project, [bug, ])
     success('Bug {:d} opened'.format(bug.number))
 
 
@@ -448,14 +1143,22 @@ def milestone(globs: AttrDict, milestone: str, bugs: List[int]):
     """Issue milestones."""
     milestones_url = '{}/repos/{}/milestones'.format(globs.host_url,
                                                      globs.project)
-    r, milestones = globs.req_get(milestones_url, model='Milestone')
+    milestones = globs.cached_get('milestones', milestones_url,
+                                  model='Milestone')
 
     milestone_mapping = dict((m.title, m.number) for m in milestones)
 
+    if milestone not in milestone_mapping:
+        # Milestone may have been created since our cached copy was made
+        globs.metadata.invalidate('milestones')
+        milestones = globs.cached_get('milestones', milestones_url,
+                                      model='Milestone')
+        milestone_mapping = dict((m.title, m.number) for m in milestones)
+
     try:
         milestone = milestone_mapping[milestone]
     except KeyError:
-        raise ValueError('No such milestone {:!r}'.format(milestone))
+        raise ValueError('No such milestone {!r}'.format(milestone))
 
     for bug_no in bugs:
         globs.req_post(bug_no, body={'milestone': milestone},
@@ -472,20 +1175,32 @@ def milestone(globs: AttrDict, milestone: str, bugs: List[int]):
 @click.option('-c', '--create', help='Create new milestone.')
 @click.option('-l', '--list', is_flag=True,
               help='List available milestones.')
+@click.option('-p', '--progress', is_flag=True,
+              help='Report progress for milestones.')
+@click.option('-w', '--weeks', default=8, type=click.IntRange(1),
+              help='Weeks of history to show in progress reports.')
 @click.pass_obj
 def milestones(globs: AttrDict, order: str, state: str, create: str,
-               list: bool):
+               list: bool, progress: bool, weeks: int):
     """Repository milestones."""
-    if not list and not create:
+    if not list and not create and not progress:
         fail('No action specified!')
         return 1
+    if progress:
+        show_progress(globs, order, state, weeks)
+        return
     milestones_url = '{}/repos/{}/milestones'.format(globs.host_url,
                                                      globs.project)
-    r, milestones = globs.req_get(milestones_url, model='Milestone')
+    if globs.local and list:
+        milestones = globs.cached_get('milestones', milestones_url,
+                                      model='Milestone')
+    else:
+        r, milestones = globs.req_get(milestones_url, model='Milestone')
+        globs.completion.refresh('milestones', milestones)
 
     if list:
         tmpl = template.get_template('view', '/list_milestones.txt')
-        columns = utils.T.width if utils.T.width else 80
+        columns = shutil.get_terminal_size()[0]
         max_id = max(i.number for i in milestones)
         id_len = len(str(max_id))
 
@@ -496,10 +1211,53 @@ def milestones(globs: AttrDict, order: str, state: str, create: str,
             utils.pager(result, pager=globs.pager)
     elif create:
         data = {'title': create}
-        r, milestone = globs.req_post('', body=data, model='Milestone')
+        r, milestone = globs.req_post(milestones_url, body=data,
+                                      model='Milestone')
+        globs.metadata.invalidate('milestones')
         success('Milestone {:d} created'.format(milestone.number))
 
 
+def show_progress(__globs: AttrDict, __order: str, __state: str,
+                  __weeks: int):
+    """Display milestone progress reports.
+
+    Args:
+        __globs: Global argument configuration
+        __order: Sort order for milestones
+        __state: State of milestones to report
+        __weeks: Weeks of history to show
+    """
+    totals, _ = progress.scan(__globs)
+    reports = progress.report(totals, __order, __state)
+    columns = shutil.get_terminal_size()[0]
+    tmpl = template.get_template('view', '/milestone_progress.txt')
+    result = tmpl.render(milestones=reports, weeks=__weeks,
+                         max_title=columns - 30, bar_width=columns - 22)
+    utils.pager(result, pager=__globs.pager)
+
+
+@cli.command(name='stats')
+@click.option('-t', '--top', 'limit', default=10, type=click.IntRange(1),
+              help='Number of labels, authors and assignees to show.')
+@click.option('-F', '--format', 'output_format', default='text',
+              type=click.Choice(['text', 'json']), help='Output format.')
+@click.pass_obj
+def stats_cmd(globs: AttrDict, limit: int, output_format: str):
+    """Statistics for a project’s bugs."""
+    columns = stats.IssueColumns()
+    params = {'state': 'all', 'sort': 'created', 'direction': 'asc',
+              'per_page': 100}
+    for page in globs.req_pages('', params=params):
+        columns.extend(page)
+    summary = stats.summarise(columns, limit)
+    if output_format == 'json':
+        click.echo(json.dumps(summary, indent=4))
+        return
+    tmpl = template.get_template('view', '/stats.txt')
+    result = tmpl.render(stats=summary, project=globs.repo_obj())
+    utils.pager(result, pager=globs.pager)
+
+
 @cli.command()
 @click.pass_obj
 def report_bug(globs: AttrDict):
@@ -526,21 +1284,157 @@ def report_bug(globs: AttrDict):
     success('Bug {:d} opened against hubugs, thanks!'.format(bug.number))
 
 
-def main() -> int:
+@cli.command(name='daemon')
+@click.option('-t', '--timeout', default=3600, metavar='SECONDS',
+              help='Exit after being idle, 0 to run until stopped.')
+@click.option('-d', '--detach', is_flag=True,
+              help='Run in the background.')
+@click.option('--status', is_flag=True, help='Show state of running daemon.')
+@click.option('--stop', is_flag=True, help='Stop running daemon.')
+def daemon_cmd(timeout: int, detach: bool, status: bool, stop: bool):
+    """Serve commands from a long running process."""
+    # When a daemon is running the client forwards these options to it, so
+    # we’re only asked to start one when there isn’t already one running
+    if daemon.SERVER:
+        if stop:
+            daemon.SERVER.stopping = True
+            click.echo('Daemon stopping')
+        elif status:
+            for key, value in sorted(daemon.status().items()):
+                click.echo('{}: {}'.format(key, value))
+        else:
+            raise click.ClickException('Daemon already running')
+    elif stop or status:
+        raise click.ClickException('Daemon not running')
+    else:
+        daemon.start(timeout, detach)
+
+
+@cli.group(name='journal')
+def journal_cmd():
+    """Inspect and send changes queued with --async."""
+
+
+@journal_cmd.command(name='status')
+def journal_status():
+    """Show changes waiting to be sent."""
+    entries = journal.Journal().entries()
+    failed = sum(1 for e in entries if e['error'])
+    click.echo('{} pending, {} failed'.format(len(entries) - failed, failed))
+    for entry in entries:
+        line = '{} {} {}'.format(entry['id'][:8], entry['time'],
+                                 journal.describe(entry))
+        if entry['error']:
+            line += ' (failed: {})'.format(entry['error'])
+        click.echo(line)
+
+
+@journal_cmd.command(name='flush')
+@click.option('--retry-failed', is_flag=True,
+              help='Resend changes that were rejected.')
+@click.option('--background', is_flag=True, hidden=True,
+              help='Exit quietly if changes are already being sent.')
+def journal_flush(retry_failed: bool, background: bool):
+    """Send queued changes now."""
+    queue = journal.Journal()
+    with journal.flusher_lock(queue, wait=not background) as locked:
+        if not locked:
+            return
+        counts = queue.flush(retry_failed)
+    if not background:
+        click.echo('{} sent, {} rejected, {} pending'.format(
+            counts['sent'], counts['rejected'], counts['pending']))
+
+
+@cli.command(name='prefetch', hidden=True)
+@click.argument('targets', nargs=-1)
+@click.pass_context
+def prefetch_cmd(ctx: click.Context, targets: List[str]):
+    """Fetch bugs into the HTTP cache."""
+    prefetch.fetch(ctx.parent.params['host_url'],
+                   [prefetch.parse_target(t) for t in targets])
+
+
+@cli.command(name='proxy')
+@click.option('-a', '--address', default='127.0.0.1',
+              help='Address to listen on.')
+@click.option('-P', '--port', default=proxy.DEFAULT_PORT,
+              help='Port to listen on.')
+@click.option('--max-entries', default=proxy.MAX_ENTRIES,
+              type=click.IntRange(1), help='Number of responses to cache.')
+@click.option('--public-url', metavar='URL',
+              help='URL clients reach the proxy at.')
+@click.pass_context
+def proxy_cmd(ctx: click.Context, address: str, port: int, max_entries: int,
+              public_url: str):
+    """Run a caching proxy for GitHub, to share between users."""
+    server = proxy.ProxyServer((address, port), ctx.parent.params['host_url'],
+                               max_entries, public_url)
+    click.echo('Proxying {} on {}'.format(server.upstream, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@cli.command(name='webhook-listen')
+@click.option('-a', '--address', default='127.0.0.1',
+              help='Address to listen on.')
+@click.option('-P', '--port', default=webhook.DEFAULT_PORT,
+              help='Port to listen on.')
+@click.option('--secret', envvar='HUBUGS_WEBHOOK_SECRET',
+              help='Webhook secret, defaults to hubugs.webhook-secret.')
+@click.option('--sync', is_flag=True,
+              help='Fetch a full copy of the projects before listening.')
+@click.pass_obj
+def webhook_listen(globs: AttrDict, address: str, port: int, secret: str,
+                   sync: bool):
+    """Receive webhooks to update the local issue store."""
+    if not secret:
+        secret = utils.get_git_config_val('hubugs.webhook-secret')
+    if not secret:
+        raise click.UsageError('No webhook secret set')
+    db = store.IssueStore(globs.host_url)
+    try:
+        if sync:
+            for project in globs.projects:
+                counts = db.sync(globs, project)
+                click.echo('{}: {} issues, {} comments, {} labels, '
+                           '{} milestones'.format(
+                               project, counts['issues'], counts['comments'],
+                               counts['labels'], counts['milestones']))
+        server = webhook.WebhookServer((address, port), secret, db)
+        click.echo('Listening for webhooks on {}'.format(server.url))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    finally:
+        db.close()
+
+
+def main(args: Optional[List[str]] = None) -> int:
     """Main command-line entry point.
 
+    Args:
+        args: Command line arguments, defaults to :data:`sys.argv`
+
     Returns:
         Exit code
     """
     try:
-        cli()
+        cli(args=args, prog_name='hubugs')
     except utils.HttpClientError as error:
         fail(error.content[0])
         return errno.EINVAL
     except httplib2.ServerNotFoundError:
         fail('Project lookup failed.  Network or GitHub down?')
         return errno.ENXIO
-    except (utils.RepoError) as error:
+    except (utils.RepoError, store.LocalError) as error:
         fail(error.args[0])
         return errno.EINVAL
     except (EnvironmentError, ValueError) as error:
@@ -0,0 +1,332 @@
+#
+"""cache - Local caches for hubugs."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from jnrbase.xdg_basedir import user_cache
+
+import hubugs_client
+
+
+#: Default lifetime for cached metadata, in seconds
+DEFAULT_TTL = 3600
+
+
+def cache_dir(*__parts: str) -> str:
+    """Find, and create, a hubugs cache directory.
+
+    Args:
+        __parts: Path components below the hubugs cache directory
+
+    Returns:
+        Location of cache directory
+    """
+    directory = os.path.join(str(user_cache('hubugs')), *__parts)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def write_atomic(__path: str, __data: bytes):
+    """Write file such that readers never see partial content.
+
+    Args:
+        __path: File to write
+        __data: Content to write
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(__path), prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(__data)
+        os.replace(tmp, __path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+class MetadataCache:
+
+    """On-disk cache for slowly changing repository metadata.
+
+    Repository information, labels and milestones rarely change, so we store
+    the raw API responses and reuse them until they are older than the
+    configured lifetime.
+
+    Attributes:
+        directory: Location of cached data for this project
+        ttl: Lifetime for cached entries, in seconds
+    """
+
+    def __init__(self, __host_url: str, __project: str,
+                 ttl: Optional[int] = DEFAULT_TTL):
+        """Configure a new metadata cache.
+
+        Args:
+            __host_url: GitHub host the metadata is fetched from
+            __project: GitHub project the metadata belongs to
+            ttl: Lifetime for cached entries, in seconds
+        """
+        host = urlparse(__host_url).netloc or __host_url
+        self.directory = cache_dir('metadata', host, *__project.split('/'))
+        self.ttl = ttl
+        self._memory = {}  # type: Dict[str, bytes]
+
+    def _path(self, __kind: str) -> str:
+        return os.path.join(self.directory, '{}.json'.format(__kind))
+
+    def get(self, __kind: str, __fetch: Callable[[], bytes]) -> bytes:
+        """Fetch metadata, using cached copy when it is fresh.
+
+        Args:
+            __kind: Metadata type
+            __fetch: Function to fetch raw data on cache misses
+
+        Returns:
+            Raw metadata
+        """
+        if __kind in self._memory:
+            return self._memory[__kind]
+        path = self._path(__kind)
+        data = None
+        if self.ttl:
+            with contextlib.suppress(OSError):
+                if time.time() - os.stat(path).st_mtime < self.ttl:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+        if data is None:
+            data = __fetch()
+            if self.ttl:
+                write_atomic(path, data)
+        self._memory[__kind] = data
+        return data
+
+    def invalidate(self, __kind: Optional[str] = None):
+        """Drop cached metadata.
+
+        Args:
+            __kind: Metadata type to drop, or all types if not given
+        """
+        if __kind:
+            kinds = [__kind, ]
+        else:
+            kinds = [os.path.splitext(s)[0] for s in os.listdir(self.directory)
+                     if s.endswith('.json')]
+            kinds.extend(self._memory)
+        for kind in kinds:
+            self._memory.pop(kind, None)
+            with contextlib.suppress(OSError):
+                os.unlink(self._path(kind))
+
+
+class RenderCache:
+
+    """On-disk store of rendered command output.
+
+    Entries are keyed by everything the output depends on, including the
+    validators of the API responses it was rendered from, so an identical
+    command whose responses were all revalidated can reuse the output
+    without decoding or rendering anything.
+
+    Attributes:
+        directory: Location of rendered output for this host
+    """
+
+    #: Maximum number of outputs to keep
+    MAX_ENTRIES = 128
+
+    def __init__(self, __host_url: str):
+        """Configure a new render cache.
+
+        Args:
+            __host_url: GitHub host output was fetched from
+        """
+        host = urlparse(__host_url).netloc or __host_url
+        self.directory = cache_dir('rendered', host)
+
+    @staticmethod
+    def key(*__parts: Any) -> str:
+        """Build key from output’s dependencies.
+
+        Args:
+            __parts: JSON serialisable values output depends on
+
+        Returns:
+            Key for output
+        """
+        data = json.dumps(__parts, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _path(self, __key: str) -> str:
+        return os.path.join(self.directory, '{}.json'.format(__key))
+
+    def get(self, __key: str) -> Optional[Dict[str, Any]]:
+        """Fetch rendered output.
+
+        Args:
+            __key: Key for output, see :meth:`key`
+
+        Returns:
+            Stored entry, if any
+        """
+        path = self._path(__key)
+        with contextlib.suppress(OSError, ValueError):
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            # Keep recently used output when pruning
+            os.utime(path)
+            return entry
+        return None
+
+    def put(self, __key: str, __entry: Dict[str, Any]):
+        """Store rendered output.
+
+        Args:
+            __key: Key for output, see :meth:`key`
+            __entry: Output, and any JSON serialisable values needed to reuse
+                it
+        """
+        write_atomic(self._path(__key), json.dumps(__entry).encode())
+        with contextlib.suppress(OSError):
+            entries = [e for e in os.scandir(self.directory)
+                       if e.name.endswith('.json')]
+            if len(entries) > self.MAX_ENTRIES:
+                entries.sort(key=lambda e: e.stat().st_mtime)
+                for entry in entries[:len(entries) - self.MAX_ENTRIES]:
+                    os.unlink(entry.path)
+
+
+class CompletionIndex:
+
+    """Compact index of values for shell completion.
+
+    The index is a directory of plain text files, one per type of value,
+    which :func:`hubugs_client.complete` can print without importing
+    :mod:`hubugs`.  It is refreshed from data that commands have already
+    fetched, so completion never touches the network.
+
+    Attributes:
+        directory: Location of index for this project
+    """
+
+    #: Maximum number of issues to keep in index
+    MAX_ISSUES = 2000
+
+    _lock = threading.Lock()
+
+    def __init__(self, __host_url: str, __project: str):
+        """Configure a new completion index.
+
+        Args:
+            __host_url: GitHub host the project is hosted on
+            __project: GitHub project the index is for
+        """
+        self.directory = hubugs_client.completion_dir(__host_url, __project)
+
+    @staticmethod
+    def _escape(__text: str) -> str:
+        return ' '.join(__text.split()).replace(':', '\\:')
+
+    def read(self, __kind: str) -> Dict[str, str]:
+        """Read entries from index.
+
+        Args:
+            __kind: Type of value to read
+
+        Returns:
+            Descriptions, keyed by escaped value
+        """
+        entries = {}
+        with contextlib.suppress(OSError):
+            with open(os.path.join(self.directory, __kind)) as f:
+                for line in f:
+                    value, _, description = line.rstrip('\n').partition(':')
+                    while value.endswith('\\') and description:
+                        extra, _, description = description.partition(':')
+                        value = ':'.join([value, extra])
+                    entries[value] = description
+        return entries
+
+    def update(self, __kind: str, __items: Iterable[Any]):
+        """Update index with freshly fetched objects.
+
+        Issues are merged with existing entries, as commands rarely fetch all
+        of a project’s issues.  Labels and milestones replace the existing
+        entries.
+
+        Args:
+            __kind: Type of value to update
+            __items: Issues, labels or milestones
+        """
+        with self._lock:
+            if __kind == 'issues':
+                entries = self.read(__kind)
+                for issue in __items:
+                    description = self._escape(issue.title)
+                    if issue.state == 'closed':
+                        description += ' (closed)'
+                    entries[str(issue.number)] = description
+                numbers = sorted(entries, key=int, reverse=True)
+                lines = ['{}:{}'.format(n, entries[n])
+                         for n in numbers[:self.MAX_ISSUES]]
+            elif __kind == 'labels':
+                lines = sorted(self._escape(label.name) for label in __items)
+            elif __kind == 'milestones':
+                lines = []
+                for m in __items:
+                    desc = getattr(m, 'description', None) or ''
+                    lines.append('{}:{}'.format(self._escape(m.title),
+                                                self._escape(desc)))
+            else:
+                raise ValueError('Unknown completion type {!r}'.format(__kind))
+            data = ''.join(line + '\n' for line in lines).encode()
+            path = os.path.join(self.directory, __kind)
+            with contextlib.suppress(OSError):
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        return
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(path, data)
+
+    def refresh(self, __kind: str, __items: Iterable[Any]) -> threading.Thread:
+        """Update index in the background.
+
+        The interpreter waits for the update to complete before exiting, but
+        the command’s output isn’t delayed by it.
+
+        Args:
+            __kind: Type of value to update
+            __items: Issues, labels or milestones
+
+        Returns:
+            Thread performing update
+        """
+        thread = threading.Thread(target=self.update,
+                                  args=(__kind, list(__items)))
+        thread.start()
+        return thread
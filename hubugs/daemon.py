@@ -0,0 +1,328 @@
+#
+"""daemon - Long running process for serving hubugs commands."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Commands are executed one at a time in this process, with the client’s
+# standard streams, environment and working directory swapped in for the
+# duration.  Everything else, imported modules, compiled templates, HTTP
+# connections and git configuration, is kept between commands.
+
+import array
+import contextlib
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import traceback
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import hubugs_client
+
+from . import (_version, utils)
+
+#: Running server, when this process is the daemon
+SERVER = None  # type: Optional[Server]
+
+
+def receive(__sock: socket.socket) -> Tuple[Dict[str, Any], List[int]]:
+    """Read a request message, along with passed file descriptors.
+
+    Args:
+        __sock: Socket to read from
+
+    Returns:
+        Request and file descriptors
+    """
+    fds = array.array('i')
+    data, ancillary, _, _ = __sock.recvmsg(
+        65536, socket.CMSG_SPACE(3 * fds.itemsize))
+    for level, kind, cmsg_data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            cmsg_data = cmsg_data[:len(cmsg_data) - len(cmsg_data)
+                                  % fds.itemsize]
+            fds.frombytes(cmsg_data)
+    data = hubugs_client.recv_exact(__sock, hubugs_client.HEADER.size, data)
+    size = hubugs_client.HEADER.unpack(data[:hubugs_client.HEADER.size])[0]
+    data = hubugs_client.recv_exact(__sock, hubugs_client.HEADER.size + size,
+                                    data)
+    request = json.loads(data[hubugs_client.HEADER.size:].decode())
+    return request, list(fds)
+
+
+@contextlib.contextmanager
+def hangup_interrupts(__sock: socket.socket):
+    """Interrupt command if the client disconnects.
+
+    The client only closes its connection early when it has been interrupted,
+    so the command is stopped rather than left to act on the user’s behalf.
+
+    Args:
+        __sock: Client connection
+    """
+    state = {'active': True}
+
+    def interrupt(signum, frame):
+        if state['active']:
+            state['active'] = False
+            raise KeyboardInterrupt
+
+    def watch():
+        readable, _, _ = select.select([__sock, wake_r], [], [])
+        if __sock not in readable:
+            return
+        try:
+            data = __sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            data = b''
+        if not data:
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+    previous = signal.signal(signal.SIGINT, interrupt)
+    wake_r, wake_w = os.pipe()
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        try:
+            state['active'] = False
+        finally:
+            os.write(wake_w, b'\0')
+            watcher.join()
+            os.close(wake_r)
+            os.close(wake_w)
+            signal.signal(signal.SIGINT, previous)
+
+
+def run(__argv: List[str]) -> int:
+    """Run a command in this process.
+
+    Args:
+        __argv: Command line arguments
+
+    Returns:
+        Command’s exit status
+    """
+    from . import main
+    try:
+        return main(__argv) or 0
+    except SystemExit as error:
+        if error.code is None:
+            return 0
+        elif isinstance(error.code, int):
+            return error.code
+        print(error.code, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        return 1
+
+
+class Handler(socketserver.BaseRequestHandler):
+
+    """Execute a single forwarded command."""
+
+    def handle(self):
+        """Handle command request."""
+        if not self.server.authorised(self.request):
+            return
+        request, fds = receive(self.request)
+        code = 1
+        try:
+            if len(fds) == 3:
+                with hangup_interrupts(self.request):
+                    code = self.server.execute(request, fds)
+        except KeyboardInterrupt:
+            # Client has gone, so there is nobody to report status to
+            code = 130
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+        finally:
+            for fd in fds:
+                os.close(fd)
+        with contextlib.suppress(OSError):
+            self.request.sendall(hubugs_client.STATUS.pack(code))
+
+
+class Server(socketserver.UnixStreamServer):
+
+    """Daemon accepting commands on a Unix domain socket.
+
+    Attributes:
+        started: Start time for daemon
+        served: Number of commands executed
+        stopping: Whether daemon will exit after current command
+    """
+
+    def __init__(self, __path: str, timeout: Optional[int] = 3600):
+        """Configure a new daemon.
+
+        Args:
+            __path: Location of socket
+            timeout: Exit after being idle for this many seconds
+        """
+        self.path = __path
+        self.timeout = timeout or None
+        self.started = time.time()
+        self.served = 0
+        self.stopping = False
+        os.makedirs(os.path.dirname(__path), mode=0o700, exist_ok=True)
+        super(Server, self).__init__(__path, Handler)
+
+    def server_bind(self):
+        """Bind socket, replacing any stale socket file."""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            with probe:
+                try:
+                    probe.connect(self.path)
+                except OSError:
+                    os.unlink(self.path)
+                else:
+                    raise OSError('Daemon already running on {!r}'.format(
+                        self.path))
+        old_umask = os.umask(0o177)
+        try:
+            super(Server, self).server_bind()
+        finally:
+            os.umask(old_umask)
+
+    def authorised(self, __sock: socket.socket) -> bool:
+        """Check client is running as the same user as the daemon.
+
+        Args:
+            __sock: Client connection
+
+        Returns:
+            Whether the client may issue commands
+        """
+        if not hasattr(socket, 'SO_PEERCRED'):
+            # Fall back on the socket’s file permissions
+            return True
+        creds = __sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                  struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', creds)
+        return uid == os.getuid()
+
+    def execute(self, __request: Dict[str, Any], __fds: List[int]) -> int:
+        """Run command with client’s streams, environment and directory.
+
+        Args:
+            __request: Client’s request
+            __fds: Client’s standard stream file descriptors
+
+        Returns:
+            Command’s exit status
+        """
+        saved_fds = [os.dup(n) for n in range(3)]
+        saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+        saved_env = dict(os.environ)
+        saved_cwd = os.getcwd()
+        try:
+            # Subprocesses, such as pagers and editors, need the client’s
+            # streams too
+            for n, fd in enumerate(__fds):
+                os.dup2(fd, n)
+            sys.stdin = open(0, closefd=False)
+            sys.stdout = open(1, 'w', closefd=False)
+            sys.stderr = open(2, 'w', closefd=False)
+            os.environ.clear()
+            os.environ.update(__request['env'])
+            os.chdir(__request['cwd'])
+            return run(__request['argv'])
+        finally:
+            for stream in (sys.stdin, sys.stdout, sys.stderr):
+                with contextlib.suppress(OSError):
+                    stream.close()
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            for n, fd in enumerate(saved_fds):
+                os.dup2(fd, n)
+                os.close(fd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            os.chdir(saved_cwd)
+            self.served += 1
+
+    def handle_timeout(self):
+        """Stop daemon when it has been idle for too long."""
+        self.stopping = True
+
+    def serve(self):
+        """Handle commands until stopped."""
+        global SERVER
+        SERVER = self
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            SERVER = None
+            self.server_close()
+            with contextlib.suppress(OSError):
+                os.unlink(self.path)
+
+
+def detach():
+    """Move process to background, detached from controlling terminal."""
+    if os.fork():
+        os._exit(0)
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    null = os.open(os.devnull, os.O_RDWR)
+    for n in range(3):
+        os.dup2(null, n)
+    os.close(null)
+
+
+def status() -> Dict[str, Any]:
+    """Report daemon state.
+
+    Returns:
+        Information about running daemon
+    """
+    return {
+        'pid': os.getpid(),
+        'socket': SERVER.path,
+        'version': _version.dotted,
+        'uptime': time.time() - SERVER.started,
+        'served': SERVER.served,
+    }
+
+
+def start(timeout: Optional[int] = 3600, background: bool = False):
+    """Start a daemon.
+
+    Args:
+        timeout: Exit after being idle for this many seconds
+        background: Detach daemon from terminal
+    """
+    server = Server(hubugs_client.socket_path(), timeout)
+    if background:
+        detach()
+    utils.CONFIG_CACHE = {}
+    server.serve()
@@ -0,0 +1,283 @@
+#
+"""duplicates - Local similarity index for spotting duplicate issues."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Each issue is reduced to a MinHash signature of the words in its title and
+# body.  The proportion of matching signature values estimates the Jaccard
+# similarity of two issues.  Signatures are stored a hash function at a time,
+# so a new issue is compared with every indexed issue by searching the bytes
+# of each column for the new issue’s value, without any API calls.
+#
+# The index is refreshed from issues that commands have already fetched.
+# Listings don’t include issue bodies, so an issue’s signature is only
+# replaced when its title changes or its body is available.
+
+import array
+import collections
+import contextlib
+import fcntl
+import json
+import operator
+import os
+import random
+import re
+import threading
+import zlib
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from . import cache
+
+#: Index format version
+VERSION = 1
+
+#: Number of hash functions in a signature
+PERMUTATIONS = 64
+
+#: Prime modulus for hash functions, larger than any CRC-32 value
+PRIME = (1 << 32) + 15
+
+#: Coefficients for hash functions
+COEFFICIENTS = [(r.randrange(1, PRIME), r.randrange(0, PRIME))
+                for r in [random.Random(VERSION)]
+                for _ in range(PERMUTATIONS)]
+
+#: Minimum estimated similarity to report
+THRESHOLD = 0.5
+
+#: Words too common to distinguish issues
+STOPWORDS = frozenset('''
+    a an and are as at be but by can do does for from has have how i if in is
+    it its not of on or so that the this to was when with
+'''.split())
+
+#: Suffixes removed from words before comparison
+SUFFIXES = re.compile(r'(?<=\w\w\w)(?:ing|ed|es|s)$')
+
+#: Signature for text without any words, which never matches
+EMPTY = array.array('I', [0xFFFFFFFF, ] * PERMUTATIONS)
+
+
+def shingles(__text: str) -> Set[str]:
+    """Break text in to features for comparison.
+
+    Common suffixes are removed, so that “crash”, “crashes” and “crashed”
+    match.
+
+    Args:
+        __text: Text to process
+
+    Returns:
+        Significant words
+    """
+    return set(SUFFIXES.sub('', w) for w in re.findall(r'\w+', __text.lower())
+               if len(w) > 1 and w not in STOPWORDS)
+
+
+def signature(__text: str) -> array.array:
+    """Calculate MinHash signature for text.
+
+    Args:
+        __text: Text to process
+
+    Returns:
+        Minimum value of each hash function over the text’s shingles
+    """
+    hashes = [zlib.crc32(s.encode()) for s in shingles(__text)]
+    if not hashes:
+        return EMPTY
+    return array.array('I', [min((a * h + b) % PRIME for h in hashes)
+                             & 0xFFFFFFFF for a, b in COEFFICIENTS])
+
+
+def similarity(__a: array.array, __b: array.array) -> float:
+    """Estimate Jaccard similarity from signatures.
+
+    Args:
+        __a: First signature
+        __b: Second signature
+
+    Returns:
+        Proportion of matching signature values
+    """
+    if __a == EMPTY or __b == EMPTY:
+        return 0.0
+    return sum(map(operator.eq, __a, __b)) / PERMUTATIONS
+
+
+class DuplicateIndex:
+
+    """On-disk similarity index for a project’s issues.
+
+    The index is stored as a line of JSON with each issue’s number, state,
+    title and whether its body was seen, followed by a column of unsigned
+    ints for each hash function holding every issue’s signature value.
+
+    Attributes:
+        path: Location of index
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, __host_url: str, __project: str):
+        """Configure a new duplicate index.
+
+        Args:
+            __host_url: GitHub host the project is hosted on
+            __project: GitHub project the index is for
+        """
+        host = urlparse(__host_url).netloc or __host_url
+        self.path = os.path.join(
+            cache.cache_dir('duplicates', host, *__project.split('/')),
+            'index')
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Take exclusive access to index, for updating.
+
+        Commands, prefetching and the daemon can all update the index, so
+        a lock file is held across processes while it is read and replaced.
+        """
+        with self._lock:
+            fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _load(self) -> Tuple[List[List[Any]], array.array]:
+        with contextlib.suppress(OSError, ValueError):
+            with open(self.path, 'rb') as f:
+                header, _, data = f.read().partition(b'\n')
+            meta = json.loads(header.decode('utf-8'))
+            if meta['version'] == VERSION:
+                signatures = array.array('I')
+                signatures.frombytes(data)
+                return meta['issues'], signatures
+        return [], array.array('I')
+
+    def read(self) -> Dict[int, Tuple[str, str, bool, array.array]]:
+        """Read index.
+
+        Returns:
+            State, title, whether the body was seen and signature, keyed by
+            issue number
+        """
+        issues, signatures = self._load()
+        count = len(issues)
+        return dict((number, (state, title, body,
+                              signatures[n::count] if count else EMPTY))
+                    for n, (number, state, title, body) in enumerate(issues))
+
+    def update(self, __issues: Iterable[Any]):
+        """Update index with freshly fetched issues.
+
+        Args:
+            __issues: Issues, with or without bodies
+        """
+        with self._locked():
+            entries = self.read()
+            changed = False
+            for issue in __issues:
+                body = getattr(issue, 'body', None)
+                current = entries.get(issue.number)
+                if current and current[1] == issue.title \
+                        and (body is None or current[2]):
+                    if current[0] != issue.state:
+                        entries[issue.number] = (issue.state, ) + current[1:]
+                        changed = True
+                    continue
+                entries[issue.number] = (
+                    issue.state, issue.title, body is not None,
+                    signature('\n'.join([issue.title, body or ''])))
+                changed = True
+            if not changed:
+                return
+            numbers = sorted(entries)
+            signatures = array.array('I')
+            for column in range(PERMUTATIONS):
+                signatures.extend(entries[n][3][column] for n in numbers)
+            header = json.dumps({
+                'version': VERSION,
+                'issues': [[n, ] + list(entries[n][:3]) for n in numbers],
+            })
+            cache.write_atomic(self.path, header.encode() + b'\n'
+                               + signatures.tobytes())
+
+    def refresh(self, __issues: Iterable[Any]) -> threading.Thread:
+        """Update index in the background.
+
+        See :meth:`hubugs.cache.CompletionIndex.refresh`.
+
+        Args:
+            __issues: Issues, with or without bodies
+
+        Returns:
+            Thread performing update
+        """
+        thread = threading.Thread(target=self.update, args=(list(__issues), ))
+        thread.start()
+        return thread
+
+    def search(self, __title: str, body: Optional[str] = None,
+               limit: int = 5,
+               threshold: float = THRESHOLD) -> List[Dict[str, Any]]:
+        """Find issues similar to a new issue.
+
+        Args:
+            __title: New issue’s title
+            body: New issue’s body
+            limit: Maximum number of issues to return
+            threshold: Minimum estimated similarity
+
+        Returns:
+            Number, state, title and similarity of matching issues, most
+            similar first
+        """
+        query = signature('\n'.join([__title, body or '']))
+        if query == EMPTY:
+            return []
+        issues, signatures = self._load()
+        count = len(issues)
+        data = signatures.tobytes()
+        width = signatures.itemsize
+        column_size = count * width
+        scores = collections.Counter()  # type: Dict[int, int]
+        for column, value in enumerate(query):
+            start = column * column_size
+            end = start + column_size
+            needle = array.array('I', [value, ]).tobytes()
+            offset = data.find(needle, start, end)
+            while offset != -1:
+                # Matches that aren’t aligned to a value are ignored
+                if (offset - start) % width == 0:
+                    scores[(offset - start) // width] += 1
+                offset = data.find(needle, offset + 1, end)
+        matches = []
+        for n, hits in scores.items():
+            score = hits / PERMUTATIONS
+            if score >= threshold:
+                number, state, title, _ = issues[n]
+                matches.append({'number': number, 'state': state,
+                                'title': title, 'similarity': score})
+        matches.sort(key=lambda m: (-m['similarity'], -m['number']))
+        return matches[:limit]
@@ -0,0 +1,445 @@
+#
+"""journal - Durable queue for deferred changes to issues."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# The journal is a file of JSON records, one per line, that is only ever
+# appended to while changes are pending.  Each change is written and synced to
+# disk before the command returns, and a later record marks it as sent or
+# failed.  Once nothing is left pending the file is rewritten to hold only
+# the failures, so it stays small.
+#
+# Changes to a single issue are sent in the order they were made, but changes
+# to different issues are sent concurrently.  Changes that aren’t tied to an
+# issue, such as creating labels or opening issues, are sent alone, after
+# everything queued before them and before anything queued after them.
+
+import contextlib
+import fcntl
+import itertools
+import json
+import os
+import re
+import time
+import uuid
+
+from concurrent import futures
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httplib2
+
+from jnrbase.attrdict import AttrDict
+from jnrbase.xdg_basedir import user_data
+
+from . import (cache, utils)
+
+#: Maximum number of changes to send concurrently
+MAX_WORKERS = 8
+
+#: Delays before retrying a change after a transient failure, in seconds
+RETRY_DELAYS = (1, 4, 16)
+
+#: Pattern matching URLs for a single issue, or its comments
+ISSUE_URL = re.compile(r'/repos/([^/]+/[^/]+)/issues/(\d+)(?:/comments)?$')
+
+
+def journal_path() -> str:
+    """Find location of the journal.
+
+    The directory is only created when changes are written, so that commands
+    which merely check the journal don’t touch the filesystem.
+
+    Returns:
+        Location of journal file
+    """
+    return os.path.join(str(user_data('hubugs')), 'journal.jsonl')
+
+
+def issue_key(__url: str) -> Optional[str]:
+    """Find the issue a change applies to.
+
+    Args:
+        __url: Change’s URL
+
+    Returns:
+        Project and issue number, or ``None`` if change isn’t tied to an issue
+    """
+    match = ISSUE_URL.search(__url)
+    if match:
+        return '{}#{}'.format(*match.groups())
+    return None
+
+
+def describe(__entry: Dict[str, Any]) -> str:
+    """Summarise a journal entry.
+
+    Args:
+        __entry: Journal entry
+
+    Returns:
+        Human readable description
+    """
+    key = issue_key(__entry['url'])
+    body = __entry['body'] or {}
+    if key and __entry['url'].endswith('/comments'):
+        action = 'comment'
+    elif key:
+        action = 'update {}'.format(', '.join(sorted(body)))
+    elif __entry['model'] == 'Issue':
+        action = 'open {!r}'.format(body.get('title'))
+        key = __entry['project']
+    else:
+        action = 'create {} {!r}'.format(__entry['model'].lower(),
+                                         body.get('name', body.get('title')))
+        key = __entry['project']
+    return '{} {}'.format(key, action)
+
+
+class TransientError(Exception):
+
+    """Change couldn’t be sent, but may succeed later."""
+
+
+class Journal:
+
+    """Append-only journal of changes waiting to be sent.
+
+    Attributes:
+        path: Location of journal file
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Configure a new journal.
+
+        Args:
+            path: Location of journal file
+        """
+        self.path = path or journal_path()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Open journal for exclusive access.
+
+        As the journal is replaced when it is compacted, the lock is retried
+        until it is held on the file that is currently in place.
+        """
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT,
+                         0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with contextlib.suppress(OSError):
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    break
+            os.close(fd)
+        try:
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _write(self, __records: List[Dict[str, Any]]):
+        data = ''.join(json.dumps(r, sort_keys=True) + '\n'
+                       for r in __records).encode()
+        with self._locked() as fd:
+            os.write(fd, data)
+            os.fsync(fd)
+
+    def append(self, __host_url: str, __project: str, __url: str,
+               __body: Optional[Dict[str, Any]],
+               __model: Optional[str]) -> Dict[str, Any]:
+        """Add a change to the journal.
+
+        The change is on disk when this returns.
+
+        Args:
+            __host_url: GitHub host the change is for
+            __project: GitHub project the change is for
+            __url: Absolute URL to ``POST`` to
+            __body: Request body
+            __model: Model of response
+
+        Returns:
+            Journal entry
+        """
+        entry = {
+            'op': 'post',
+            'id': uuid.uuid4().hex,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'host': __host_url,
+            'project': __project,
+            'url': __url,
+            'body': __body,
+            'model': __model,
+        }
+        self._write([entry, ])
+        return entry
+
+    def mark(self, __entry: Dict[str, Any], error: Optional[str] = None):
+        """Record outcome of sending a change.
+
+        Args:
+            __entry: Journal entry
+            error: Reason change was rejected, if it was
+        """
+        if error:
+            record = {'op': 'failed', 'id': __entry['id'], 'error': error}
+        else:
+            record = {'op': 'done', 'id': __entry['id']}
+        self._write([record, ])
+
+    def empty(self) -> bool:
+        """Check whether the journal holds any records, without reading it.
+
+        Returns:
+            ``True`` if the journal is missing or empty
+        """
+        try:
+            return not os.stat(self.path).st_size
+        except FileNotFoundError:
+            return True
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Changes that haven’t been sent.
+
+        Entries include an ``error`` key, holding the reason they were
+        rejected if they have failed.
+
+        Returns:
+            Unsent entries in the order they were queued
+        """
+        entries = []
+        failed = {}  # type: Dict[str, str]
+        done = set()
+        with contextlib.suppress(FileNotFoundError):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A partial line from an interrupted write, which was
+                        # never reported as queued
+                        continue
+                    if record['op'] == 'post':
+                        entries.append(record)
+                    elif record['op'] == 'done':
+                        done.add(record['id'])
+                    else:
+                        failed[record['id']] = record['error']
+        entries = [e for e in entries if e['id'] not in done]
+        for entry in entries:
+            entry['error'] = failed.get(entry['id'])
+        return entries
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Changes waiting to be sent.
+
+        Returns:
+            Entries that haven’t been sent or rejected
+        """
+        return [e for e in self.entries() if not e['error']]
+
+    def failed(self) -> List[Dict[str, Any]]:
+        """Changes rejected by GitHub.
+
+        Returns:
+            Entries that were rejected
+        """
+        return [e for e in self.entries() if e['error']]
+
+    def compact(self):
+        """Drop records for sent changes, if nothing is pending."""
+        with self._locked():
+            entries = self.entries()
+            if any(not e['error'] for e in entries):
+                return
+            records = []
+            for entry in entries:
+                error = entry.pop('error')
+                records.extend([entry, {'op': 'failed', 'id': entry['id'],
+                                        'error': error}])
+            cache.write_atomic(self.path, ''.join(
+                json.dumps(r, sort_keys=True) + '\n' for r in records
+            ).encode())
+
+    def send(self, __entry: Dict[str, Any], __post: Callable):
+        """Send a single change.
+
+        Args:
+            __entry: Journal entry
+            __post: Function to make ``POST`` request
+
+        Raises:
+            TransientError: Change couldn’t be sent
+            utils.HttpClientError: GitHub rejected change
+        """
+        try:
+            # Bodies are only decoded once we know the change was accepted, as
+            # server errors often come from proxies with HTML pages
+            r, _ = __post(__entry['url'], body=json.dumps(__entry['body']),
+                          model=__entry['model'], is_json=False)
+        except utils.HttpClientError as error:
+            if error.response.status in (408, 429) \
+                    or error.response.get('x-ratelimit-remaining') == '0':
+                raise TransientError(error.content)
+            raise
+        except (httplib2.HttpLib2Error, OSError) as error:
+            raise TransientError(str(error))
+        except ValueError as error:
+            # Client errors without a JSON body are from something other than
+            # GitHub, so may not recur
+            raise TransientError(str(error))
+        if r.status >= 500:
+            raise TransientError(r.reason)
+
+    def _send_all(self, __entries: List[Dict[str, Any]],
+                  __posts: Dict[Tuple[str, str], Callable],
+                  __delays: Tuple[int, ...]) -> Tuple[int, int]:
+        """Send a sequence of changes to one issue, in order.
+
+        Sending stops at the first change that can’t be sent, so that the
+        order is kept when they’re retried.
+        """
+        sent = rejected = 0
+        for entry in __entries:
+            post = __posts[(entry['host'], entry['project'])]
+            for delay in itertools.chain(__delays, [None, ]):
+                try:
+                    self.send(entry, post)
+                except TransientError:
+                    if delay is None:
+                        return sent, rejected
+                    time.sleep(delay)
+                except utils.HttpClientError as error:
+                    message = error.content
+                    if not isinstance(message, str):
+                        message = getattr(message, 'message', str(message))
+                    self.mark(entry, message)
+                    rejected += 1
+                    break
+                else:
+                    self.mark(entry)
+                    sent += 1
+                    break
+        return sent, rejected
+
+    def flush(self, retry_failed: bool = False,
+              delays: Tuple[int, ...] = RETRY_DELAYS,
+              post_factory: Optional[Callable[[str, str], Callable]] = None
+              ) -> Dict[str, int]:
+        """Send pending changes.
+
+        Args:
+            retry_failed: Also resend rejected changes
+            delays: Delays between retries of transient failures
+            post_factory: Function returning a ``POST`` function for a host
+                and project, defaults to one from
+                :func:`~hubugs.utils.setup_environment`
+
+        Returns:
+            Number of changes sent, rejected and left pending
+        """
+        if not post_factory:
+            def post_factory(host_url, project):
+                return utils.setup_environment(project, host_url).req_post
+        entries = self.entries()
+        if not retry_failed:
+            entries = [e for e in entries if not e['error']]
+        posts = {}
+        for entry in entries:
+            target = (entry['host'], entry['project'])
+            if target not in posts:
+                posts[target] = post_factory(*target)
+
+        counts = {'sent': 0, 'rejected': 0}
+
+        def run(groups):
+            with futures.ThreadPoolExecutor(MAX_WORKERS) as executor:
+                for sent, rejected in executor.map(
+                        lambda g: self._send_all(g, posts, delays),
+                        groups.values()):
+                    counts['sent'] += sent
+                    counts['rejected'] += rejected
+
+        groups = {}  # type: Dict[str, List[Dict[str, Any]]]
+        for entry in entries:
+            key = issue_key(entry['url'])
+            if key:
+                groups.setdefault(key, []).append(entry)
+            else:
+                # Changes not tied to an issue, such as label creation, may be
+                # needed by those that follow
+                run(groups)
+                groups = {}
+                run({None: [entry, ]})
+        run(groups)
+        self.compact()
+        counts['pending'] = len(self.pending())
+        return counts
+
+
+def defer(__globs: AttrDict, __journal: Journal):
+    """Queue changes in the journal, instead of sending them.
+
+    :func:`~hubugs.utils.setup_environment`’s ``req_post`` function is
+    replaced with one that appends to the journal, and returns ``None`` in
+    place of the response and content.
+
+    Args:
+        __globs: Global argument configuration
+        __journal: Journal to append to
+    """
+    def post(__url, body=None, model=None, **kwargs):
+        if not isinstance(__url, str) or not __url.startswith('http'):
+            __url = '{}/repos/{}/issues{}{}'.format(__globs.host_url,
+                                                    __globs.project,
+                                                    '/' if __url else '',
+                                                    __url)
+        __globs.queued.append(__journal.append(
+            __globs.host_url, __globs.project, __url, body, model))
+        return None, None
+    __globs.req_post = post
+    __globs.queued = []
+
+
+def spawn_flusher():
+    """Start a background process to send pending changes."""
+    utils.spawn_detached(['journal', 'flush', '--background'])
+
+
+@contextlib.contextmanager
+def flusher_lock(__journal: Journal, wait: bool = True):
+    """Ensure only one process sends changes at a time.
+
+    Args:
+        __journal: Journal being flushed
+        wait: Wait for lock, instead of failing if it is held
+
+    Yields:
+        Whether the lock was taken
+    """
+    os.makedirs(os.path.dirname(__journal.path), mode=0o700, exist_ok=True)
+    fd = os.open(__journal.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+    finally:
+        os.close(fd)
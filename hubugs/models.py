@@ -21,11 +21,30 @@
 import collections
 import contextlib
 import datetime
+import json
+import keyword
 
-from typing import Dict, Optional
+from typing import (AbstractSet, Any, Callable, Dict,  # NOQA: F401
+                    Iterator, Optional, Tuple)
 
 from jnrbase.iso_8601 import parse_datetime
 
+from . import trace
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+#: Available JSON decoders, taking raw response bytes, fastest first
+DECODERS = collections.OrderedDict()  # type: Dict[str, Callable[[bytes], Any]]
+if orjson:
+    DECODERS['orjson'] = orjson.loads
+DECODERS['json'] = lambda content: json.loads(content.decode('utf-8'))
+
+#: Name of JSON decoder in use
+DECODER = next(iter(DECODERS))
+
 # We used to use tight, explicit bindings for API objects but the desire to
 # support Python 3 and the lack of a usable binding library has made it
 # necessary to use the loose dynamic binding implemented below.
@@ -45,9 +64,186 @@ def object_hook(__d: Dict[str, str], __name: Optional[str] = 'unknown'):
     if '_links' in __d:
         __d.pop('_links')
     for k, v in __d.items():
+        # parse_datetime returns the current time for empty values
+        if not v or not isinstance(v, str):
+            continue
         with contextlib.suppress(TypeError, ValueError):
             __d[k] = parse_datetime(v).replace(tzinfo=None)
-    return collections.namedtuple(__d.get('type', __name), __d.keys())(**__d)
+    # rename is required to handle keys such as reactions’ ``+1``
+    return collections.namedtuple(__d.get('type', __name), __d.keys(),
+                                  rename=True)(*__d.values())
+
+
+def loads(__content: bytes) -> Any:
+    """Decode JSON with the selected decoder.
+
+    Args:
+        __content: Raw JSON
+
+    Returns:
+        Plain JSON values
+    """
+    return DECODERS[DECODER](__content)
+
+
+def _convert(__value: Any, __name: str) -> Any:
+    if isinstance(__value, dict):
+        return Model(__value, __name)
+    elif isinstance(__value, list):
+        return [_convert(v, __name) for v in __value]
+    elif __value and isinstance(__value, str):
+        # parse_datetime returns the current time for empty values
+        with contextlib.suppress(TypeError, ValueError):
+            return parse_datetime(__value).replace(tzinfo=None)
+    return __value
+
+
+class Model:
+
+    """Dot-accessible API object, converted lazily.
+
+    Values are converted on first access, with the same rules as
+    :func:`object_hook`: objects become :class:`Model` instances and
+    timestamps become :class:`~datetime.datetime` objects.  Fields are named
+    as they would be in a :func:`~collections.namedtuple` with ``rename``
+    set, so keys such as reactions’ ``+1`` are available as ``_<index>``.
+
+    Converted values are stored as instance attributes, so later lookups
+    don’t pass through :meth:`__getattr__`.
+    """
+
+    def __init__(self, __data: Dict[str, Any],
+                 __name: Optional[str] = 'unknown'):
+        """Wrap a plain JSON object.
+
+        Args:
+            __data: Object to wrap
+            __name: Fallback name, if object has no ``type`` key
+        """
+        # FIXME: Dump _links attributes for the time being
+        if '_links' in __data:
+            __data = dict((k, v) for k, v in __data.items() if k != '_links')
+        self._data = __data
+        self._name = __name
+        self._names = None  # type: Optional[Dict[str, str]]
+
+    def _keys(self) -> Dict[str, str]:
+        if self._names is None:
+            names = collections.OrderedDict()  # type: Dict[str, str]
+            for index, key in enumerate(self._data):
+                if not key.isidentifier() or keyword.iskeyword(key) \
+                        or key.startswith('_') or key in names:
+                    names['_{:d}'.format(index)] = key
+                else:
+                    names[key] = key
+            self._names = names
+        return self._names
+
+    def __getattr__(self, __attr: str) -> Any:
+        if __attr.startswith('__'):
+            raise AttributeError(__attr)
+        key = __attr if __attr in self._data else self._keys().get(__attr)
+        if key is None or (key == __attr and __attr.startswith('_')):
+            raise AttributeError(__attr)
+        value = _convert(self._data[key], self._name)
+        setattr(self, __attr, value)
+        return value
+
+    @property
+    def _fields(self) -> Tuple[str, ...]:
+        return tuple(self._keys())
+
+    def _asdict(self) -> Dict[str, Any]:
+        return collections.OrderedDict((f, getattr(self, f))
+                                       for f in self._fields)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Any]:
+        return (getattr(self, f) for f in self._fields)
+
+    def __eq__(self, __other: Any) -> bool:
+        if isinstance(__other, Model):
+            return self._data == __other._data
+        return NotImplemented
+
+    def __hash__(self):
+        # As with the named tuples this replaces, objects holding lists are
+        # unhashable
+        return hash(tuple(self))
+
+    def __reduce__(self):
+        return (Model, (self._data, self._name))
+
+    def __repr__(self) -> str:
+        return '{}({})'.format(self._data.get('type', self._name), ', '.join(
+            '{}={!r}'.format(f, v) for f, v in self._asdict().items()))
+
+
+def project(__record: Dict[str, Any],
+            __fields: AbstractSet[str]) -> Dict[str, Any]:
+    """Drop unwanted fields from an API object.
+
+    Args:
+        __record: Plain JSON object
+        __fields: Fields to keep
+
+    Returns:
+        Object with only the given fields
+    """
+    return dict((k, v) for k, v in __record.items() if k in __fields)
+
+
+def decode(__content: bytes, __name: Optional[str] = 'unknown',
+           raw: bool = False,
+           fields: Optional[AbstractSet[str]] = None) -> Any:
+    """Decode an API response.
+
+    The response is decoded with the selected :data:`DECODER`, and API
+    objects are :class:`Model` instances that convert their values lazily.
+
+    When ``fields`` is given each object in a listing, or in a search
+    result’s ``items``, is reduced to those fields before API objects are
+    built, so the rest of the response can be freed immediately.
+
+    Args:
+        __content: Raw response body
+        __name: Fallback name for objects, if they have no ``type`` key
+        raw: Return plain JSON values, instead of API objects
+        fields: Top-level fields to keep, defaults to all
+
+    Returns:
+        Decoded API objects
+    """
+    with trace.span('decode', 'json', model=__name, bytes=len(__content)):
+        data = loads(__content)
+        if raw:
+            return data
+        if fields is not None:
+            if isinstance(data, dict) and isinstance(data.get('items'),
+                                                     list):
+                data['items'] = [project(i, fields) for i in data['items']]
+            elif isinstance(data, list):
+                data = [project(i, fields) for i in data]
+            else:
+                data = project(data, fields)
+        return wrap(data, __name)
+
+
+def wrap(__value: Any, __name: Optional[str] = 'unknown') -> Any:
+    """Create API objects from plain JSON values.
+
+    Args:
+        __value: Value, as returned by :func:`decode` with ``raw`` set
+        __name: Fallback name for objects, if they have no ``type`` key
+
+    Returns:
+        API objects, as returned by :func:`decode`
+    """
+    if isinstance(__value, (dict, list)):
+        return _convert(__value, __name)
+    return __value
 
 
 def _v2_conv_timestamp(__s: str):
@@ -0,0 +1,145 @@
+#
+"""output - Machine readable output for hubugs."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import csv
+import json
+
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+
+#: Supported output formats
+FORMATS = ('json', 'jsonl', 'csv', 'tsv')
+
+#: Fields written by tabular formats, when none are chosen
+DEFAULT_FIELDS = ('number', 'state', 'title', 'labels', 'user', 'updated_at')
+
+
+def field(__record: Dict[str, Any], __name: str) -> Any:
+    """Fetch a field from a record.
+
+    Args:
+        __record: API object
+        __name: Field name, with dots separating nested fields
+
+    Returns:
+        Field’s value, or ``None`` if it doesn’t exist
+    """
+    value = __record
+    for part in __name.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def flatten(__value: Any) -> str:
+    """Format a value for a tabular output cell.
+
+    Users, labels and milestones are represented by their name, lists are
+    joined with commas, and any other object is written as JSON.
+
+    Args:
+        __value: Value to format
+
+    Returns:
+        Cell text
+    """
+    if __value is None:
+        return ''
+    elif isinstance(__value, bool):
+        return 'true' if __value else 'false'
+    elif isinstance(__value, list):
+        return ','.join(flatten(v) for v in __value)
+    elif isinstance(__value, dict):
+        for key in ('login', 'name', 'title'):
+            if key in __value:
+                return str(__value[key])
+        return json.dumps(__value, sort_keys=True)
+    return str(__value)
+
+
+class RecordWriter:
+
+    """Incremental writer for API objects.
+
+    Records are written, and the stream flushed, as each batch arrives so that
+    consumers can start work before a listing completes.
+
+    Attributes:
+        count: Number of records written
+    """
+
+    def __init__(self, __stream: TextIO, __format: str,
+                 fields: Optional[List[str]] = None):
+        """Configure a new writer.
+
+        Args:
+            __stream: Stream to write to
+            __format: Output format, see :data:`FORMATS`
+            fields: Fields to write, defaults to :data:`DEFAULT_FIELDS` for
+                tabular formats, and complete records otherwise
+        """
+        if __format not in FORMATS:
+            raise ValueError('Unknown output format {!r}'.format(__format))
+        self._stream = __stream
+        self._format = __format
+        self._fields = fields
+        self.count = 0
+        if __format in ('csv', 'tsv'):
+            if not fields:
+                self._fields = list(DEFAULT_FIELDS)
+            self._csv = csv.writer(__stream, lineterminator='\n',
+                                   dialect='excel-tab' if __format == 'tsv'
+                                   else 'excel')
+            self._csv.writerow(self._fields)
+
+    def __enter__(self) -> 'RecordWriter':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _project(self, __record: Dict[str, Any]) -> Dict[str, Any]:
+        if not self._fields:
+            return __record
+        return dict((name, field(__record, name)) for name in self._fields)
+
+    def write(self, __records: Iterable[Dict[str, Any]]):
+        """Write a batch of records.
+
+        Args:
+            __records: API objects to write
+        """
+        for record in __records:
+            if self._format in ('csv', 'tsv'):
+                self._csv.writerow([flatten(field(record, name))
+                                    for name in self._fields])
+            elif self._format == 'jsonl':
+                self._stream.write(json.dumps(self._project(record)) + '\n')
+            else:
+                self._stream.write('[\n' if self.count == 0 else ',\n')
+                self._stream.write(json.dumps(self._project(record)))
+            self.count += 1
+        self._stream.flush()
+
+    def close(self):
+        """Finish output."""
+        if self._format == 'json':
+            self._stream.write('\n]\n' if self.count else '[]\n')
+        self._stream.flush()
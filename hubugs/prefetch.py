@@ -0,0 +1,143 @@
+#
+"""prefetch - Warm the HTTP cache for bugs that are likely to be shown."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Prefetching makes exactly the requests ``show --full`` would, so its
+# responses are stored under the same keys in the HTTP cache.  Whether
+# a later ``show`` is answered from the cache outright, or with a cheap
+# revalidation, then depends only on how long GitHub allows responses to be
+# cached for.
+
+import contextlib
+
+from concurrent import futures
+from typing import Dict, List, Tuple
+
+import httplib2
+
+from . import (models, utils)
+
+#: Maximum number of bugs to fetch concurrently
+MAX_WORKERS = 4
+
+#: Requests left unused from the rate limit, so that prefetching never
+#: starves interactive commands
+RESERVE = 500
+
+#: Request headers bypassing cached responses
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+
+def parse_target(__target: str) -> Tuple[str, int]:
+    """Split a ``project#number`` bug reference.
+
+    Args:
+        __target: Bug reference
+
+    Returns:
+        Project name and bug number
+    """
+    project, number = __target.rsplit('#', 1)
+    return project, int(number)
+
+
+def budget(__host_url: str, __project: str) -> int:
+    """Find how many requests prefetching may make.
+
+    Args:
+        __host_url: GitHub host to check
+        __project: GitHub project to check with
+
+    Returns:
+        Requests available beyond :data:`RESERVE`, or ``0`` if the rate limit
+        can’t be checked
+    """
+    req_get = utils.setup_environment(__project, __host_url).req_get
+    try:
+        # Checking the rate limit doesn’t count against it
+        r, c = req_get('{}/rate_limit'.format(__host_url), headers=NO_CACHE,
+                       model='RateLimit')
+    except (utils.HttpClientError, httplib2.HttpLib2Error, OSError,
+            ValueError):
+        return 0
+    if r.status != 200:
+        return 0
+    return max(c.rate.remaining - RESERVE, 0)
+
+
+def fetch(__host_url: str, __targets: List[Tuple[str, int]]) -> Dict[str, int]:
+    """Fetch bugs, and their comments, into the HTTP cache.
+
+    Bugs are fetched concurrently, in order of priority, until the rate limit
+    budget is spent.
+
+    Args:
+        __host_url: GitHub host to fetch from
+        __targets: Project and number for each bug, in order of priority
+
+    Returns:
+        Number of bugs and comment listings fetched
+    """
+    if not __targets:
+        return {'bugs': 0, 'comments': 0}
+    allowed = budget(__host_url, __targets[0][0])
+    envs = {}
+    for project, _ in __targets:
+        if project not in envs:
+            envs[project] = utils.setup_environment(project, __host_url)
+            # Repository information is kept in the metadata cache
+            with contextlib.suppress(utils.HttpClientError, utils.RepoError):
+                envs[project].repo_obj()
+                allowed -= 1
+
+    def get(target):
+        project, number = target
+        req_get = envs[project].req_get
+        try:
+            r, c = req_get(number, is_json=False)
+            if models.loads(c).get('comments'):
+                # Must match the requests show makes for comments
+                for _ in envs[project].req_pages(
+                        '{}/comments'.format(number),
+                        params={'per_page': 100}, workers=utils.PAGE_WORKERS):
+                    pass
+                return 1
+        except utils.HttpClientError:
+            # Bug may have been deleted or moved since it was listed
+            pass
+        return 0
+
+    # Each bug may need a second request for its comments
+    targets = __targets[:allowed // 2]
+    with futures.ThreadPoolExecutor(MAX_WORKERS) as executor:
+        comments = sum(executor.map(get, targets))
+    return {'bugs': len(targets), 'comments': comments}
+
+
+def spawn(__host_url: str, __targets: List[Tuple[str, int]]):
+    """Start a background process to prefetch bugs.
+
+    Args:
+        __host_url: GitHub host to fetch from
+        __targets: Project and number for each bug, in order of priority
+    """
+    if __targets:
+        utils.spawn_detached(['--host-url', __host_url, 'prefetch'] + [
+            '{}#{}'.format(project, number) for project, number in __targets
+        ])
@@ -0,0 +1,287 @@
+#
+"""progress - Milestone progress reports from a single issue scan."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Every issue in any milestone is read in one paginated listing, and each page
+# is reduced to per-milestone totals as it arrives.  Totals from different
+# pages simply add up, so a page’s totals are stored against its ``ETag``.
+# When a page is unchanged its stored totals are reused, and it needn’t be
+# decoded again.
+
+import datetime
+import json
+import operator
+import os
+
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from jnrbase.attrdict import AttrDict
+
+from . import (cache, models, utils)
+
+#: Totals for each milestone, keyed by milestone number
+Totals = Dict[str, Dict[str, Any]]
+
+
+def week(__stamp: str) -> str:
+    """Find the week an API timestamp falls in.
+
+    Args:
+        __stamp: API timestamp
+
+    Returns:
+        Date of the Monday starting the week
+    """
+    date = datetime.datetime.strptime(__stamp[:10], '%Y-%m-%d').date()
+    return (date - datetime.timedelta(days=date.weekday())).isoformat()
+
+
+def aggregate(__issues: List[Dict[str, Any]]) -> Totals:
+    """Reduce issues to per-milestone totals.
+
+    Args:
+        __issues: Plain JSON issue objects
+
+    Returns:
+        Totals for each milestone
+    """
+    totals = {}  # type: Totals
+    for issue in __issues:
+        milestone = issue.get('milestone')
+        if not milestone:
+            continue
+        entry = totals.setdefault(str(milestone['number']), {
+            'milestone': {k: milestone.get(k) for k in
+                          ('number', 'title', 'state', 'due_on')},
+            'open': 0,
+            'closed': 0,
+            'labels': {},
+            'oldest': None,
+            'weeks': {},
+        })
+        state = issue['state']
+        entry[state] += 1
+        for label in issue['labels']:
+            counts = entry['labels'].setdefault(label['name'],
+                                                {'open': 0, 'closed': 0})
+            counts[state] += 1
+        if state == 'open':
+            if not entry['oldest'] \
+                    or issue['created_at'] < entry['oldest']['created_at']:
+                entry['oldest'] = {k: issue[k] for k in
+                                   ('number', 'title', 'created_at')}
+        created = entry['weeks'].setdefault(week(issue['created_at']),
+                                            [0, 0])
+        created[0] += 1
+        if issue.get('closed_at') and state == 'closed':
+            closed = entry['weeks'].setdefault(week(issue['closed_at']),
+                                               [0, 0])
+            closed[1] += 1
+    return totals
+
+
+def merge(__totals: Totals, __partial: Totals):
+    """Add a page’s totals to running totals.
+
+    Args:
+        __totals: Running totals, updated in place
+        __partial: Totals from a single page
+    """
+    for number, partial in __partial.items():
+        entry = __totals.get(number)
+        if not entry:
+            __totals[number] = json.loads(json.dumps(partial))
+            continue
+        entry['milestone'] = partial['milestone']
+        entry['open'] += partial['open']
+        entry['closed'] += partial['closed']
+        for name, counts in partial['labels'].items():
+            current = entry['labels'].setdefault(name,
+                                                 {'open': 0, 'closed': 0})
+            current['open'] += counts['open']
+            current['closed'] += counts['closed']
+        oldest = partial['oldest']
+        if oldest and (not entry['oldest'] or oldest['created_at']
+                       < entry['oldest']['created_at']):
+            entry['oldest'] = oldest
+        for key, (created, closed) in partial['weeks'].items():
+            current = entry['weeks'].setdefault(key, [0, 0])
+            current[0] += created
+            current[1] += closed
+
+
+class PageCache:
+
+    """On-disk store of page totals, keyed by the page’s ``ETag``.
+
+    Attributes:
+        path: Location of store
+    """
+
+    def __init__(self, __host_url: str, __project: str):
+        """Configure a new page cache.
+
+        Args:
+            __host_url: GitHub host the pages are fetched from
+            __project: GitHub project the pages belong to
+        """
+        host = urlparse(__host_url).netloc or __host_url
+        self.path = os.path.join(
+            cache.cache_dir('progress', host, *__project.split('/')),
+            'pages.json')
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self._pages = json.load(f)  # type: Dict[str, Totals]
+        except (OSError, ValueError):
+            self._pages = {}
+
+    def get(self, __etag: Optional[str]) -> Optional[Totals]:
+        """Fetch stored totals for a page.
+
+        Args:
+            __etag: Page’s ``ETag``
+
+        Returns:
+            Stored totals, if any
+        """
+        return self._pages.get(__etag) if __etag else None
+
+    def save(self, __pages: Dict[str, Totals]):
+        """Replace stored totals.
+
+        Pages that weren’t seen in the latest scan are dropped.
+
+        Args:
+            __pages: Totals for each page, keyed by ``ETag``
+        """
+        self._pages = __pages
+        cache.write_atomic(self.path, json.dumps(__pages).encode())
+
+
+def scan(__globs: AttrDict) -> Tuple[Totals, Dict[str, int]]:
+    """Total issues for every milestone in a project.
+
+    Args:
+        __globs: Global argument configuration
+
+    Returns:
+        Totals for each milestone, and the number of pages fetched and reused
+    """
+    pages = PageCache(__globs.host_url, __globs.project)
+    seen = {}  # type: Dict[str, Totals]
+    totals = {}  # type: Totals
+    stats = {'pages': 0, 'reused': 0}
+    url = ''
+    params = {'milestone': '*', 'state': 'all', 'sort': 'created',
+              'direction': 'asc', 'per_page': 100}
+    while url is not None:
+        r, c = __globs.req_get(url, params=params, is_json=False)
+        etag = r.get('etag')
+        partial = pages.get(etag)
+        stats['pages'] += 1
+        if partial is None:
+            partial = aggregate(models.decode(c, raw=True))
+        else:
+            stats['reused'] += 1
+        if etag:
+            seen[etag] = partial
+        merge(totals, partial)
+        # The next link includes our parameters
+        url = utils.parse_link(r.get('link')).get('next')
+        params = None
+    pages.save(seen)
+    return totals, stats
+
+
+def burndown(__weeks: Dict[str, List[int]],
+             until: Optional[datetime.date] = None) -> List[Tuple[str, int]]:
+    """Count open issues at the end of each week.
+
+    Args:
+        __weeks: Issues created and closed, keyed by week
+        until: Last week to report, defaults to the current week
+
+    Returns:
+        Week and open issue count, for each week since the first issue
+    """
+    if not __weeks:
+        return []
+    until = until or datetime.date.today()
+    day = datetime.datetime.strptime(min(__weeks), '%Y-%m-%d').date()
+    last = max(until - datetime.timedelta(days=until.weekday()),
+               datetime.datetime.strptime(max(__weeks), '%Y-%m-%d').date())
+    result = []
+    count = 0
+    while day <= last:
+        created, closed = __weeks.get(day.isoformat(), (0, 0))
+        count += created - closed
+        result.append((day.isoformat(), count))
+        day += datetime.timedelta(days=7)
+    return result
+
+
+def report(__totals: Totals, order: str = 'number',
+           state: Optional[str] = None,
+           now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """Build milestone progress reports.
+
+    Args:
+        __totals: Totals for each milestone
+        order: Sort order, one of ``number``, ``due_date`` or
+            ``completeness``
+        state: Only report milestones in this state
+        now: Time to calculate ages from, defaults to the current time
+
+    Returns:
+        Report for each milestone
+    """
+    now = now or datetime.datetime.utcnow()
+    reports = []
+    for entry in __totals.values():
+        milestone = entry['milestone']
+        if state and milestone['state'] != state:
+            continue
+        total = entry['open'] + entry['closed']
+        oldest = entry['oldest']
+        if oldest:
+            created = datetime.datetime.strptime(oldest['created_at'],
+                                                 '%Y-%m-%dT%H:%M:%SZ')
+            oldest = dict(oldest, age=(now - created).days)
+        reports.append({
+            'number': milestone['number'],
+            'title': milestone['title'],
+            'state': milestone['state'],
+            'due_on': milestone['due_on'],
+            'open': entry['open'],
+            'closed': entry['closed'],
+            'percent': 100 * entry['closed'] // total if total else 0,
+            'labels': sorted(entry['labels'].items()),
+            'oldest': oldest,
+            'burndown': burndown(entry['weeks'], now.date()),
+        })
+    if order == 'due_date':
+        def key(report):
+            # Milestones without a due date sort last
+            return report['due_on'] is None, report['due_on'] or ''
+    elif order == 'completeness':
+        key = operator.itemgetter('percent', 'number')
+    else:
+        key = operator.itemgetter('number')
+    return sorted(reports, key=key)
@@ -0,0 +1,390 @@
+#
+"""proxy - Shared caching proxy for the GitHub API."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Responses are cached in memory, keyed by a digest of the client’s
+# Authorization header so private data is never served to another token.
+# GitHub varies responses on Authorization, so even those it marks as
+# ``public`` may hold results only the requesting token can see, and are
+# never shared.  Anonymous clients share a single scope.  Stale
+# entries are revalidated with ``If-None-Match``, which doesn’t count against
+# GitHub’s rate limit, and concurrent identical requests are coalesced so
+# only one of them reaches GitHub.
+
+import collections
+import hashlib
+import json
+import logging
+import re
+import socketserver
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import httplib2
+
+from . import utils
+
+#: Default port to listen on
+DEFAULT_PORT = 8643
+
+#: Path metrics are served from
+METRICS_PATH = '/_hubugs/metrics'
+
+#: Default number of responses to keep
+MAX_ENTRIES = 4096
+
+#: Headers that only apply to a single connection, or that we recalculate
+HOP_HEADERS = frozenset(['connection', 'keep-alive', 'proxy-authenticate',
+                         'proxy-authorization', 'te', 'trailers',
+                         'transfer-encoding', 'upgrade', 'content-encoding',
+                         'content-length', 'content-location', 'host',
+                         'accept-encoding', 'status'])
+
+#: Client headers we handle ourselves for cached requests
+CONDITIONAL_HEADERS = frozenset(['if-none-match', 'if-modified-since'])
+
+
+class Entry:
+
+    """Cached response.
+
+    Attributes:
+        status: Response status
+        headers: Response headers
+        body: Response body
+        etag: Response’s ``ETag``
+        max_age: Seconds the response is fresh for
+        fetched: Time response was last fetched or revalidated
+    """
+
+    def __init__(self, __status: int, __headers: List[Tuple[str, str]],
+                 __body: bytes, __etag: Optional[str], __max_age: int):
+        self.status = __status
+        self.headers = __headers
+        self.body = __body
+        self.etag = __etag
+        self.max_age = __max_age
+        self.fetched = time.monotonic()
+
+    def fresh(self) -> bool:
+        """Check whether entry can be served without revalidation."""
+        return time.monotonic() - self.fetched < self.max_age
+
+
+def cache_control(__value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse a ``Cache-Control`` header.
+
+    Args:
+        __value: Header value
+
+    Returns:
+        Directives, and their values if any
+    """
+    directives = {}  # type: Dict[str, Optional[str]]
+    for part in (__value or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def scope(__authorization: Optional[str]) -> str:
+    """Derive a cache scope from credentials.
+
+    Args:
+        __authorization: ``Authorization`` header value
+
+    Returns:
+        Digest identifying the credentials, without revealing them
+    """
+    if not __authorization:
+        return 'anonymous'
+    return hashlib.sha256(__authorization.encode()).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    """Request handler for :class:`ProxyServer`."""
+
+    server_version = 'hubugs-proxy/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.info(format, *args)
+
+    def base_url(self) -> str:
+        """Find the URL the client reached us at."""
+        if self.server.public_url:
+            return self.server.public_url
+        host = self.headers.get('Host')
+        return 'http://{}'.format(host) if host else self.server.url
+
+    def reply(self, __status: int, __headers: List[Tuple[str, str]],
+              __body: bytes, cache: Optional[str] = None):
+        self.send_response(__status)
+        # Responses are cached as GitHub sent them, as clients may reach us
+        # through different names
+        for name, value in self.server.rewrite(__headers, self.base_url()):
+            self.send_header(name, value)
+        if cache:
+            self.send_header('X-Hubugs-Cache', cache)
+        self.send_header('Content-Length', str(len(__body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(__body)
+
+    def forward_headers(self, conditional: bool = True) -> Dict[str, str]:
+        return dict((k, v) for k, v in self.headers.items()
+                    if k.lower() not in HOP_HEADERS
+                    and (conditional or k.lower() not in CONDITIONAL_HEADERS))
+
+    def do_GET(self):
+        """Serve a request from the cache, or GitHub."""
+        if self.path == METRICS_PATH:
+            body = json.dumps(self.server.metrics(), indent=4).encode()
+            return self.reply(200, [('Content-Type', 'application/json')],
+                              body)
+        server = self.server
+        token = scope(self.headers.get('Authorization'))
+        key = (token, self.path, self.headers.get('Accept', ''))
+        try:
+            entry, how = server.get(key, self.forward_headers(False))
+        except (httplib2.HttpLib2Error, OSError) as error:
+            server.count('errors')
+            return self.reply(502, [('Content-Type', 'text/plain')],
+                              'Upstream error: {}\n'.format(error).encode())
+        if entry.etag and entry.etag in self.headers.get('If-None-Match', ''):
+            return self.reply(304, [('ETag', entry.etag)], b'', how)
+        self.reply(entry.status, entry.headers, entry.body, how)
+
+    do_HEAD = do_GET
+
+    def forward(self):
+        """Pass a request through to GitHub."""
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        server = self.server
+        server.count('passthrough')
+        try:
+            status, headers, content = server.request(
+                self.command, self.path, self.forward_headers(), body)
+        except (httplib2.HttpLib2Error, OSError) as error:
+            server.count('errors')
+            return self.reply(502, [('Content-Type', 'text/plain')],
+                              'Upstream error: {}\n'.format(error).encode())
+        if status < 400:
+            server.invalidate(scope(self.headers.get('Authorization')))
+        self.reply(status, headers, content)
+
+    do_DELETE = do_PATCH = do_POST = do_PUT = forward
+
+
+class ProxyServer(socketserver.ThreadingMixIn, HTTPServer):
+
+    """Caching proxy for the GitHub API.
+
+    Attributes:
+        upstream: GitHub host requests are forwarded to
+        max_entries: Number of responses to keep
+        public_url: URL clients reach the proxy at, if it can’t be found
+            from their requests
+        stats: Count of requests by outcome
+    """
+
+    daemon_threads = True
+
+    def __init__(self, __address: Tuple[str, int], __upstream: str,
+                 max_entries: int = MAX_ENTRIES,
+                 public_url: Optional[str] = None):
+        """Configure a new proxy.
+
+        Args:
+            __address: Address to listen on
+            __upstream: GitHub host to forward requests to
+            max_entries: Number of responses to keep
+            public_url: URL clients reach the proxy at, defaults to the
+                ``Host`` header of each request
+        """
+        super(ProxyServer, self).__init__(__address, Handler)
+        self.upstream = __upstream.rstrip('/')
+        self.max_entries = max_entries
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.stats = collections.Counter()  # type: Dict[str, int]
+        self._entries = collections.OrderedDict()  # type: Dict[Tuple, Entry]
+        self._lock = threading.Lock()
+        self._flights = utils.SingleFlight()
+        self._sessions = threading.local()
+        self._upstream_re = re.compile(re.escape(self.upstream) + r'(?=[/?>])')
+
+    @property
+    def url(self) -> str:
+        """URL to use as ``--host-url``."""
+        if self.public_url:
+            return self.public_url
+        host, port = self.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def rewrite(self, __headers: List[Tuple[str, str]],
+                __base: str) -> List[Tuple[str, str]]:
+        """Point links in response headers back at the proxy.
+
+        This keeps pagination cached.
+
+        Args:
+            __headers: Response headers
+            __base: URL client reached the proxy at
+
+        Returns:
+            Headers with GitHub links replaced
+        """
+        return [(k, self._upstream_re.sub(__base, v)
+                 if k.lower() in ('link', 'location') else v)
+                for k, v in __headers]
+
+    def count(self, __name: str):
+        """Increment an outcome’s count.
+
+        Args:
+            __name: Outcome to count
+        """
+        with self._lock:
+            self.stats[__name] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Report cache effectiveness.
+
+        Returns:
+            Counts of requests by outcome, along with the proportion of
+            ``GET`` requests that didn’t reach GitHub and the proportion that
+            didn’t cost any rate limit
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._entries)
+        gets = sum(stats.get(k, 0)
+                   for k in ('hit', 'shared', 'revalidated', 'miss'))
+        saved = stats.get('hit', 0) + stats.get('shared', 0)
+        return {
+            'requests': dict(sorted(stats.items())),
+            'entries': entries,
+            'hit_rate': round(saved / gets, 4) if gets else 0.0,
+            'rate_limit_saved': round((saved + stats.get('revalidated', 0))
+                                      / gets, 4) if gets else 0.0,
+        }
+
+    def request(self, __method: str, __path: str, __headers: Dict[str, str],
+                __body: Optional[bytes] = None
+                ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """Send a request to GitHub.
+
+        Args:
+            __method: HTTP method
+            __path: Request path, including query
+            __headers: Request headers
+            __body: Request body
+
+        Returns:
+            Response status, headers and body
+        """
+        # httplib2 sessions can’t be shared between threads
+        if not hasattr(self._sessions, 'http'):
+            self._sessions.http = httplib2.Http(ca_certs=utils.CA_CERTS)
+            self._sessions.http.follow_redirects = False
+        r, content = self._sessions.http.request(
+            self.upstream + __path, __method, body=__body, headers=__headers)
+        headers = [(k.title(), v) for k, v in r.items()
+                   if k not in HOP_HEADERS and not k.startswith('-')]
+        return r.status, headers, content
+
+    def get(self, __key: Tuple[str, str, str],
+            __headers: Dict[str, str]) -> Tuple[Entry, str]:
+        """Fetch a response, from the cache if possible.
+
+        Args:
+            __key: Token scope, path and ``Accept`` header of request
+            __headers: Headers to forward, without conditional headers
+
+        Returns:
+            Response, and whether it was a fresh ``hit``, ``shared`` with a
+            concurrent request, ``revalidated`` with GitHub or a ``miss``
+        """
+        entry = self._lookup(__key)
+        if entry and entry.fresh():
+            self.count('hit')
+            return entry, 'hit'
+        (entry, how), flight = self._flights.do(
+            __key, lambda: self._fetch(__key, __headers, entry),
+            memoise=lambda result: False)
+        if flight == 'shared':
+            how = 'shared'
+        self.count(how)
+        return entry, how
+
+    def invalidate(self, __scope: str):
+        """Drop a token’s responses.
+
+        Args:
+            __scope: Token scope, see :func:`scope`
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == __scope]:
+                del self._entries[key]
+
+    def _lookup(self, __key: Tuple[str, str, str]) -> Optional[Entry]:
+        with self._lock:
+            if __key in self._entries:
+                self._entries.move_to_end(__key)
+                return self._entries[__key]
+        return None
+
+    def _store(self, __key: Tuple[str, str, str], __entry: Entry):
+        with self._lock:
+            self._entries[__key] = __entry
+            self._entries.move_to_end(__key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _fetch(self, __key: Tuple[str, str, str], __headers: Dict[str, str],
+               __entry: Optional[Entry]) -> Tuple[Entry, str]:
+        headers = dict(__headers)
+        if __entry and __entry.etag:
+            headers['If-None-Match'] = __entry.etag
+        status, r_headers, content = self.request('GET', __key[1], headers)
+        lookup = dict((k.lower(), v) for k, v in r_headers)
+        directives = cache_control(lookup.get('cache-control'))
+        try:
+            max_age = int(directives.get('max-age') or 0)
+        except ValueError:
+            max_age = 0
+        if 'no-cache' in directives:
+            max_age = 0
+        if status == 304 and __entry:
+            __entry.fetched = time.monotonic()
+            __entry.max_age = max_age
+            return __entry, 'revalidated'
+        entry = Entry(status, r_headers, content, lookup.get('etag'),
+                      max_age)
+        if status == 200 and 'no-store' not in directives \
+                and (entry.etag or max_age):
+            self._store(__key, entry)
+        return entry, 'miss'
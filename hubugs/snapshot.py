@@ -0,0 +1,333 @@
+#
+"""snapshot - Compact, memory-mapped listings of a project’s issues."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# A snapshot holds only the fields a listing needs, derived from the local
+# issue store.  The file is laid out as:
+#
+#   * a header, see :data:`HEADER`
+#   * one fixed-width record per issue in number order, see :data:`RECORD`
+#   * label codes for all issues, as an array of unsigned ints
+#   * record indices for each label, as an array of unsigned ints
+#   * each label’s name and record indices, see :data:`LABEL`
+#   * UTF-8 encoded titles, milestone titles and label names
+#
+# State and pull request filters read single bytes at a fixed stride through
+# the records, and label filters intersect the labels’ record indices, so
+# only matching records are unpacked.  Strings are decoded just for the
+# issues that are displayed.  Snapshots are machine local caches, so native
+# byte order is used throughout.
+
+import collections
+import contextlib
+import datetime
+import itertools
+import mmap
+import os
+import struct
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from . import (cache, stats, store)
+
+#: File signature, including format version
+MAGIC = b'HBSNAP\x00\x01'
+
+#: Signature, store version, issue count, label count, and offsets of label
+#: codes, record indices, label table and strings
+HEADER = struct.Struct('=8sqIIIIII')
+
+#: Number, closed flag, pull request flag, label count, created, updated and
+#: closed times, title offset and length, milestone title offset and length,
+#: and index of first label code
+RECORD = struct.Struct('=IBBHqqqIIIII')
+
+#: Name offset and length, and index and count of record indices
+LABEL = struct.Struct('=IIII')
+
+#: Offsets of closed and pull request flags within a record
+CLOSED_FLAG, PULL_FLAG = 4, 5
+
+#: Table for inverting flags with :meth:`bytes.translate`
+INVERT = bytes([1, 0]) + bytes(254)
+
+#: Marker for issues without a milestone
+NO_MILESTONE = 0xFFFFFFFF
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+Label = collections.namedtuple('Label', ['name', ])
+Milestone = collections.namedtuple('Milestone', ['title', ])
+
+
+def _datetime(__stamp: int) -> Optional[datetime.datetime]:
+    return EPOCH + datetime.timedelta(seconds=__stamp) if __stamp >= 0 \
+        else None
+
+
+class Issue(collections.namedtuple('Issue', [
+        'number', 'state', 'title', 'labels', 'milestone', 'pull_request',
+        'created', 'updated', 'closed'])):
+
+    """Issue fields used by listings.
+
+    Times are stored in seconds since the epoch, and only converted when
+    they are read as ``created_at``, ``updated_at`` or ``closed_at``.
+    """
+
+    __slots__ = ()
+
+    created_at = property(lambda self: _datetime(self.created))
+    updated_at = property(lambda self: _datetime(self.updated))
+    closed_at = property(lambda self: _datetime(self.closed))
+
+
+#: Attributes of :class:`Issue` matching GitHub’s issue objects, label and
+#: milestone objects only provide their ``name`` and ``title`` respectively
+FIELDS = frozenset(['number', 'state', 'title', 'labels', 'milestone',
+                    'pull_request', 'created_at', 'updated_at', 'closed_at'])
+
+
+def snapshot_path(__host_url: str, __project: str) -> str:
+    """Find location of snapshot for a project.
+
+    Args:
+        __host_url: GitHub host project is stored from
+        __project: GitHub project
+
+    Returns:
+        Location of snapshot
+    """
+    host = urlparse(__host_url).netloc or __host_url
+    return os.path.join(cache.cache_dir('snapshot', host,
+                                        *__project.split('/')),
+                        'issues.snap')
+
+
+def build(__issues: Iterable[Dict[str, Any]], __version: int) -> bytes:
+    """Create a snapshot.
+
+    Args:
+        __issues: Plain JSON issue objects, in number order
+        __version: Version of store issues were read from
+
+    Returns:
+        Encoded snapshot
+    """
+    labels = stats.Dictionary()
+    codes = array('I')
+    strings = bytearray()
+    postings = collections.defaultdict(lambda: array('I'))
+    milestones = {}  # type: Dict[str, Tuple[int, int]]
+    records = bytearray()
+
+    def add(__string: str) -> Tuple[int, int]:
+        data = __string.encode('utf-8')
+        strings.extend(data)
+        return len(strings) - len(data), len(data)
+
+    count = 0
+    for issue in __issues:
+        names = [label['name'] for label in issue['labels']]
+        first = len(codes)
+        for name in names:
+            code = labels.encode(name)
+            codes.append(code)
+            postings[code].append(count)
+        milestone = issue.get('milestone')
+        if milestone:
+            title = milestone['title']
+            if title not in milestones:
+                milestones[title] = add(title)
+            m_offset, m_length = milestones[title]
+        else:
+            m_offset, m_length = NO_MILESTONE, 0
+        closed = issue['state'] == 'closed'
+        records.extend(RECORD.pack(
+            issue['number'], closed, bool(issue.get('pull_request')),
+            len(names), stats.timestamp(issue['created_at']),
+            stats.timestamp(issue['updated_at']),
+            stats.timestamp(issue.get('closed_at')) if closed else -1,
+            *add(issue['title']), m_offset, m_length, first))
+        count += 1
+    indices = array('I')
+    table = bytearray()
+    for code, name in enumerate(labels.values):
+        table.extend(LABEL.pack(*add(name), len(indices),
+                                len(postings[code])))
+        indices.extend(postings[code])
+    codes_offset = HEADER.size + len(records)
+    indices_offset = codes_offset + len(codes) * codes.itemsize
+    table_offset = indices_offset + len(indices) * indices.itemsize
+    strings_offset = table_offset + len(table)
+    header = HEADER.pack(MAGIC, __version, count, len(labels), codes_offset,
+                         indices_offset, table_offset, strings_offset)
+    return b''.join([header, records, codes.tobytes(), indices.tobytes(),
+                     table, strings])
+
+
+class Snapshot:
+
+    """Memory-mapped snapshot.
+
+    Attributes:
+        version: Version of store snapshot was built from
+        count: Number of issues
+        labels: Label names, indexed by code
+    """
+
+    def __init__(self, __path: str):
+        """Open a snapshot.
+
+        Args:
+            __path: Location of snapshot
+
+        Raises:
+            ValueError: File isn’t a snapshot
+        """
+        with open(__path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, self.version, self.count, labels, codes_offset,
+             indices_offset, table_offset,
+             self._strings) = HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError('Invalid snapshot {!r}'.format(__path))
+        view = memoryview(self._map)
+        self._records = view[HEADER.size:codes_offset]
+        self._codes = view[codes_offset:indices_offset].cast('I')
+        self._indices = view[indices_offset:table_offset].cast('I')
+        self.labels = []  # type: List[str]
+        self._postings = {}  # type: Dict[str, Tuple[int, int]]
+        for offset, length, first, count in LABEL.iter_unpack(
+                view[table_offset:self._strings]):
+            name = self._string(offset, length)
+            self.labels.append(name)
+            self._postings[name] = (first, first + count)
+        self._labels = [Label(name) for name in self.labels]
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Unmap snapshot."""
+        self._records.release()
+        self._codes.release()
+        self._indices.release()
+        self._map.close()
+
+    def _string(self, __offset: int, __length: int) -> str:
+        start = self._strings + __offset
+        return self._map[start:start + __length].decode('utf-8')
+
+    def issues(self, state: str = 'open', labels: Iterable[str] = (),
+               pull_requests: bool = False,
+               order: str = 'number') -> List[Issue]:
+        """Fetch issues.
+
+        This matches the filtering and ordering of
+        :meth:`hubugs.store.IssueStore.issues`.
+
+        Args:
+            state: State of issues to fetch, or ``all``
+            labels: Labels issues must have
+            pull_requests: Fetch only pull requests
+            order: Sort issues by ``number`` or ``updated``
+
+        Returns:
+            Issues, in ascending order
+        """
+        indices = range(self.count)  # type: Iterable[int]
+        wanted = set(labels)
+        if wanted:
+            if not wanted.issubset(self._postings):
+                return []
+            sets = [set(self._indices[slice(*self._postings[name])])
+                    for name in wanted]
+            indices = sorted(set.intersection(*sets))
+        closed = {'open': 0, 'closed': 1}.get(state)
+        if closed is not None:
+            indices = self._select(indices, CLOSED_FLAG, closed)
+        if pull_requests:
+            indices = self._select(indices, PULL_FLAG, 1)
+        records = self._records
+        size = RECORD.size
+        matches = [RECORD.unpack_from(records, i * size) for i in indices]
+        if order == 'updated':
+            matches.sort(key=lambda r: (r[5], r[0]))
+        milestones = {}  # type: Dict[int, Milestone]
+        return [self._issue(r, milestones) for r in matches]
+
+    def _select(self, __indices: Iterable[int], __flag: int,
+                __value: int) -> List[int]:
+        flags = self._records[__flag::RECORD.size].tobytes()
+        if not __value:
+            flags = flags.translate(INVERT)
+        if isinstance(__indices, range):
+            return list(itertools.compress(__indices, flags))
+        return [i for i in __indices if flags[i]]
+
+    def _issue(self, __record: Tuple, __milestones: Dict[int, Milestone]):
+        (number, closed, pull, labels, created, updated, closed_at, t_offset,
+         t_length, m_offset, m_length, first) = __record
+        if m_offset == NO_MILESTONE:
+            milestone = None
+        else:
+            milestone = __milestones.get(m_offset)
+            if milestone is None:
+                milestone = __milestones[m_offset] = \
+                    Milestone(self._string(m_offset, m_length))
+        return Issue(number, 'closed' if closed else 'open',
+                     self._string(t_offset, t_length),
+                     [self._labels[c]
+                      for c in self._codes[first:first + labels]],
+                     milestone, bool(pull), created, updated, closed_at)
+
+
+def load(__db: store.IssueStore, __host_url: str,
+         __project: str) -> Snapshot:
+    """Open a project’s snapshot, rebuilding it if it is stale.
+
+    Args:
+        __db: Local issue store
+        __host_url: GitHub host project is stored from
+        __project: GitHub project
+
+    Returns:
+        Snapshot matching the store’s current contents
+    """
+    path = snapshot_path(__host_url, __project)
+    # The version is read first, so that a change made while rebuilding
+    # leaves the snapshot stale rather than wrongly current
+    version = __db.version(__project)
+    with contextlib.suppress(OSError, ValueError):
+        snapshot = Snapshot(path)
+        if snapshot.version == version:
+            return snapshot
+        snapshot.close()
+    cache.write_atomic(path, build(__db.issues(__project, 'all'), version))
+    return Snapshot(path)
@@ -0,0 +1,290 @@
+#
+"""stats - Aggregate statistics over a project’s issue history."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Issues are stored a column at a time, in typed arrays, instead of as a list
+# of objects.  Each page of results is appended to the columns and then
+# dropped, so memory use is a few dozen bytes per issue however large the
+# history is.  Strings such as logins and label names are dictionary encoded,
+# and columns holding several values per issue are stored as a flat array of
+# values with an array of offsets into it.
+
+import array
+import calendar
+import collections
+import time
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+#: Upper bounds for time to close buckets, in seconds
+CLOSE_BUCKETS = (
+    ('under 1 hour', 3600),
+    ('under 1 day', 86400),
+    ('under 1 week', 7 * 86400),
+    ('under 1 month', 30 * 86400),
+    ('under 3 months', 91 * 86400),
+    ('under 1 year', 365 * 86400),
+    ('over 1 year', None),
+)
+
+#: Percentiles reported for ages and times to close
+PERCENTILES = (50, 75, 90, 99)
+
+
+def timestamp(__stamp: Optional[str]) -> int:
+    """Convert an API timestamp to seconds since the epoch.
+
+    Args:
+        __stamp: API timestamp
+
+    Returns:
+        Seconds since the epoch, or ``-1`` for missing values
+    """
+    if not __stamp:
+        return -1
+    # Slicing is several times faster than strptime, which matters with
+    # hundreds of thousands of timestamps
+    return calendar.timegm((int(__stamp[:4]), int(__stamp[5:7]),
+                            int(__stamp[8:10]), int(__stamp[11:13]),
+                            int(__stamp[14:16]), int(__stamp[17:19])))
+
+
+class Dictionary:
+
+    """Dictionary encoder for repeated strings.
+
+    Attributes:
+        values: Encoded strings, indexed by code
+    """
+
+    def __init__(self):
+        self.values = []  # type: List[str]
+        self._codes = {}  # type: Dict[str, int]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, __value: str) -> int:
+        """Find code for a string, adding it if necessary.
+
+        Args:
+            __value: String to encode
+
+        Returns:
+            String’s code
+        """
+        code = self._codes.get(__value)
+        if code is None:
+            code = self._codes[__value] = len(self.values)
+            self.values.append(__value)
+        return code
+
+
+class MultiColumn:
+
+    """Column holding any number of encoded values for each row.
+
+    Attributes:
+        offsets: Start of each row’s values, with a final entry marking the
+            end of the last row
+        codes: Encoded values for all rows
+    """
+
+    def __init__(self, __dictionary: Dictionary):
+        """Configure a new column.
+
+        Args:
+            __dictionary: Encoder for values
+        """
+        self.dictionary = __dictionary
+        self.offsets = array.array('l', [0, ])
+        self.codes = array.array('l')
+
+    def append(self, __values: Iterable[str]):
+        """Add a row.
+
+        Args:
+            __values: Row’s values
+        """
+        self.codes.extend(self.dictionary.encode(v) for v in __values)
+        self.offsets.append(len(self.codes))
+
+    def row(self, __index: int) -> array.array:
+        """Fetch encoded values for a row.
+
+        Args:
+            __index: Row number
+
+        Returns:
+            Row’s codes
+        """
+        return self.codes[self.offsets[__index]:self.offsets[__index + 1]]
+
+
+class IssueColumns:
+
+    """Column-oriented store of issue data.
+
+    Attributes:
+        number: Issue numbers
+        created: Creation times, in seconds since the epoch
+        closed: Close times, ``-1`` for open issues
+        comments: Comment counts
+        pull: Whether each issue is a pull request
+        author: Encoded author logins
+        labels: Encoded label names
+        assignees: Encoded assignee logins
+        logins: Encoder for logins, shared by authors and assignees
+    """
+
+    def __init__(self):
+        self.number = array.array('l')
+        self.created = array.array('q')
+        self.closed = array.array('q')
+        self.comments = array.array('l')
+        self.pull = array.array('b')
+        self.logins = Dictionary()
+        self.author = array.array('l')
+        self.labels = MultiColumn(Dictionary())
+        self.assignees = MultiColumn(self.logins)
+
+    def __len__(self) -> int:
+        return len(self.number)
+
+    def extend(self, __issues: Iterable[Dict[str, Any]]):
+        """Append issues.
+
+        Args:
+            __issues: Plain JSON issue objects
+        """
+        for issue in __issues:
+            self.number.append(issue['number'])
+            self.created.append(timestamp(issue['created_at']))
+            self.closed.append(timestamp(issue.get('closed_at'))
+                               if issue['state'] == 'closed' else -1)
+            self.comments.append(issue.get('comments') or 0)
+            self.pull.append('pull_request' in issue)
+            self.author.append(self.logins.encode(issue['user']['login']))
+            self.labels.append(label['name']
+                               for label in issue['labels'])
+            self.assignees.append(a['login']
+                                  for a in issue.get('assignees') or [])
+
+    def nbytes(self) -> int:
+        """Memory used by column data, excluding dictionaries.
+
+        Returns:
+            Size of column buffers, in bytes
+        """
+        columns = (self.number, self.created, self.closed, self.comments,
+                   self.pull, self.author, self.labels.offsets,
+                   self.labels.codes, self.assignees.offsets,
+                   self.assignees.codes)
+        return sum(len(c) * c.itemsize for c in columns)
+
+
+def percentiles(__values: Iterable[int],
+                __points: Iterable[int] = PERCENTILES) -> Dict[str, int]:
+    """Calculate nearest-rank percentiles.
+
+    Args:
+        __values: Values to summarise
+        __points: Percentiles to calculate
+
+    Returns:
+        Value at each percentile, keyed by ``p<n>``
+    """
+    values = sorted(__values)
+    result = collections.OrderedDict()  # type: Dict[str, int]
+    if not values:
+        return result
+    for point in __points:
+        rank = max(-(-point * len(values) // 100), 1)
+        result['p{}'.format(point)] = values[rank - 1]
+    return result
+
+
+def top(__counts: collections.Counter, __dictionary: Dictionary,
+        __limit: int) -> List[Tuple[str, int]]:
+    """Find most common encoded values.
+
+    Args:
+        __counts: Count for each code
+        __dictionary: Encoder for values
+        __limit: Number of values to return
+
+    Returns:
+        Value and count, most common first with ties in name order
+    """
+    ranked = sorted(__counts.items(),
+                    key=lambda item: (-item[1], __dictionary.values[item[0]]))
+    return [(__dictionary.values[code], count)
+            for code, count in ranked[:__limit]]
+
+
+def summarise(__columns: IssueColumns, limit: int = 10,
+              now: Optional[int] = None) -> Dict[str, Any]:
+    """Aggregate issue columns.
+
+    Ages and times to close are reported in days.
+
+    Args:
+        __columns: Issue data
+        limit: Number of labels, authors and assignees to report
+        now: Time to calculate ages from, in seconds since the epoch
+
+    Returns:
+        Statistics for the issues
+    """
+    now = int(time.time()) if now is None else now
+    cols = __columns
+    open_ages = array.array('q')
+    close_times = array.array('q')
+    buckets = collections.OrderedDict((name, 0) for name, _ in CLOSE_BUCKETS)
+    for created, closed in zip(cols.created, cols.closed):
+        if closed < 0:
+            open_ages.append(now - created)
+            continue
+        elapsed = closed - created
+        close_times.append(elapsed)
+        for name, bound in CLOSE_BUCKETS:
+            if bound is None or elapsed < bound:
+                buckets[name] += 1
+                break
+
+    def days(seconds):
+        return collections.OrderedDict(
+            (k, round(v / 86400, 1)) for k, v in percentiles(seconds).items())
+
+    closed = len(close_times)
+    return {
+        'issues': len(cols),
+        'open': len(cols) - closed,
+        'closed': closed,
+        'pull_requests': sum(cols.pull),
+        'comments': sum(cols.comments),
+        'open_age': days(open_ages),
+        'time_to_close': days(close_times),
+        'close_buckets': list(buckets.items()),
+        'labels': top(collections.Counter(cols.labels.codes),
+                      cols.labels.dictionary, limit),
+        'authors': top(collections.Counter(cols.author), cols.logins, limit),
+        'assignees': top(collections.Counter(cols.assignees.codes),
+                         cols.logins, limit),
+    }
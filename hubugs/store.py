@@ -0,0 +1,538 @@
+#
+"""store - Local copy of projects’ issues, kept current by webhooks."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Objects are stored as the raw JSON GitHub sends, in both API responses and
+# webhook payloads, with only the columns needed for lookups broken out.  Each
+# GitHub host has its own database.
+#
+# Every change to a project’s issues gives it a new random version, which
+# lets derived data such as listing snapshots notice they are stale.  Random
+# values, rather than a counter, can’t repeat if the database is recreated.
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from jnrbase.attrdict import AttrDict
+
+from . import (cache, models)
+
+#: Webhook events that are applied to the store
+EVENTS = ('issues', 'issue_comment', 'label', 'milestone')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (
+    project TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    project TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project, number)
+);
+CREATE TABLE IF NOT EXISTS comments (
+    project TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    issue INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project, id)
+);
+CREATE INDEX IF NOT EXISTS comments_issue ON comments (project, issue);
+CREATE TABLE IF NOT EXISTS labels (
+    project TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project, name)
+);
+CREATE TABLE IF NOT EXISTS milestones (
+    project TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project, number)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    project TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS issues_inserted AFTER INSERT ON issues BEGIN
+    INSERT OR REPLACE INTO versions VALUES (NEW.project, random());
+END;
+CREATE TRIGGER IF NOT EXISTS issues_deleted AFTER DELETE ON issues BEGIN
+    INSERT OR REPLACE INTO versions VALUES (OLD.project, random());
+END;
+"""
+
+
+class LocalError(ValueError):
+
+    """Error to raise when a command can’t be served from the local store."""
+
+    pass
+
+
+def store_path(__host_url: str) -> str:
+    """Find location of store for a GitHub host.
+
+    Args:
+        __host_url: GitHub host
+
+    Returns:
+        Location of database
+    """
+    host = urlparse(__host_url).netloc or __host_url
+    return os.path.join(cache.cache_dir('store'), '{}.sqlite'.format(host))
+
+
+class IssueStore:
+
+    """Local store of issues, comments, labels and milestones.
+
+    Attributes:
+        path: Location of database
+    """
+
+    def __init__(self, __host_url: str, path: Optional[str] = None):
+        """Open a store.
+
+        Args:
+            __host_url: GitHub host the store mirrors
+            path: Location of database, defaults to :func:`store_path`
+        """
+        self.path = path or store_path(__host_url)
+        # Reads may come from the threads used to query multiple projects
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        """Close database."""
+        self._db.close()
+
+    def _rows(self, __query: str, *__args: Any) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(__query, __args).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    # Updates {{{
+    def put_repository(self, __repo: Dict[str, Any]):
+        """Store repository information.
+
+        Args:
+            __repo: Repository object
+        """
+        self._db.execute('INSERT OR REPLACE INTO repositories VALUES (?, ?)',
+                         (__repo['full_name'], json.dumps(__repo)))
+
+    def put_issue(self, __project: str, __issue: Dict[str, Any]) -> bool:
+        """Store issue, unless a newer copy is already stored.
+
+        Webhook deliveries can arrive out of order, and may be retried, so a
+        stale copy never replaces a fresher one.
+
+        Args:
+            __project: Project issue belongs to
+            __issue: Issue object
+
+        Returns:
+            Whether the issue was stored
+        """
+        cursor = self._db.execute(
+            'INSERT OR REPLACE INTO issues '
+            'SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS ('
+            'SELECT 1 FROM issues WHERE project = ? AND number = ? '
+            'AND updated_at > ?)',
+            (__project, __issue['number'], __issue['state'],
+             __issue['updated_at'], json.dumps(__issue), __project,
+             __issue['number'], __issue['updated_at']))
+        return cursor.rowcount > 0
+
+    def delete_issue(self, __project: str, __number: int):
+        """Remove issue, and its comments.
+
+        Args:
+            __project: Project issue belongs to
+            __number: Issue number
+        """
+        self._db.execute('DELETE FROM issues WHERE project = ? AND number = ?',
+                         (__project, __number))
+        self._db.execute(
+            'DELETE FROM comments WHERE project = ? AND issue = ?',
+            (__project, __number))
+
+    def put_comment(self, __project: str, __issue: int,
+                    __comment: Dict[str, Any]):
+        """Store comment.
+
+        Args:
+            __project: Project comment belongs to
+            __issue: Issue number comment is attached to
+            __comment: Comment object
+        """
+        self._db.execute(
+            'INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?, ?, ?)',
+            (__project, __comment['id'], __issue, __comment['created_at'],
+             __comment['updated_at'], json.dumps(__comment)))
+
+    def delete_comment(self, __project: str, __id: int):
+        """Remove comment.
+
+        Args:
+            __project: Project comment belongs to
+            __id: Comment identifier
+        """
+        self._db.execute('DELETE FROM comments WHERE project = ? AND id = ?',
+                         (__project, __id))
+
+    def put_label(self, __project: str, __label: Dict[str, Any]):
+        """Store label.
+
+        Args:
+            __project: Project label belongs to
+            __label: Label object
+        """
+        self._db.execute('INSERT OR REPLACE INTO labels VALUES (?, ?, ?)',
+                         (__project, __label['name'], json.dumps(__label)))
+
+    def delete_label(self, __project: str, __name: str):
+        """Remove label.
+
+        Args:
+            __project: Project label belongs to
+            __name: Label name
+        """
+        self._db.execute('DELETE FROM labels WHERE project = ? AND name = ?',
+                         (__project, __name))
+
+    def put_milestone(self, __project: str, __milestone: Dict[str, Any]):
+        """Store milestone.
+
+        Args:
+            __project: Project milestone belongs to
+            __milestone: Milestone object
+        """
+        self._db.execute(
+            'INSERT OR REPLACE INTO milestones VALUES (?, ?, ?, ?)',
+            (__project, __milestone['number'], __milestone['state'],
+             json.dumps(__milestone)))
+
+    def delete_milestone(self, __project: str, __number: int):
+        """Remove milestone.
+
+        Args:
+            __project: Project milestone belongs to
+            __number: Milestone number
+        """
+        self._db.execute(
+            'DELETE FROM milestones WHERE project = ? AND number = ?',
+            (__project, __number))
+
+    def apply(self, __event: str, __payload: Dict[str, Any]) -> bool:
+        """Apply a webhook event.
+
+        Args:
+            __event: Event type, from the ``X-GitHub-Event`` header
+            __payload: Event payload
+
+        Returns:
+            Whether the event was applied
+        """
+        if __event not in EVENTS or 'repository' not in __payload:
+            return False
+        project = __payload['repository']['full_name']
+        action = __payload.get('action')
+        with self._db:
+            self.put_repository(__payload['repository'])
+            if __event == 'issues':
+                issue = __payload['issue']
+                if action in ('deleted', 'transferred'):
+                    self.delete_issue(project, issue['number'])
+                else:
+                    self.put_issue(project, issue)
+            elif __event == 'issue_comment':
+                issue = __payload['issue']
+                comment = __payload['comment']
+                # The embedded issue carries the new comment count
+                self.put_issue(project, issue)
+                if action == 'deleted':
+                    self.delete_comment(project, comment['id'])
+                else:
+                    self.put_comment(project, issue['number'], comment)
+            elif __event == 'label':
+                label = __payload['label']
+                old = __payload.get('changes', {}).get('name', {}).get('from')
+                if action == 'deleted':
+                    self.delete_label(project, label['name'])
+                else:
+                    if old:
+                        self.delete_label(project, old)
+                    self.put_label(project, label)
+            elif __event == 'milestone':
+                milestone = __payload['milestone']
+                if action == 'deleted':
+                    self.delete_milestone(project, milestone['number'])
+                else:
+                    self.put_milestone(project, milestone)
+        return True
+
+    def sync(self, __globs: AttrDict, __project: str) -> Dict[str, int]:
+        """Replace a project’s stored data with a fresh copy from GitHub.
+
+        Args:
+            __globs: Global argument configuration
+            __project: Project to fetch
+
+        Returns:
+            Number of objects stored, by type
+        """
+        base = '{}/repos/{}'.format(__globs.host_url, __project)
+        params = {'per_page': 100}
+        r, repo = __globs.req_get(base, is_json=False)
+        urls = {
+            'issues': (base + '/issues', dict(params, state='all')),
+            'comments': (base + '/issues/comments', params),
+            'labels': (base + '/labels', params),
+            'milestones': (base + '/milestones', dict(params, state='all')),
+        }
+        # Everything is fetched before writing, so that the database isn’t
+        # locked while we wait on the network
+        fetched = dict((kind, list(itertools.chain.from_iterable(
+            __globs.req_pages(url, params=p))))
+            for kind, (url, p) in urls.items())
+        counts = {}
+        with self._db:
+            self.put_repository(models.loads(repo))
+            for kind, items in fetched.items():
+                self._db.execute(
+                    'DELETE FROM {} WHERE project = ?'.format(kind),
+                    (__project, ))
+                for item in items:
+                    if kind == 'issues':
+                        self.put_issue(__project, item)
+                    elif kind == 'comments':
+                        number = int(item['issue_url'].rsplit('/', 1)[1])
+                        self.put_comment(__project, number, item)
+                    elif kind == 'labels':
+                        self.put_label(__project, item)
+                    else:
+                        self.put_milestone(__project, item)
+                counts[kind] = len(items)
+        return counts
+    # }}}
+
+    # Queries {{{
+    def repository(self, __project: str) -> Optional[Dict[str, Any]]:
+        """Fetch repository information.
+
+        Args:
+            __project: Project to fetch
+
+        Returns:
+            Repository object, if stored
+        """
+        rows = self._rows('SELECT data FROM repositories WHERE project = ?',
+                          __project)
+        return rows[0] if rows else None
+
+    def version(self, __project: str) -> int:
+        """Fetch version of a project’s issues.
+
+        Args:
+            __project: Project to check
+
+        Returns:
+            Version, which changes whenever an issue is stored or removed
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT version FROM versions WHERE project = ?',
+                (__project, )).fetchone()
+        return row[0] if row else 0
+
+    def issues(self, __project: str, state: str = 'open',
+               labels: Iterable[str] = (), pull_requests: bool = False,
+               order: str = 'number') -> List[Dict[str, Any]]:
+        """Fetch issues.
+
+        Args:
+            __project: Project to fetch issues for
+            state: State of issues to fetch, or ``all``
+            labels: Labels issues must have
+            pull_requests: Fetch only pull requests
+            order: Sort issues by ``number`` or ``updated``
+
+        Returns:
+            Issues, in ascending order
+        """
+        query = 'SELECT data FROM issues WHERE project = ?'
+        args = [__project, ]
+        if state != 'all':
+            query += ' AND state = ?'
+            args.append(state)
+        query += ' ORDER BY {}'.format('updated_at, number'
+                                       if order == 'updated' else 'number')
+        issues = self._rows(query, *args)
+        wanted = set(labels)
+        if wanted:
+            issues = [i for i in issues
+                      if wanted <= {label['name'] for label in i['labels']}]
+        if pull_requests:
+            issues = [i for i in issues if i.get('pull_request')]
+        return issues
+
+    def search(self, __project: str, __term: str, state: str = 'open',
+               order: str = 'number') -> List[Dict[str, Any]]:
+        """Search issues.
+
+        This is a simple match against titles and bodies, not an
+        implementation of GitHub’s search syntax.
+
+        Args:
+            __project: Project to search
+            __term: Words that must all appear in an issue
+            state: State of issues to search, or ``all``
+            order: Sort issues by ``number`` or ``updated``
+
+        Returns:
+            Matching issues, in ascending order
+        """
+        words = __term.lower().split()
+        return [i for i in self.issues(__project, state, order=order)
+                if all(w in ' '.join([i['title'], i.get('body') or '']).lower()
+                       for w in words)]
+
+    def issue(self, __project: str, __number: int) -> Optional[Dict[str, Any]]:
+        """Fetch an issue.
+
+        Args:
+            __project: Project issue belongs to
+            __number: Issue number
+
+        Returns:
+            Issue object, if stored
+        """
+        rows = self._rows(
+            'SELECT data FROM issues WHERE project = ? AND number = ?',
+            __project, __number)
+        return rows[0] if rows else None
+
+    def comments(self, __project: str,
+                 __number: int) -> List[Dict[str, Any]]:
+        """Fetch an issue’s comments.
+
+        Args:
+            __project: Project issue belongs to
+            __number: Issue number
+
+        Returns:
+            Comments, in creation order
+        """
+        return self._rows(
+            'SELECT data FROM comments WHERE project = ? AND issue = ? '
+            'ORDER BY created_at, id', __project, __number)
+
+    def labels(self, __project: str) -> List[Dict[str, Any]]:
+        """Fetch labels.
+
+        Args:
+            __project: Project to fetch labels for
+
+        Returns:
+            Labels, ordered by name
+        """
+        return self._rows(
+            'SELECT data FROM labels WHERE project = ? ORDER BY name',
+            __project)
+
+    def milestones(self, __project: str,
+                   state: str = 'open') -> List[Dict[str, Any]]:
+        """Fetch milestones.
+
+        Args:
+            __project: Project to fetch milestones for
+            state: State of milestones to fetch, or ``all``
+
+        Returns:
+            Milestones, ordered by number
+        """
+        query = 'SELECT data FROM milestones WHERE project = ?'
+        args = [__project, ]
+        if state != 'all':
+            query += ' AND state = ?'
+            args.append(state)
+        return self._rows(query + ' ORDER BY number', *args)
+    # }}}
+
+
+def localise(__globs: AttrDict):
+    """Serve a command from the local store.
+
+    Repository information, labels and milestones are read from the store,
+    and any attempt to use the network raises :exc:`LocalError`.
+
+    Args:
+        __globs: Global argument configuration to modify
+    """
+    db = IssueStore(__globs.host_url)
+
+    def offline(*args, **kwargs):
+        raise LocalError('This operation needs network access, which is '
+                         'disabled by --local')
+
+    def cached_get(__kind, __url, model=None):
+        if __kind == 'repo':
+            return models.wrap(repo(), model)
+        elif __kind == 'labels':
+            return models.wrap(db.labels(__globs.project), model)
+        elif __kind == 'milestones':
+            return models.wrap(db.milestones(__globs.project, 'all'), model)
+        offline()
+
+    def repo(project=None):
+        data = db.repository(project or __globs.project)
+        if not data:
+            raise LocalError(
+                'No local copy of {!r}, run ‘hubugs webhook-listen --sync’ to '
+                'create one'.format(project or __globs.project))
+        return data
+
+    def repo_obj():
+        return models.wrap(repo(), 'Repo')
+
+    __globs.update({
+        'local': True,
+        'store': db,
+        'req_get': offline,
+        'req_post': offline,
+        'req_pages': offline,
+        'cached_get': cached_get,
+        'repo_obj': repo_obj,
+    })
@@ -18,16 +18,24 @@
 # You should have received a copy of the GNU General Public License along with
 # hubugs.  If not, see <http://www.gnu.org/licenses/>.
 
+import calendar
+import contextlib
 import datetime
+import functools
 import operator
 import os
+import shutil
 import sys
+import threading
 
-from typing import Callable, Dict, List, Optional
+from concurrent import futures
+from typing import (Any, Callable, Dict, FrozenSet, Iterable, Iterator, List,
+                    Optional, Tuple)
 
 import click
 import html2text as html2
 import jinja2
+import jinja2.meta
 import misaka
 
 from jnrbase import xdg_basedir
@@ -37,17 +45,54 @@ from pygments import highlight as pyg_highlight
 from pygments.formatters import get_formatter_by_name
 from pygments.lexers import get_lexer_by_name
 
-from . import utils
+from . import (trace, utils)
 
 
 PKG_DATA_DIRS = [os.path.join(xdg_basedir.user_data('hubugs'), 'templates'), ]
 for directory in xdg_basedir.get_data_dirs('hubugs'):
     PKG_DATA_DIRS.append(os.path.join(directory, 'templates'))
 
+#: Location of templates shipped with hubugs
+PKG_TEMPLATES = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+class Template(jinja2.Template):
+
+    """Jinja template that records rendering time when tracing."""
+
+    def render(self, *args, **kwargs) -> str:
+        """Render template.
+
+        See :meth:`jinja2.Template.render`
+        """
+        with trace.span('render', 'template', template=self.name):
+            return super(Template, self).render(*args, **kwargs)
+
+
 ENV = jinja2.Environment(loader=jinja2.ChoiceLoader(
     [jinja2.FileSystemLoader(s) for s in PKG_DATA_DIRS]))
 ENV.loader.loaders.append(jinja2.PackageLoader('hubugs', 'templates'))
-ENV.filters['relative_time'] = human_timestamp
+ENV.template_class = Template
+
+
+#: Fields used by templates, along with a function to check the template is
+#: unchanged
+_FIELDS_CACHE = {}  # type: Dict[Tuple[str, str], Tuple[Callable, Any]]
+
+#: Fast listing renderer, along with the theme template it was built from
+_LIST_FORMATTER = None  # type: Optional[Tuple[jinja2.Template, Any]]
+
+#: Fields bug listings need, regardless of the template used
+LISTING_FIELDS = frozenset(['number', 'state', 'title', 'updated_at'])
+
+#: Relative times produced while recording, see :func:`record_relative_times`
+_RECORDING = threading.local()
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+#: Fewest outputs rendered in a process pool, smaller batches are rendered
+#: in this process to avoid the pool’s startup cost
+POOL_MIN_BATCH = 8
 
 
 class EmptyMessageError(ValueError):
@@ -71,6 +116,78 @@ def get_template(__group: str, __name: str) -> jinja2.environment.Template:
     return ENV.get_template('/'.join([template_set, __group, __name]))
 
 
+def _walk(__node: jinja2.nodes.Node,
+          __parent: Optional[jinja2.nodes.Node] = None
+          ) -> Iterator[Tuple[jinja2.nodes.Node, Optional[jinja2.nodes.Node]]]:
+    yield __node, __parent
+    for child in __node.iter_child_nodes():
+        yield from _walk(child, __node)
+
+
+def _fields(__source: str, __items: str) -> Optional[FrozenSet[str]]:
+    ast = ENV.parse(__source)
+    # Included templates and imports with context can see our variables, so
+    # we can’t know what they use
+    if any(isinstance(node, (jinja2.nodes.Include, jinja2.nodes.Extends))
+           or getattr(node, 'with_context', False)
+           for node, _ in _walk(ast)):
+        return None
+    loop_vars = set(node.target.name for node in ast.find_all(jinja2.nodes.For)
+                    if isinstance(node.iter, jinja2.nodes.Name)
+                    and node.iter.name == __items
+                    and isinstance(node.target, jinja2.nodes.Name))
+    fields = set()
+    for node, parent in _walk(ast):
+        if not isinstance(node, jinja2.nodes.Name) or node.ctx != 'load':
+            continue
+        if node.name in loop_vars:
+            if isinstance(parent, jinja2.nodes.Getattr) \
+                    and parent.node is node:
+                fields.add(parent.attr)
+            elif isinstance(parent, jinja2.nodes.Getitem) \
+                    and parent.node is node \
+                    and isinstance(parent.arg, jinja2.nodes.Const) \
+                    and isinstance(parent.arg.value, str):
+                fields.add(parent.arg.value)
+            else:
+                # Object is used whole, perhaps passed to a macro or filter
+                return None
+        elif node.name == __items:
+            if isinstance(parent, jinja2.nodes.For) and parent.iter is node:
+                continue
+            elif isinstance(parent, jinja2.nodes.Filter) \
+                    and parent.node is node and parent.name == 'length':
+                continue
+            return None
+    return frozenset(fields)
+
+
+def template_fields(__group: str, __name: str,
+                    items: str = 'bugs') -> Optional[FrozenSet[str]]:
+    """Find object attributes a template uses.
+
+    The template’s syntax tree is searched for attribute lookups on the loop
+    variables iterating over ``items``.  If the objects are used in any other
+    way, for example passed whole to a macro, the fields can’t be determined.
+
+    Args:
+        __group: Template group identifier
+        __name: Template name
+        items: Template variable holding objects
+
+    Returns:
+        Top-level fields used, or ``None`` if they can’t be determined
+    """
+    template_set = utils.get_git_config_val('hubugs.templates', 'default')
+    key = ('/'.join([template_set, __group, __name]), items)
+    if key in _FIELDS_CACHE and _FIELDS_CACHE[key][0]():
+        return _FIELDS_CACHE[key][1]
+    source, _, uptodate = ENV.loader.get_source(ENV, key[0])
+    fields = _fields(source, items)
+    _FIELDS_CACHE[key] = (uptodate or (lambda: True), fields)
+    return fields
+
+
 def jinja_filter(__func: Callable) -> Callable:
     """Simple decorator to add a new filter to Jinja environment.
 
@@ -161,12 +278,269 @@ def markdown(__text: str) -> str:
     return misaka.html(__text, extensions, misaka.HTML_SKIP_HTML)
 
 
-def display_bugs(__bugs: List[Dict[str, str]], __order: str, **extras) -> str:
+@jinja_filter
+def relative_time(__stamp: datetime.datetime) -> str:
+    """Format a time relative to now.
+
+    Args:
+        __stamp: Time to format
+
+    Returns:
+        Human readable offset from the current time
+    """
+    text = human_timestamp(__stamp)
+    stamps = getattr(_RECORDING, 'stamps', None)
+    if stamps is not None and isinstance(__stamp, datetime.datetime):
+        stamps.append((calendar.timegm(__stamp.utctimetuple()), text))
+    return text
+
+
+@contextlib.contextmanager
+def record_relative_times() -> Iterator[List[Tuple[int, str]]]:
+    """Record relative times formatted by templates.
+
+    Rendered output containing relative times goes stale as time passes, the
+    recorded times allow checking whether it still reads the same.
+
+    Yields:
+        Timestamp and text of each relative time, filled in as templates are
+        rendered
+    """
+    stamps = []  # type: List[Tuple[int, str]]
+    previous = getattr(_RECORDING, 'stamps', None)
+    _RECORDING.stamps = stamps
+    try:
+        yield stamps
+    finally:
+        _RECORDING.stamps = previous
+
+
+def relative_times_current(__stamps: Iterable[Tuple[int, str]]) -> bool:
+    """Check recorded relative times still read the same.
+
+    Args:
+        __stamps: Timestamps and text, see :func:`record_relative_times`
+
+    Returns:
+        ``True`` if formatting the times now produces the same text
+    """
+    return all(human_timestamp(EPOCH + datetime.timedelta(seconds=stamp))
+               == text for stamp, text in __stamps)
+
+
+def template_sources(__group: str,
+                     __name: str) -> List[Tuple[str, Optional[float]]]:
+    """Find the files a template is rendered from.
+
+    Templates are searched for the names of any templates they import or
+    include, so that a change to a theme is noticed too.
+
+    Args:
+        __group: Template group identifier
+        __name: Template name
+
+    Returns:
+        Location and modification time of each template file
+    """
+    template_set = utils.get_git_config_val('hubugs.templates', 'default')
+    pending = ['/'.join([template_set, __group, __name]).replace('//', '/'), ]
+    seen = set()
+    sources = []
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source, filename, _ = ENV.loader.get_source(ENV, name)
+        try:
+            mtime = os.path.getmtime(filename) if filename else None
+        except OSError:
+            mtime = None
+        sources.append((filename or name, mtime))
+        pending.extend(n for n in jinja2.meta.find_referenced_templates(
+            ENV.parse(source)) if n)
+    return sources
+
+
+def render_recorded(__name: str, __context: Dict[str, Any]
+                    ) -> Tuple[str, List[Tuple[int, str]]]:
+    """Render a template, recording the relative times it formats.
+
+    Args:
+        __name: Full template name
+        __context: Values to pass to template
+
+    Returns:
+        Rendered output, and its relative times
+    """
+    with record_relative_times() as stamps:
+        text = ENV.get_template(__name).render(**__context)
+    return text, stamps
+
+
+def render_batch(__name: str, __contexts: List[Dict[str, Any]],
+                 workers: Optional[int] = None
+                 ) -> List[Tuple[str, List[Tuple[int, str]]]]:
+    """Render a template for each of many contexts.
+
+    Converting Markdown to text is pure Python and slow, so large batches
+    are spread over a process pool.  Models are sent to workers as their
+    plain JSON data, see :meth:`hubugs.models.Model.__reduce__`.
+
+    Args:
+        __name: Full template name
+        __contexts: Values to pass to template, for each output
+        workers: Number of processes, defaults to the number of CPUs
+
+    Returns:
+        Rendered output and its relative times, in context order
+    """
+    workers = min(workers or os.cpu_count() or 1, len(__contexts))
+    if len(__contexts) < POOL_MIN_BATCH or workers < 2:
+        return [render_recorded(__name, c) for c in __contexts]
+    with trace.span('render_batch', 'template', template=__name,
+                    count=len(__contexts)):
+        with futures.ProcessPoolExecutor(workers) as executor:
+            # Small chunks keep workers busy when costs vary between outputs
+            chunksize = max(len(__contexts) // (4 * workers), 1)
+            return list(executor.map(functools.partial(render_recorded,
+                                                       __name),
+                                     __contexts, chunksize=chunksize))
+
+
+def sort_bugs(__bugs: List[Dict[str, str]], __order: str) -> List[Any]:
+    """Sort bugs for display.
+
+    Args:
+        __bugs: Bugs to sort
+        __order: Sorting order for displaying bugs
+
+    Returns:
+        Sorted bugs
+    """
+    # Match ordering method to bug attribute
+    if __order == 'updated':
+        attr = 'updated_at'
+    else:
+        attr = __order
+
+    return sorted(__bugs, key=operator.attrgetter(attr))
+
+
+def listing_fields() -> Optional[FrozenSet[str]]:
+    """Find fields needed to display bug listings.
+
+    Returns:
+        Fields used by ``view/list.txt``, along with those needed for sorting
+        and the completion index, or ``None`` if all fields are needed
+    """
+    fields = template_fields('view', 'list.txt')
+    if fields is None:
+        return None
+    return fields | LISTING_FIELDS
+
+
+class ListFormatter:
+
+    """Fast renderer for the built-in ``view/list.txt`` template.
+
+    Rows are formatted with plain string operations, and the theme’s escape
+    sequences are computed once, so large listings avoid Jinja’s per-row
+    overhead.  Output is identical to the template’s.
+    """
+
+    def __init__(self, __theme: Any):
+        """Configure a new formatter.
+
+        Args:
+            __theme: Module for the built-in ``view/theme.txt`` template
+        """
+        def escapes(colour):
+            return tuple(click.style('\0', colour).split('\0'))
+        self.heading = escapes(__theme.heading_colour)
+        self.highlight = escapes(__theme.highlight_colour)
+        self.label = escapes(__theme.label_colour)
+        self.milestone = escapes(__theme.milestone_colour)
+
+    def render(self, bugs: List[Any], spacer: str, id_len: int,
+               max_title: int, repos: Optional[List[str]], repo_len: int,
+               **extras) -> str:
+        """Render a bug listing.
+
+        Arguments match the template’s variables, see :func:`display_bugs`.
+
+        Returns:
+            Rendered listing
+        """
+        with trace.span('render', 'template', template='default/view/list.txt',
+                        fast=True):
+            heading, highlight = self.heading, self.highlight
+            label_start, label_end = self.label
+            m_start, m_end = self.milestone
+            id_format = '%2d' if id_len == 1 else '%{:d}d'.format(id_len)
+            lines = ['{}{}Id{} {}{}Title{}'.format(
+                heading[0] + '%-*s' % (repo_len, 'Repo') + heading[1]
+                if repos else '', heading[0], heading[1], spacer, heading[0],
+                heading[1]), ]
+            for index, bug in enumerate(bugs):
+                milestone = bug.milestone
+                if milestone:
+                    milestone = ' {' + m_start + str(milestone.title) \
+                        + m_end + '}'
+                else:
+                    milestone = ''
+                labels = bug.labels
+                if labels:
+                    labels = jinja2.filters.do_truncate(
+                        ENV,
+                        ' [' + label_start
+                        + ', '.join(str(label.name) for label in labels)
+                        + label_end + ']',
+                        max_title, True)
+                else:
+                    labels = ''
+                lines.append('{}{}{}{} {}'.format(
+                    '%-*s' % (repo_len, repos[index]) if repos else '',
+                    highlight[0], id_format % bug.number, highlight[1],
+                    bug.title + milestone + labels))
+            lines.append('')
+            term = extras.get('term')
+            lines.append('{}{}{} {} bug{} found{}'.format(
+                heading[0], len(bugs), heading[1], extras.get('state', ''),
+                '' if len(bugs) == 1 else 's',
+                ' matching {}{}{}'.format(heading[0], term, heading[1])
+                if term else ''))
+            return '\n'.join(lines)
+
+
+def list_formatter() -> Optional[ListFormatter]:
+    """Find fast renderer for bug listings.
+
+    Returns:
+        Formatter, if the built-in ``view/list.txt`` and ``view/theme.txt``
+        templates are in use
+    """
+    template = get_template('view', 'list.txt')
+    theme = ENV.get_template('default/view/theme.txt')
+    if template.name != 'default/view/list.txt' \
+            or not all((t.filename or '').startswith(PKG_TEMPLATES + os.sep)
+                       for t in (template, theme)):
+        return None
+    global _LIST_FORMATTER
+    if _LIST_FORMATTER is None or _LIST_FORMATTER[0] is not theme:
+        _LIST_FORMATTER = (theme, ListFormatter(theme.module))
+    return _LIST_FORMATTER[1]
+
+
+def display_bugs(__bugs: List[Dict[str, str]], __order: str,
+                 repos: Optional[List[str]] = None, **extras) -> str:
     """Display bugs to users.
 
     Args:
         __bugs: Bugs to display
         __order: Sorting order for displaying bugs
+        repos: Repository for each bug, when listing multiple projects.  The
+            bugs must already be in display order.
         extras: Additional values to pass to templates
 
     Returns:
@@ -175,25 +549,22 @@ def display_bugs(__bugs: List[Dict[str, str]], __order: str, **extras) -> str:
     if not __bugs:
         return success('No bugs found!')
 
-    # Match ordering method to bug attribute
-    if __order == 'updated':
-        attr = 'updated_at'
-    else:
-        attr = __order
-
-    __bugs = sorted(__bugs, key=operator.attrgetter(attr))
+    if not repos:
+        __bugs = sort_bugs(__bugs, __order)
 
     # Default to 80 columns, when stdout is not a tty
-    columns = click.get_terminal_size()[0]
+    columns = shutil.get_terminal_size()[0]
 
-    template = get_template('view', 'list.txt')
+    template = list_formatter() or get_template('view', 'list.txt')
 
     max_id = max(i.number for i in __bugs)
     id_len = len(str(max_id))
     spacer = ' ' * (id_len - 2)
+    repo_len = max(len(r) for r in repos) + 1 if repos else 0
 
     return template.render(bugs=__bugs, spacer=spacer, id_len=id_len,
-                           max_title=columns - id_len - 2, **extras)
+                           max_title=columns - id_len - repo_len - 2,
+                           repos=repos, repo_len=repo_len, **extras)
 
 
 def edit_text(edit_type: Optional[str] = 'default',
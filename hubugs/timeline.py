@@ -0,0 +1,176 @@
+#
+"""timeline - Incrementally cached issue timelines."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# GitHub returns timelines oldest first, and offers no way to ask for events
+# after a given one.  Cached events are instead used as a cursor: the page
+# holding the newest cached event is fetched again, along with any that
+# follow it.  That page also confirms the cache still lines up with GitHub’s
+# copy, as events can vanish when comments are deleted, and the full
+# timeline is fetched again if it doesn’t.
+
+import json
+import os
+
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse
+
+from jnrbase.attrdict import AttrDict
+from jnrbase.iso_8601 import parse_datetime
+
+from . import cache
+
+#: Events requested per page
+PER_PAGE = 100
+
+
+def event_key(__event: Dict[str, Any]) -> Tuple:
+    """Identify a timeline event.
+
+    Not all events have an ``id``, for example cross-references.
+
+    Args:
+        __event: Timeline event
+
+    Returns:
+        Value identifying event
+    """
+    return (__event.get('id'), __event.get('event'),
+            __event.get('created_at'))
+
+
+class TimelineCache:
+
+    """On-disk store of issues’ timeline events.
+
+    Attributes:
+        directory: Location of store
+    """
+
+    def __init__(self, __host_url: str, __project: str):
+        """Configure a new timeline cache.
+
+        Args:
+            __host_url: GitHub host the timelines are fetched from
+            __project: GitHub project the timelines belong to
+        """
+        host = urlparse(__host_url).netloc or __host_url
+        self.directory = cache.cache_dir('timeline', host,
+                                         *__project.split('/'))
+
+    def path(self, __number: int) -> str:
+        """Find location of an issue’s events.
+
+        Args:
+            __number: Issue number
+
+        Returns:
+            Location of stored events
+        """
+        return os.path.join(self.directory, '{:d}.json'.format(__number))
+
+    def get(self, __number: int) -> List[Dict[str, Any]]:
+        """Fetch stored events.
+
+        Args:
+            __number: Issue number
+
+        Returns:
+            Stored events, oldest first
+        """
+        try:
+            with open(self.path(__number), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def save(self, __number: int, __events: List[Dict[str, Any]]):
+        """Replace stored events.
+
+        Args:
+            __number: Issue number
+            __events: Events, oldest first
+        """
+        cache.write_atomic(self.path(__number),
+                           json.dumps(__events).encode())
+
+
+def fetch(__globs: AttrDict,
+          __number: int) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Fetch an issue’s timeline, reusing stored events.
+
+    Args:
+        __globs: Global argument configuration
+        __number: Issue number
+
+    Returns:
+        Events oldest first, and the number of pages fetched and new events
+    """
+    store = TimelineCache(__globs.host_url, __globs.project)
+    cached = store.get(__number)
+    known = len(cached)
+    stats = {'pages': 0, 'new': 0}
+    while True:
+        page = (len(cached) - 1) // PER_PAGE + 1 if cached else 1
+        skip = (page - 1) * PER_PAGE
+        fetched = []  # type: List[Dict[str, Any]]
+        for events in __globs.req_pages('{}/timeline'.format(__number),
+                                        params={'per_page': PER_PAGE,
+                                                'page': page}):
+            stats['pages'] += 1
+            fetched.extend(events)
+        overlap = cached[skip:]
+        if [event_key(e) for e in fetched[:len(overlap)]] \
+                == [event_key(e) for e in overlap]:
+            break
+        # History has changed underneath us, start again
+        cached = []
+    events = cached[:skip] + fetched
+    stats['new'] = max(len(events) - known, 0)
+    if fetched != overlap:
+        store.save(__number, events)
+    return events, stats
+
+
+def prepare(__events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Prepare events for templates.
+
+    Plain objects are used, rather than :mod:`hubugs.models` objects, as
+    events contain keys that aren’t valid attribute names such as
+    ``rename.from``.
+
+    Args:
+        __events: Timeline events
+
+    Returns:
+        Events with a parsed ``created_at`` time, and an ``actor`` for all
+        events
+    """
+    prepared = []
+    for event in __events:
+        stamp = event.get('created_at') or event.get('author', {}).get('date')
+        prepared.append(dict(
+            event,
+            created_at=parse_datetime(stamp).replace(tzinfo=None)
+            if stamp else None,
+            actor=event.get('actor') or event.get('user')
+            or {'login': event.get('author', {}).get('name', 'unknown')},
+        ))
+    return prepared
@@ -0,0 +1,145 @@
+#
+"""trace - Request tracing support for hubugs."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+from typing import Any, Dict, Iterator, List, Optional  # NOQA: F401
+
+#: Active tracer, if tracing is enabled
+TRACER = None  # type: Optional[Tracer]
+
+
+class Tracer:
+
+    """Collect timing events in Chrome’s trace event format.
+
+    The output can be loaded in to ``chrome://tracing``, or any of the other
+    tools that support the format.
+
+    See https://github.com/catapult-project/catapult/wiki/Trace-Event-Format
+
+    Attributes:
+        events: Recorded trace events
+    """
+
+    def __init__(self):
+        """Configure a new tracer."""
+        self.events = []  # type: List[Dict[str, Any]]
+        self._pid = os.getpid()
+        self._start = time.perf_counter()
+        self.events.append({
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': self._pid,
+            'tid': 0,
+            'args': {'name': 'hubugs'},
+        })
+
+    def timestamp(self) -> float:
+        """Current trace timestamp, in microseconds."""
+        return (time.perf_counter() - self._start) * 1e6
+
+    def complete(self, __name: str, __category: str, __start: float,
+                 __duration: float, **args):
+        """Record a complete event.
+
+        Args:
+            __name: Event name
+            __category: Event category
+            __start: Event start time, in microseconds
+            __duration: Event duration, in microseconds
+            args: Additional data to attach to event
+        """
+        self.events.append({
+            'name': __name,
+            'cat': __category,
+            'ph': 'X',
+            'ts': round(__start, 3),
+            'dur': round(__duration, 3),
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+    def write(self, __path: str):
+        """Write trace data.
+
+        Args:
+            __path: File to write trace data to
+        """
+        with open(__path, 'w') as f:
+            json.dump({'traceEvents': self.events,
+                       'displayTimeUnit': 'ms'}, f, indent=1, default=str)
+
+
+def enable() -> Tracer:
+    """Start recording trace events.
+
+    Returns:
+        Active tracer
+    """
+    global TRACER
+    TRACER = Tracer()
+    return TRACER
+
+
+def disable(__path: Optional[str] = None):
+    """Stop recording trace events.
+
+    Args:
+        __path: File to write trace data to
+    """
+    global TRACER
+    if TRACER and __path:
+        TRACER.write(__path)
+    TRACER = None
+
+
+@contextlib.contextmanager
+def span(__name: str, __category: Optional[str] = 'hubugs',
+         **args) -> Iterator[Dict[str, Any]]:
+    """Record the duration of a block.
+
+    The yielded dictionary can be updated to attach data to the event that is
+    only known once the block has executed.  When tracing isn’t enabled this
+    does nothing.
+
+    Args:
+        __name: Event name
+        __category: Event category
+        args: Additional data to attach to event
+
+    Yields:
+        Event data
+    """
+    tracer = TRACER
+    if not tracer:
+        yield args
+        return
+    start = tracer.timestamp()
+    try:
+        yield args
+    finally:
+        tracer.complete(__name, __category, start, tracer.timestamp() - start,
+                        **args)
@@ -19,25 +19,32 @@
 # You should have received a copy of the GNU General Public License along with
 # hubugs.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import configparser
+import contextlib
 import json
 import os
 import re
 import subprocess
 import sys
+import threading
 
+from concurrent import futures
 from functools import partial
-from typing import List, Optional
-from urllib.parse import urlencode
+from queue import Queue
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import click
 import httplib2
 
 from jnrbase.attrdict import AttrDict
 from jnrbase.colourise import warn
-from jnrbase.xdg_basedir import user_cache
 
-from . import (_version, models)
+import hubugs_client
+
+from . import (_version, cache, models, trace)
 
 try:
     import ca_certs_locater
@@ -46,6 +53,19 @@ except ImportError:
     CA_CERTS = None
 
 
+#: Git configuration values, along with the state of the files they were read
+#: from.  Long running processes enable this by setting it to a :obj:`dict`,
+#: see :mod:`hubugs.daemon`
+CONFIG_CACHE = None  # type: Optional[Dict[Tuple[str, str, bool], Tuple]]
+
+#: Maximum number of pages to fetch concurrently, for listings that allow it
+PAGE_WORKERS = 4
+
+#: HTTP sessions for each thread, keyed by cache directory, so that
+#: connections are reused
+_SESSIONS = threading.local()
+
+
 class HttpClientError(ValueError):
 
     """Error raised for client error status codes."""
@@ -61,21 +81,153 @@ class RepoError(ValueError):
     """Error raised for invalid repository values."""
 
 
+class Http(httplib2.Http):
+
+    """HTTP session that counts the requests which reach the network.
+
+    This allows us to tell fresh cache hits apart from revalidated responses,
+    as :mod:`httplib2` marks both as ``fromcache``.
+
+    Attributes:
+        network_requests: Number of requests sent to the server
+    """
+
+    network_requests = 0
+
+    def _request(self, *args, **kwargs):
+        self.network_requests += 1
+        return super(Http, self)._request(*args, **kwargs)
+
+
+class SingleFlight:
+
+    """Share the results of identical calls.
+
+    Concurrent calls with the same key are coalesced, so that only the first
+    does any work and the rest wait for its result.  Successful results are
+    then memoised until :meth:`invalidate` is called.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # type: Dict[Any, futures.Future]
+        self._results = {}  # type: Dict[Any, Any]
+        self._generation = 0
+
+    def do(self, __key: Any, __func: Callable[[], Any],
+           memoise: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+        """Call a function, or share the result of an identical call.
+
+        Args:
+            __key: Value identifying call
+            __func: Function to call
+            memoise: Check whether a result may be memoised, defaults to
+                memoising all results
+
+        Returns:
+            Result, and whether it was freshly ``called``, ``shared`` with a
+            concurrent call or ``memoised``
+        """
+        with self._lock:
+            if __key in self._results:
+                return self._results[__key], 'memoised'
+            future = self._calls.get(__key)
+            leader = future is None
+            if leader:
+                future = self._calls[__key] = futures.Future()
+            generation = self._generation
+        if not leader:
+            return future.result(), 'shared'
+        try:
+            result = __func()
+        except BaseException as error:
+            with self._lock:
+                del self._calls[__key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._calls[__key]
+            # Results begun before an invalidation may already be stale
+            if generation == self._generation \
+                    and (memoise is None or memoise(result)):
+                self._results[__key] = result
+        future.set_result(result)
+        return result, 'called'
+
+    def invalidate(self):
+        """Drop memoised results."""
+        with self._lock:
+            self._results.clear()
+            self._generation += 1
+
+
 def get_github_api():
     """Create a GitHub API instance.
 
     Returns:
-        httplib2.Http: GitHub HTTP session
+        Http: GitHub HTTP session
     """
-    cache_dir = user_cache('hubugs')
-    with open('{}/CACHEDIR.TAG'.format(cache_dir), 'w') as f:
-        f.writelines([
-            'Signature: 8a477f597d28d172789f06886806bc55\n',
-            '# This file is a cache directory tag created by hubugs.\n',
-            '# For information about cache directory tags, see:\n',
-            '#   http://www.brynosaurus.com/cachedir/\n',
-            ])
-    return httplib2.Http(cache_dir, ca_certs=CA_CERTS)
+    cache_dir = cache.cache_dir()
+    # httplib2 sessions can’t be shared between threads
+    if not hasattr(_SESSIONS, 'sessions'):
+        _SESSIONS.sessions = {}  # type: Dict[str, Http]
+    sessions = _SESSIONS.sessions
+    if cache_dir not in sessions:
+        with open('{}/CACHEDIR.TAG'.format(cache_dir), 'w') as f:
+            f.writelines([
+                'Signature: 8a477f597d28d172789f06886806bc55\n',
+                '# This file is a cache directory tag created by hubugs.\n',
+                '# For information about cache directory tags, see:\n',
+                '#   http://www.brynosaurus.com/cachedir/\n',
+                ])
+        sessions[cache_dir] = Http(cache_dir, ca_certs=CA_CERTS)
+    return sessions[cache_dir]
+
+
+def git_config_state() -> Tuple:
+    """Describe the state of git configuration files.
+
+    This is used to check cached values in :data:`CONFIG_CACHE`.  Files pulled
+    in with ``include`` directives aren’t checked.
+
+    Returns:
+        Location, modification time and size of each configuration file
+    """
+    home = os.path.expanduser('~')
+    files = [
+        '/etc/gitconfig',
+        os.path.join(os.getenv('XDG_CONFIG_HOME',
+                               os.path.join(home, '.config')), 'git',
+                     'config'),
+        os.path.join(home, '.gitconfig'),
+    ]
+    directory = os.getcwd()
+    while True:
+        git_dir = os.path.join(directory, '.git')
+        if os.path.isfile(git_dir):
+            # Worktrees and submodules point to their real location
+            with open(git_dir) as f:
+                git_dir = os.path.join(directory,
+                                       f.read().split(':', 1)[1].strip())
+            files.append(os.path.join(git_dir, 'config'))
+            git_dir = os.path.join(git_dir, '..', '..')
+        if os.path.isdir(git_dir):
+            files.append(os.path.join(git_dir, 'config'))
+            break
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    state = [tuple(sorted((k, v) for k, v in os.environ.items()
+                          if k.startswith('GIT_'))), ]
+    for name in files:
+        try:
+            stat = os.stat(name)
+        except OSError:
+            state.append((name, None))
+        else:
+            state.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(state)
 
 
 def get_git_config_val(__key: str, default: Optional[str] = None,
@@ -90,13 +242,18 @@ def get_git_config_val(__key: str, default: Optional[str] = None,
     Return:
         Git config value, if set
     """
-    cmd = ['git', 'config', ]
-    if local_only:
-        cmd.append('--local')
-    cmd.extend(['--get', __key])
-    try:
-        output = subprocess.check_output(cmd).decode().strip()
-    except subprocess.CalledProcessError:
+    if CONFIG_CACHE is not None:
+        cache_key = (os.getcwd(), __key, local_only)
+        state = git_config_state()
+        cached = CONFIG_CACHE.get(cache_key)
+        if cached and cached[0] == state:
+            output = cached[1]
+        else:
+            output = _git_config_get(__key, local_only)
+            CONFIG_CACHE[cache_key] = (state, output)
+    else:
+        output = _git_config_get(__key, local_only)
+    if output is None:
         output = default
     if output and output.startswith('!'):
         try:
@@ -108,6 +265,18 @@ def get_git_config_val(__key: str, default: Optional[str] = None,
     return output
 
 
+def _git_config_get(__key: str, __local_only: bool) -> Optional[str]:
+    cmd = ['git', 'config', ]
+    if __local_only:
+        cmd.append('--local')
+    cmd.extend(['--get', __key])
+    try:
+        with trace.span('git config', 'subprocess', key=__key):
+            return subprocess.check_output(cmd).decode().strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
 def set_git_config_val(__key: str, __value: str,
                        local_only: Optional[bool] = False):
     """Set a git configuration value.
@@ -168,17 +337,7 @@ def get_repo() -> str:
     if not data:
         raise RepoError('Unable to guess project from repository')
 
-    match = re.match(
-        r"""
-        (?:git(?:@|://)  # SSH or git protocol
-          |git\+ssh://(?:git@)  # hg-git SSH URLs
-          |https?://
-           (?:.*@)?)  # HTTP URLs support optional auth data
-        github.com[:/]  # hostname, : sep for SSH URL
-        ([^/]+/.*?)  # project
-        (?:.git)?$  # .git suffix is optional in all clone URLs
-        """,
-        data, re.VERBOSE)
+    match = hubugs_client.PROJECT_URL.match(data)
     if match:
         return match.groups()[0]
     else:
@@ -186,6 +345,100 @@ def get_repo() -> str:
                         "‘--project’ option")
 
 
+def parse_link(__header: Optional[str]) -> Dict[str, str]:
+    """Parse a pagination ``Link`` header.
+
+    Args:
+        __header: Header value
+
+    Returns:
+        Link targets, keyed by relation
+    """
+    links = {}
+    for target, rel in re.findall(r'<([^>]*)>\s*;\s*rel="([^"]*)"',
+                                  __header or ''):
+        links[rel] = target
+    return links
+
+
+def page_urls(__next: str, __last: str) -> List[str]:
+    """Build URLs for a range of pages.
+
+    Args:
+        __next: URL of first page to fetch, from a ``Link`` header
+        __last: URL of final page, from a ``Link`` header
+
+    Returns:
+        URL of each page from ``__next`` to ``__last``
+    """
+    parts = urlsplit(__next)
+    query = parse_qsl(parts.query)
+    first = int(dict(query)['page'])
+    last = int(dict(parse_qsl(urlsplit(__last).query))['page'])
+    return [
+        urlunsplit(parts._replace(query=urlencode([
+            (k, str(page) if k == 'page' else v) for k, v in query
+        ])))
+        for page in range(first, last + 1)
+    ]
+
+
+def prefetch(__iterable: Iterable[Any], size: int = 2) -> Iterator[Any]:
+    """Consume an iterable in a background thread.
+
+    This allows slow iterables, such as paginated API results, to make
+    progress while the caller is waiting on something else.
+
+    Args:
+        __iterable: Iterable to consume
+        size: Maximum number of items to fetch ahead of the caller
+
+    Returns:
+        Items from iterable, in order
+    """
+    queue = Queue(size)  # type: Queue
+    done = object()
+
+    def worker():
+        try:
+            for item in __iterable:
+                queue.put((item, None))
+        except Exception as error:  # pylint: disable=broad-except
+            queue.put((done, error))
+        else:
+            queue.put((done, None))
+
+    def consume():
+        while True:
+            item, error = queue.get()
+            if error:
+                raise error
+            elif item is done:
+                return
+            yield item
+
+    # Start immediately, not on the first request for an item
+    threading.Thread(target=worker, daemon=True).start()
+    return consume()
+
+
+def tag_records(__pages: Iterable[List[Dict[str, Any]]],
+                **fields) -> Iterator[Dict[str, Any]]:
+    """Add fields to each record in a paginated stream.
+
+    Args:
+        __pages: Batches of records
+        fields: Fields to add to records
+
+    Returns:
+        Individual records, with additional fields
+    """
+    for page in __pages:
+        for record in page:
+            record.update(fields)
+            yield record
+
+
 def pager(__text: str, pager: Optional[bool] = False):
     """Pass output through pager.
 
@@ -199,6 +452,22 @@ def pager(__text: str, pager: Optional[bool] = False):
         click.echo(__text)
 
 
+def spawn_detached(__args: List[str]):
+    """Run a hubugs command in the background.
+
+    The command runs in a new session, with its standard streams closed, so
+    that it outlives the current process and never writes to the terminal.
+
+    Args:
+        __args: Command line arguments
+    """
+    subprocess.Popen(
+        [sys.executable, '-c',
+         'import sys, hubugs; sys.exit(hubugs.main(sys.argv[1:]))'] + __args,
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, start_new_session=True, close_fds=True)
+
+
 def setup_environment(__project, __host_url):
     """Configure execution environment for commands dispatch."""
     env = AttrDict()
@@ -206,7 +475,8 @@ def setup_environment(__project, __host_url):
     if not __project:
         __project = get_repo()
 
-    http = get_github_api()
+    # Identical GETs made during this invocation share a single response
+    memo = SingleFlight()
 
     base_headers = {
         'Accept': 'application/vnd.github.v3+json',
@@ -218,7 +488,7 @@ def setup_environment(__project, __host_url):
         base_headers['Authorization'] = 'token {}'.format(token)
 
     def http_method(__url, method='GET', params=None, body=None, headers=None,
-                    model=None, is_json=True, token=True):
+                    model=None, is_json=True, token=True, fields=None):
         lheaders = base_headers.copy()
         if token and 'Authorization' not in lheaders:
             raise EnvironmentError('No hubugs authorisation token found!  '
@@ -233,24 +503,138 @@ def setup_environment(__project, __host_url):
             __url += '?' + urlencode(params)
         if is_json and body:
             body = json.dumps(body)
-        r, c = http.request(__url, method=method, body=body, headers=lheaders)
-        if is_json:
-            c = json.loads(c.decode('utf-8'),
-                           object_hook=partial(models.object_hook,
-                                               __name=model))
+        with trace.span(method, 'http', url=__url) as event:
+            def send():
+                http = get_github_api()
+                sent = http.network_requests
+                r, c = http.request(__url, method=method, body=body,
+                                    headers=lheaders)
+                if not r.fromcache:
+                    event['cache'] = 'miss'
+                elif http.network_requests > sent:
+                    event['cache'] = 'revalidated'
+                else:
+                    event['cache'] = 'hit'
+                return r, c
+            if method != 'GET':
+                # Any change may be visible through other resources, such as
+                # listings or the repository’s open issue count
+                memo.invalidate()
+                r, c = send()
+            elif 'Cache-Control' in lheaders:
+                # Explicit cache directives ask for the server’s current copy
+                r, c = send()
+            else:
+                key = (__url, tuple(sorted(lheaders.items())))
+                (r, c), how = memo.do(key, send,
+                                      lambda resp: resp[0].status < 400)
+                if how != 'called':
+                    event['cache'] = how
+            event.update({
+                'status': r.status,
+                'bytes': len(c),
+                'ratelimit_remaining': r.get('x-ratelimit-remaining'),
+            })
+        if str(r.status)[0] == '4':
+            c = models.decode(c, model)
+        elif is_json:
+            c = models.decode(c, model, fields=fields)
         if str(r.status)[0] == '4':
             raise HttpClientError(str(r.status), r, c)
         return r, c
 
     env['req_get'] = http_method
     env['req_post'] = partial(http_method, method='POST')
+    env['req_memo'] = memo
+
+    def paged_get(__url, params=None, key=None, workers=1, headers=None,
+                  validators=None):
+        # An empty URL is valid, it is the project’s issue list.  Each page’s
+        # ETag is appended to validators, if given, as it is returned.
+        while __url is not None:
+            r, c = http_method(__url, params=params, is_json=False,
+                               headers=headers)
+            if validators is not None:
+                validators.append(r.get('etag'))
+            links = parse_link(r.get('link'))
+            if workers > 1 and 'next' in links and 'last' in links:
+                # Remaining pages are requested before this one is returned
+                rest = prefetch(concurrent_pages(links['next'],
+                                                 links['last'], workers,
+                                                 headers, validators),
+                                workers)
+            else:
+                rest = None
+            c = models.decode(c, raw=True)
+            yield c[key] if key else c
+            if rest is not None:
+                for c in rest:
+                    yield c[key] if key else c
+                return
+            # The next link includes our parameters
+            __url = links.get('next')
+            params = None
+
+    def concurrent_pages(__next, __last, __workers, headers=None,
+                         validators=None):
+        # Once the last page is known the remaining URLs can be built
+        # directly, instead of waiting to read each page’s next link.  Only
+        # a few pages are fetched ahead of the caller, to bound memory use.
+        def page(__future):
+            r, c = __future.result()
+            if validators is not None:
+                validators.append(r.get('etag'))
+            return models.decode(c, raw=True)
+
+        window = collections.deque()
+        with futures.ThreadPoolExecutor(__workers) as executor:
+            for url in page_urls(__next, __last):
+                window.append(executor.submit(http_method, url,
+                                              is_json=False,
+                                              headers=headers))
+                if len(window) > 2 * __workers:
+                    yield page(window.popleft())
+            while window:
+                yield page(window.popleft())
+    env['req_pages'] = paged_get
+
+    ttl = get_git_config_val('hubugs.metadata-ttl',
+                             str(cache.DEFAULT_TTL))
+    if not re.fullmatch(r'\s*\d+\s*', ttl):
+        click.echo(warn('Invalid hubugs.metadata-ttl value {!r}, using {:d} '
+                        'seconds'.format(ttl, cache.DEFAULT_TTL)), err=True)
+        ttl = cache.DEFAULT_TTL
+    metadata = cache.MetadataCache(__host_url, __project, ttl=int(ttl))
+
+    completion = cache.CompletionIndex(__host_url, __project)
+
+    def cached_get(__kind, __url, model=None):
+        fetched = []
+
+        def fetch():
+            fetched.append(True)
+            r, c = http_method(__url, is_json=False)
+            if r.status != 200:
+                # Anything else would be kept for the whole TTL
+                raise EnvironmentError(r.status, 'Unexpected {} response for '
+                                       '{}'.format(r.status, __url))
+            return c
+        c = models.decode(metadata.get(__kind, fetch), model)
+        if fetched and __kind in hubugs_client.COMPLETIONS:
+            completion.refresh(__kind, c)
+        return c
+    env['cached_get'] = cached_get
+    env['metadata'] = metadata
+    env['completion'] = completion
+    env['rendered'] = cache.RenderCache(__host_url)
 
     def repo_obj():
-        r, c = http_method('{}/repos/{}'.format(__host_url, __project),
-                           model='Repo')
+        c = cached_get('repo', '{}/repos/{}'.format(__host_url, __project),
+                       model='Repo')
         if not c.has_issues:
             raise RepoError(
-                "Issues aren’t enabled for {:!r}".format(__project))
+                "Issues aren’t enabled for {!r}".format(__project))
+        return c
     env['repo_obj'] = repo_obj
     return env
 
@@ -258,6 +642,9 @@ def setup_environment(__project, __host_url):
 def sync_labels(__globs: AttrDict, __add, __create) -> List[str]:
     """Manage labels for a project.
 
+    Label names are served from the metadata cache, which is refreshed if an
+    unknown label is requested and invalidated when labels are created.
+
     Args:
         globs: Global argument configuration
 
@@ -265,16 +652,25 @@ def sync_labels(__globs: AttrDict, __add, __create) -> List[str]:
         List of project’s label names
     """
     labels_url = '{}/repos/{}/labels'.format(__globs.host_url, __globs.project)
-    r, c = globs.req_get(labels_url, model='Label')
+    c = __globs.cached_get('labels', labels_url, model='Label')
     label_names = [label.name for label in c]
 
+    if any(label not in label_names for label in __add):
+        # Labels may have been added since our cached copy was made
+        __globs.metadata.invalidate('labels')
+        c = __globs.cached_get('labels', labels_url, model='Label')
+        label_names = [label.name for label in c]
     for label in __add:
         if label not in label_names:
             raise ValueError('No such label {!r}'.format(label))
+    created = []
     for label in __create:
         if label in label_names:
             warn('{!r} label already exists'.format(label))
         else:
             data = {'name': label, 'color': '000000'}
-            globs.req_post(labels_url, body=data, model='Label')
-    return label_names + add + create
+            __globs.req_post(labels_url, body=data, model='Label')
+            created.append(label)
+    if created:
+        __globs.metadata.invalidate('labels')
+    return label_names + created
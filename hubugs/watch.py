@@ -0,0 +1,154 @@
+#
+"""watch - Poll GitHub for new and changed issues."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Each poll is a conditional request for a single, fixed, URL; the project’s
+# event feed or the watched issue itself.  Unchanged resources are answered
+# with 304 responses, which don’t count against the rate limit, and only when
+# something has changed are the issues or comments updated since the previous
+# poll fetched.
+
+import email.utils
+import itertools
+
+from typing import Any, Dict, List, Optional
+
+from jnrbase.attrdict import AttrDict
+
+#: Default delay between polls, in seconds
+DEFAULT_INTERVAL = 60
+
+#: Request headers forcing revalidation of cached responses, so that each poll
+#: is a conditional request
+REVALIDATE = {'Cache-Control': 'max-age=0'}
+
+
+class Watcher:
+
+    """Poll for changes to a project’s issues, or an issue’s comments.
+
+    Attributes:
+        interval: Minimum delay between polls, in seconds
+        poll_interval: Delay requested by the server with
+            ``X-Poll-Interval``, if any
+        polls: Number of polls made
+        not_modified: Number of polls answered with a 304 response
+    """
+
+    def __init__(self, __globs: AttrDict, bug: Optional[int] = None,
+                 params: Optional[Dict[str, str]] = None,
+                 interval: int = DEFAULT_INTERVAL):
+        """Configure a new watcher.
+
+        Args:
+            __globs: Global argument configuration
+            bug: Issue to watch comments on, defaults to watching all issues
+            params: Filters for the initial issue listing
+            interval: Minimum delay between polls, in seconds
+        """
+        self._globs = __globs
+        self._bug = bug
+        self._params = params or {}
+        self.interval = interval
+        self.poll_interval = None  # type: Optional[int]
+        self.polls = 0
+        self.not_modified = 0
+        self._seen = {}  # type: Dict[Any, str]
+        self._since = None  # type: Optional[str]
+        self._checked = None  # type: Optional[str]
+
+    @property
+    def delay(self) -> int:
+        """Delay before next poll, in seconds."""
+        return max(self.interval, self.poll_interval or 0)
+
+    def changed(self) -> bool:
+        """Check whether watched resource has changed.
+
+        Returns:
+            ``False`` if the server reported the resource as unmodified
+        """
+        if self._bug:
+            url = self._bug
+            params = None
+        else:
+            # The repository event feed, unlike the issue event feed, includes
+            # comments
+            url = '{}/repos/{}/events'.format(self._globs.host_url,
+                                              self._globs.project)
+            params = {'per_page': 1}
+        r, _ = self._globs.req_get(url, params=params, headers=REVALIDATE,
+                                   model='Event', is_json=False)
+        self.polls += 1
+        if r.get('date'):
+            # The server’s clock is used to find later changes, so that local
+            # clock skew doesn’t matter
+            stamp = email.utils.parsedate_to_datetime(r['date'])
+            self._checked = stamp.strftime('%Y-%m-%dT%H:%M:%SZ')
+        if r.get('x-poll-interval'):
+            self.poll_interval = int(r['x-poll-interval'])
+        if r.fromcache:
+            self.not_modified += 1
+            return False
+        return True
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        """Fetch issues, or comments, updated since the previous poll.
+
+        Returns:
+            Items in order of update
+        """
+        params = {'per_page': 100}
+        if self._bug:
+            url = '{}/comments'.format(self._bug)
+        else:
+            url = ''
+            params.update(self._params)
+            params.update({'sort': 'updated', 'direction': 'asc'})
+            if self._since:
+                # Report items leaving the listing’s filter too, such as
+                # issues being closed
+                params['state'] = 'all'
+        if self._since:
+            params['since'] = self._since
+        pages = self._globs.req_pages(url, params=params, headers=REVALIDATE)
+        items = list(itertools.chain.from_iterable(pages))
+        return sorted(items, key=lambda i: i['updated_at'])
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Check for new or changed items.
+
+        The first poll returns all items matching the watcher’s filters.
+
+        Returns:
+            Items that have been created or changed since the previous poll
+        """
+        if not self.changed() and self._since is not None:
+            return []
+        key = 'id' if self._bug else 'number'
+        new = []
+        for item in self.fetch():
+            if self._seen.get(item[key]) != item['updated_at']:
+                self._seen[item[key]] = item['updated_at']
+                new.append(item)
+        # Changes made between the check and the fetch are returned again by
+        # the next fetch, but are filtered out as they’ve been seen
+        self._since = self._checked or max(
+            [self._since or '', ] + [i['updated_at'] for i in new])
+        return new
@@ -0,0 +1,149 @@
+#
+"""webhook - Receive GitHub webhooks to keep the local store current."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Deliveries are handled one at a time, so events are applied to the store in
+# the order they’re received and only a single database connection is needed.
+
+import hashlib
+import hmac
+import json
+import logging
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Tuple
+
+from . import store
+
+#: Default port to listen on
+DEFAULT_PORT = 8642
+
+#: Largest payload accepted, GitHub caps deliveries at 25MB
+MAX_PAYLOAD = 25 * 2 ** 20
+
+
+def signature(__secret: bytes, __body: bytes) -> str:
+    """Calculate signature for a webhook payload.
+
+    Args:
+        __secret: Webhook secret
+        __body: Raw payload
+
+    Returns:
+        Signature, in ``X-Hub-Signature-256`` header format
+    """
+    return 'sha256=' + hmac.new(__secret, __body, hashlib.sha256).hexdigest()
+
+
+def verify(__secret: bytes, __body: bytes, __header: str) -> bool:
+    """Check a webhook payload’s signature.
+
+    Args:
+        __secret: Webhook secret
+        __body: Raw payload
+        __header: ``X-Hub-Signature-256`` header value
+
+    Returns:
+        Whether the payload was signed with our secret
+    """
+    return hmac.compare_digest(signature(__secret, __body),
+                               __header or '')
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    """Request handler for :class:`WebhookServer`."""
+
+    server_version = 'hubugs-webhook/1.0'
+
+    def log_message(self, format, *args):
+        logging.info(format, *args)
+
+    def reply(self, __status: int, __message: str):
+        body = __message.encode() + b'\n'
+        self.send_response(__status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        """Handle webhook delivery."""
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            return self.reply(400, 'Invalid Content-Length')
+        if length < 0:
+            return self.reply(400, 'Invalid Content-Length')
+        if length > MAX_PAYLOAD:
+            return self.reply(413, 'Payload too large')
+        body = self.rfile.read(length)
+        if not verify(self.server.secret, body,
+                      self.headers.get('X-Hub-Signature-256')):
+            return self.reply(401, 'Invalid signature')
+        event = self.headers.get('X-GitHub-Event', '')
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self.reply(400, 'Invalid payload')
+        if event == 'ping':
+            return self.reply(200, 'pong')
+        try:
+            applied = self.server.store.apply(event, payload)
+        except (KeyError, TypeError):
+            return self.reply(400, 'Unexpected {} payload'.format(event))
+        self.server.received += 1
+        if applied:
+            self.server.applied += 1
+            self.reply(200, 'Applied')
+        else:
+            self.reply(202, 'Ignored')
+
+
+class WebhookServer(HTTPServer):
+
+    """HTTP server applying webhook deliveries to an issue store.
+
+    Attributes:
+        secret: Webhook secret
+        store: Store events are applied to
+        received: Number of valid deliveries
+        applied: Number of deliveries applied to the store
+    """
+
+    def __init__(self, __address: Tuple[str, int], __secret: str,
+                 __store: store.IssueStore):
+        """Configure a new webhook receiver.
+
+        Args:
+            __address: Address to listen on
+            __secret: Webhook secret
+            __store: Store to apply events to
+        """
+        super(WebhookServer, self).__init__(__address, Handler)
+        self.secret = __secret.encode()
+        self.store = __store
+        self.received = 0
+        self.applied = 0
+
+    @property
+    def url(self) -> str:
+        """URL to configure as webhook’s payload URL."""
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/'.format(host, port)
@@ -0,0 +1,344 @@
+#
+"""hubugs_client - Command line entry point for hubugs.
+
+This module is deliberately tiny, and only uses the standard library, so that
+commands can be handed to a running :command:`hubugs daemon` without paying
+for importing :mod:`hubugs` and its dependencies.
+"""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import array
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+#: Length prefix for request messages
+HEADER = struct.Struct('!I')
+#: Exit status reply
+STATUS = struct.Struct('!i')
+
+#: Types of value that can be completed from the on-disk index
+COMPLETIONS = ('issues', 'labels', 'milestones')
+
+#: Default GitHub API location
+DEFAULT_HOST_URL = 'https://api.github.com'
+
+#: Global options that take a value
+VALUE_OPTIONS = ('-p', '--project', '-u', '--host-url', '--trace')
+
+#: Long running subcommands, which would block the daemon for other clients
+LOCAL_COMMANDS = ('proxy', 'report-bug', 'watch', 'webhook-listen')
+
+#: Subcommands that open an editor, unless one of these options is given
+EDITOR_COMMANDS = {
+    'close': ('-m', '--message', '--stdin'),
+    'comment': ('-m', '--message', '--stdin'),
+    'edit': ('--title', '--stdin'),
+    'open': ('--title', '--stdin'),
+    'reopen': ('-m', '--message', '--stdin'),
+}
+
+#: Match project name in clone URLs
+PROJECT_URL = re.compile(
+    r"""
+    (?:git(?:@|://)  # SSH or git protocol
+      |git\+ssh://(?:git@)  # hg-git SSH URLs
+      |https?://
+       (?:.*@)?)  # HTTP URLs support optional auth data
+    github.com[:/]  # hostname, : sep for SSH URL
+    ([^/]+/.*?)  # project
+    (?:.git)?$  # .git suffix is optional in all clone URLs
+    """,
+    re.VERBOSE)
+
+
+def subcommand(__argv: List[str]) -> Optional[int]:
+    """Find subcommand in command line arguments.
+
+    Args:
+        __argv: Command line arguments
+
+    Returns:
+        Position of subcommand, if one is given
+    """
+    args = enumerate(__argv)
+    for n, arg in args:
+        if arg in VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return n
+    return None
+
+
+def runs_locally(__argv: List[str]) -> bool:
+    """Check whether command must be run in this process.
+
+    Long running and interactive commands would otherwise hold the daemon,
+    blocking every other client until they finish.
+
+    Args:
+        __argv: Command line arguments
+
+    Returns:
+        Whether command shouldn’t be forwarded to the daemon
+    """
+    position = subcommand(__argv)
+    if position is None:
+        return False
+    command = __argv[position]
+    if '--pager' in __argv[:position]:
+        return True
+    if command in LOCAL_COMMANDS:
+        return True
+    if command in EDITOR_COMMANDS:
+        args = __argv[position + 1:]
+        if '--' in args:
+            args = args[:args.index('--')]
+        for arg in args:
+            for option in EDITOR_COMMANDS[command]:
+                if arg == option or arg.startswith(option + '='):
+                    return False
+                elif len(option) == 2 and arg.startswith(option):
+                    # Short option with attached value, such as -mtext
+                    return False
+        return True
+    return False
+
+
+def socket_path() -> str:
+    """Find location of daemon’s socket.
+
+    .. envvar:: HUBUGS_SOCKET
+
+        Override location of daemon socket
+
+    Returns:
+        Socket location, in the user’s runtime directory if it is set
+    """
+    path = os.getenv('HUBUGS_SOCKET')
+    if path:
+        return path
+    base = os.getenv('XDG_RUNTIME_DIR')
+    if not base:
+        base = os.getenv('XDG_CACHE_HOME',
+                         os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'hubugs', 'daemon.sock')
+
+
+def cache_home() -> str:
+    """Find hubugs cache directory, without creating it.
+
+    This matches the location used by :func:`hubugs.cache.cache_dir`.
+
+    Returns:
+        Location of cache directory
+    """
+    base = os.getenv('XDG_CACHE_HOME',
+                     os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'hubugs')
+
+
+def completion_dir(__host_url: str, __project: str) -> str:
+    """Find location of project’s completion index.
+
+    Args:
+        __host_url: GitHub host the project is hosted on
+        __project: GitHub project name
+
+    Returns:
+        Location of completion index
+    """
+    host = urlparse(__host_url).netloc or __host_url
+    return os.path.join(cache_home(), 'complete', host, *__project.split('/'))
+
+
+def complete(__argv: List[str]) -> int:
+    """Print completion candidates from the on-disk index.
+
+    Only the :option:`--project` and :option:`--host-url` options are
+    understood, otherwise values are read from the current repository’s
+    configuration.  Candidates are printed in :command:`zsh`’s ``_describe``
+    format.
+
+    Args:
+        __argv: Command line arguments, including ``_complete`` and the type of
+            value to complete
+
+    Returns:
+        Exit code
+    """
+    project = host_url = kind = None
+    args = iter(__argv)
+    for arg in args:
+        if arg in ('-p', '--project'):
+            project = next(args, None)
+        elif arg.startswith('--project='):
+            project = arg.split('=', 1)[1]
+        elif arg in ('-u', '--host-url'):
+            host_url = next(args, None)
+        elif arg.startswith('--host-url='):
+            host_url = arg.split('=', 1)[1]
+        elif arg == '_complete':
+            kind = next(args, None)
+    if kind not in COMPLETIONS:
+        print('Usage: hubugs _complete {{{}}}'.format('|'.join(COMPLETIONS)),
+              file=sys.stderr)
+        return 2
+
+    if not project or not host_url:
+        # A single git call, as this is run on every TAB press
+        try:
+            output = subprocess.check_output(
+                ['git', 'config', '--get-regexp',
+                 r'^(hubugs\.(project|host-url)|remote\.origin\.url)$'],
+                stderr=subprocess.DEVNULL).decode()
+        except (OSError, subprocess.CalledProcessError):
+            output = ''
+        config = dict(line.split(' ', 1) for line in output.splitlines()
+                      if ' ' in line)
+        if not host_url:
+            host_url = config.get('hubugs.host-url', DEFAULT_HOST_URL)
+        if not project:
+            project = config.get('hubugs.project')
+        if not project and 'remote.origin.url' in config:
+            match = PROJECT_URL.match(config['remote.origin.url'])
+            if match:
+                project = match.group(1)
+    if project and '/' not in project and os.getenv('GITHUB_USER'):
+        project = '/'.join([os.getenv('GITHUB_USER'), project])
+    if not project or '/' not in project:
+        return 1
+
+    try:
+        with open(os.path.join(completion_dir(host_url, project),
+                               kind)) as f:
+            sys.stdout.write(f.read())
+    except OSError:
+        pass
+    return 0
+
+
+def send_message(__sock: socket.socket, __data: Dict[str, Any],
+                 fds: Sequence[int] = ()):
+    """Send a request message, along with open file descriptors.
+
+    Args:
+        __sock: Socket to send message on
+        __data: Message to send
+        fds: File descriptors to pass to receiver
+    """
+    # Imported here, as json is comparatively slow to import and completion
+    # doesn’t need it
+    import json
+    payload = json.dumps(__data).encode()
+    message = HEADER.pack(len(payload)) + payload
+    ancillary = []
+    if fds:
+        ancillary.append((socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                          array.array('i', fds)))
+    sent = __sock.sendmsg([message, ], ancillary)
+    if sent < len(message):
+        __sock.sendall(message[sent:])
+
+
+def recv_exact(__sock: socket.socket, __size: int, data: bytes = b'') -> bytes:
+    """Read an exact number of bytes from socket.
+
+    Args:
+        __sock: Socket to read from
+        __size: Total number of bytes to read
+        data: Bytes already read
+
+    Returns:
+        Data read from socket
+    """
+    while len(data) < __size:
+        chunk = __sock.recv(__size - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed by daemon')
+        data += chunk
+    return data
+
+
+def forward(__argv: List[str]) -> Optional[int]:
+    """Run command in daemon, if one is running.
+
+    Our standard streams are passed to the daemon, so the command reads and
+    writes them directly.
+
+    Args:
+        __argv: Command line arguments
+
+    Returns:
+        Command’s exit status, or ``None`` if no daemon is available
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        try:
+            sock.connect(socket_path())
+            request = {
+                'argv': __argv,
+                'cwd': os.getcwd(),
+                'env': dict(os.environ),
+            }
+            for fd in range(3):
+                os.fstat(fd)
+        except OSError:
+            return None
+        try:
+            send_message(sock, request, range(3))
+            status = recv_exact(sock, STATUS.size)
+        except ConnectionError as error:
+            # We can’t fall back to running the command ourselves, as the
+            # daemon may have already acted on it
+            print('hubugs: {}'.format(error), file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            return 130
+        return STATUS.unpack(status)[0]
+
+
+def main() -> int:
+    """Main command-line entry point.
+
+    Returns:
+        Exit code
+    """
+    args = sys.argv[1:]
+    position = subcommand(args)
+    if position is not None and args[position] == '_complete':
+        return complete(args)
+    if not runs_locally(args):
+        status = forward(args)
+        if status is not None:
+            return status
+    import hubugs
+    return hubugs.main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#
+"""benchmarks - Micro-benchmarks for hubugs hot paths."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import weakref
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from unittest import mock
+
+from hubugs import (_version, models, snapshot, stats, template, utils)
+
+from tests import fixtures
+
+#: Registered benchmarks, mapping names to setup function and default sizes
+BENCHMARKS = OrderedDict()  # type: Dict[str, Any]
+
+
+def benchmark(__sizes: List[int]) -> Callable:
+    """Register a benchmark.
+
+    The decorated function is called with a size to prepare any data, and must
+    return the function to time.
+
+    Args:
+        __sizes: Default sizes to run benchmark with
+
+    Returns:
+        Unmodified function
+    """
+    def decorator(__func: Callable) -> Callable:
+        BENCHMARKS[__func.__name__] = (__func, __sizes)
+        return __func
+    return decorator
+
+
+@benchmark([10, 100, 1000, 10000])
+def decode(__size: int) -> Callable:
+    """Decode an issue listing with :func:`hubugs.models.decode`."""
+    data = fixtures.dumps(fixtures.issues(__size))
+    return lambda: models.decode(data, 'Issue')
+
+
+@benchmark([100, 1000, 10000])
+def decode_stdlib(__size: int) -> Callable:
+    """Decode an issue listing with the standard library’s decoder."""
+    data = fixtures.dumps(fixtures.issues(__size))
+
+    def run():
+        with mock.patch.object(models, 'DECODER', 'json'):
+            return models.decode(data, 'Issue')
+    return run
+
+
+@benchmark([100, 1000, 10000])
+def decode_search(__size: int) -> Callable:
+    """Decode a search result page, and read the fields ``list`` displays."""
+    data = fixtures.dumps({'total_count': __size, 'incomplete_results': False,
+                           'items': fixtures.issues(__size)})
+
+    def run():
+        for bug in models.decode(data, 'Issue').items:
+            bug.number, bug.title, bug.updated_at
+            [label.name for label in bug.labels]
+    return run
+
+
+@benchmark([10, 100, 1000, 10000])
+def decode_listing(__size: int) -> Callable:
+    """Decode an issue listing with only the fields ``list`` displays."""
+    data = fixtures.dumps(fixtures.issues(__size))
+    fields = template.listing_fields()
+    return lambda: models.decode(data, 'Issue', fields=fields)
+
+
+@benchmark([100, 1000, 10000])
+def stats_summary(__size: int) -> Callable:
+    """Load an issue listing in to columns, and summarise it."""
+    data = fixtures.dumps(fixtures.issues(__size))
+
+    def run():
+        columns = stats.IssueColumns()
+        columns.extend(models.decode(data, raw=True))
+        return stats.summarise(columns)
+    return run
+
+
+@benchmark([1000, 10000, 100000])
+def snapshot_issues(__size: int) -> Callable:
+    """Open a listing snapshot, and fetch open issues with a label."""
+    fd, path = tempfile.mkstemp(suffix='.snap')
+    with open(fd, 'wb') as f:
+        f.write(snapshot.build(fixtures.issues(__size), 0))
+
+    def run():
+        with snapshot.Snapshot(path) as snap:
+            return snap.issues('open', ['bug', ], order='updated')
+    # Remove snapshot once the benchmark is finished with
+    weakref.finalize(run, os.unlink, path)
+    return run
+
+
+@benchmark([10, 100, 1000, 10000])
+def display_bugs(__size: int) -> Callable:
+    """Render an issue listing with :func:`hubugs.template.display_bugs`."""
+    bugs = models.decode(fixtures.dumps(fixtures.issues(__size)), 'Issue')
+    return lambda: template.display_bugs(bugs, 'number', state='open',
+                                         project=None)
+
+
+@benchmark([10, 100, 1000, 10000])
+def display_bugs_template(__size: int) -> Callable:
+    """Render an issue listing with the ``view/list.txt`` Jinja template."""
+    bugs = models.decode(fixtures.dumps(fixtures.issues(__size)), 'Issue')
+
+    def run():
+        with mock.patch.object(template, 'list_formatter', lambda: None):
+            return template.display_bugs(bugs, 'number', state='open',
+                                         project=None)
+    return run
+
+
+@benchmark([10, 100, 1000])
+def render_issue(__size: int) -> Callable:
+    """Render ``view/issue.txt`` with the given number of comments."""
+    data = fixtures.issues(1)[0]
+    data['comments'] = __size
+    bug = models.decode(fixtures.dumps(data), 'Issue')
+    comments = models.decode(fixtures.dumps(fixtures.comments(data)),
+                             'Comment')
+    tmpl = template.get_template('view', 'issue.txt')
+    return lambda: tmpl.render(bug=bug, comments=comments, full=True,
+                               patch=None, patch_only=False, project=None)
+
+
+@benchmark([10, 100, 1000])
+def highlight(__size: int) -> Callable:
+    """Highlight a patch touching the given number of files."""
+    patch = fixtures.patch(__size)
+
+    def run():
+        with mock.patch.object(sys.stdout, 'isatty', return_value=True):
+            return template.highlight(patch)
+    return run
+
+
+@benchmark([1, 4])
+def git_config(__size: int) -> Callable:
+    """Look up the given number of :command:`git` config values."""
+    keys = ['hubugs.templates', 'hubugs.host-url', 'hubugs.token',
+            'core.commentchar']
+    keys = [keys[i % len(keys)] for i in range(__size)]
+    return lambda: [utils.get_git_config_val(k) for k in keys]
+
+
+def measure(__func: Callable, repeat: int = 5,
+            budget: Optional[float] = 10.0) -> Dict[str, Any]:
+    """Time a function.
+
+    Args:
+        __func: Function to time
+        repeat: Maximum number of timed runs
+        budget: Stop repeating once this many seconds have elapsed
+
+    Returns:
+        Timing statistics, in seconds
+    """
+    __func()  # Warm up caches, and import lazily loaded modules
+    timings = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        __func()
+        timings.append(time.perf_counter() - t)
+        if time.perf_counter() - start > budget:
+            break
+    return {
+        'runs': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def run(names: Optional[Iterable[str]] = None,
+        sizes: Optional[Iterable[int]] = None, repeat: int = 5,
+        budget: Optional[float] = 10.0,
+        progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Run benchmarks.
+
+    Args:
+        names: Benchmarks to run, defaults to all
+        sizes: Sizes to run benchmarks with, defaults to per-benchmark sizes
+        repeat: Maximum number of timed runs per benchmark
+        budget: Time limit for each benchmark’s repeats, in seconds
+        progress: Function to call with each result’s key
+
+    Returns:
+        Results and information about the environment they were produced in
+    """
+    results = OrderedDict()
+    for name in names or BENCHMARKS:
+        setup, default_sizes = BENCHMARKS[name]
+        for size in sizes or default_sizes:
+            key = '{}[{}]'.format(name, size)
+            results[key] = measure(setup(size), repeat, budget)
+            if progress:
+                progress(key)
+    return {
+        'meta': {
+            'hubugs': _version.dotted,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'decoder': models.DECODER,
+            'date': datetime.datetime.utcnow().isoformat() + 'Z',
+        },
+        'results': results,
+    }
+
+
+def compare(__old: Dict[str, Any], __new: Dict[str, Any]) -> List[str]:
+    """Compare two sets of benchmark results.
+
+    Args:
+        __old: Baseline results
+        __new: Results to compare against baseline
+
+    Returns:
+        Report lines, using the best time from each run
+    """
+    lines = ['{:<24} {:>12} {:>12} {:>8}'.format('benchmark', 'old', 'new',
+                                                 'change')]
+    for key, result in __new['results'].items():
+        if key not in __old['results']:
+            continue
+        old = __old['results'][key]['min']
+        new = result['min']
+        lines.append('{:<24} {:>10.3f}ms {:>10.3f}ms {:>+7.1%}'.format(
+            key, old * 1000, new * 1000, new / old - 1))
+    return lines
@@ -0,0 +1,60 @@
+#
+"""__main__ - Command line interface for hubugs benchmarks."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from typing import List
+
+import click
+
+from . import (BENCHMARKS, compare, run)
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.option('-b', '--benchmark', 'names', multiple=True,
+              type=click.Choice(list(BENCHMARKS)),
+              help='Benchmark to run, may be repeated.')
+@click.option('-s', '--size', 'sizes', multiple=True, type=click.INT,
+              help='Data size to run with, may be repeated.')
+@click.option('-r', '--repeat', default=5, help='Maximum timed runs.')
+@click.option('--budget', default=10.0,
+              help='Time limit for repeats of each benchmark, in seconds.')
+@click.option('-o', '--output', type=click.File('w'),
+              help='Write results to file.')
+@click.option('-c', '--compare', 'baseline', type=click.File(),
+              help='Compare results with previous run.')
+def main(names: List[str], sizes: List[int], repeat: int, budget: float,
+         output: click.File, baseline: click.File):
+    """Run hubugs micro-benchmarks."""
+    results = run(names, sizes, repeat, budget,
+                  lambda k: click.echo('{} done'.format(k), err=True))
+    if output:
+        json.dump(results, output, indent=2)
+    if baseline:
+        for line in compare(json.load(baseline), results):
+            click.echo(line)
+    else:
+        for key, result in results['results'].items():
+            click.echo('{:<24} {:>10.3f}ms'.format(key,
+                                                   result['min'] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#
+"""load - End-to-end load harness for hubugs commands."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Each scenario runs the real command line in a fresh interpreter against
+# :class:`tests.fakehub.FakeHub`, so imports, git lookups, cache handling and
+# HTTP behaviour are all measured as a user would experience them.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import click
+
+from tests.fakehub import FakeHub, Project
+
+#: Command lines to measure, keyed by scenario name
+SCENARIOS = OrderedDict([
+    ('list', ['list', ]),
+    ('list-all', ['list', '--state', 'all']),
+    ('list-label', ['list', '--label', 'bug']),
+    ('search', ['search', 'cache']),
+    ('show', ['show', '1']),
+    ('show-full', ['show', '--full', '1', '2', '3', '4', '5']),
+    ('show-patch', ['show', '--patch-only', '{pull}']),
+    ('label-list', ['label', '--list']),
+    ('milestones', ['milestones', '--list']),
+    ('comment', ['comment', '-m', 'Load test comment', '1']),
+    ('open', ['open', '--title', 'Load test', '--body', 'Body text']),
+    ('milestone', ['milestone', 'v0.16.0', '2']),
+])
+
+#: Code used to run hubugs in child processes
+RUNNER = 'import sys, hubugs; sys.exit(hubugs.main())'
+
+
+def run_command(__server: FakeHub, __args: List[str], __env: Dict[str, str],
+                project: str = 'JNRowe/hubugs') -> Dict[str, Any]:
+    """Run a hubugs command against a fake server.
+
+    Args:
+        __server: Server to run command against
+        __args: Command arguments
+        __env: Environment for child process
+        project: Project to operate on
+
+    Returns:
+        Measurements for command
+    """
+    __server.reset_stats()
+    cmd = [sys.executable, '-c', RUNNER, '--host-url', __server.url,
+           '--project', project] + __args
+    # Files, not pipes, so that large outputs can’t block the child before
+    # we reap it
+    with tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, env=__env, stdin=subprocess.DEVNULL,
+                                stdout=stdout, stderr=stderr)
+        # wait4 provides the resource usage for this child alone
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.WEXITSTATUS(status)
+        stdout.seek(0)
+        stderr.seek(0)
+        output = stdout.read()
+        errors = stderr.read()
+    return OrderedDict([
+        ('exit', proc.returncode),
+        ('wall', wall),
+        ('cpu', usage.ru_utime + usage.ru_stime),
+        # ru_maxrss is reported in kilobytes on Linux
+        ('max_rss', usage.ru_maxrss * 1024 if sys.platform != 'darwin'
+         else usage.ru_maxrss),
+        ('requests', __server.total_requests),
+        ('not_modified', __server.not_modified),
+        ('output_bytes', len(output)),
+        ('stderr', errors.decode(errors='replace').strip().splitlines()[-1:]),
+    ])
+
+
+def run(scenarios: Optional[List[str]] = None, issues: int = 200,
+        latency: float = 0.0, error_rate: float = 0.0, max_age: int = 60,
+        warm: bool = True) -> Dict[str, Any]:
+    """Run load test scenarios.
+
+    Each scenario is run with an empty cache, and then optionally again to
+    measure the warm cache behaviour.
+
+    Args:
+        scenarios: Scenarios to run, defaults to all
+        issues: Number of issues in fake project
+        latency: Delay added to each request, in seconds
+        error_rate: Probability of a request failing
+        max_age: ``max-age`` value for server’s responses
+        warm: Whether to also measure a second, warm cache, run
+
+    Returns:
+        Measurements, keyed by scenario name
+    """
+    results = OrderedDict()
+    project = Project('JNRowe/hubugs', issues)
+    pull = next(n for n, i in project.issues.items() if 'pull_request' in i)
+    with FakeHub([project, ], latency=latency, error_rate=error_rate,
+                 max_age=max_age) as server:
+        for name in scenarios or SCENARIOS:
+            args = [s.format(pull=pull) for s in SCENARIOS[name]]
+            with tempfile.TemporaryDirectory() as home:
+                env = dict(os.environ, HUBUGS_TOKEN='load-test',
+                           XDG_CACHE_HOME=os.path.join(home, 'cache'),
+                           XDG_DATA_HOME=os.path.join(home, 'data'),
+                           EDITOR='false', PAGER='cat')
+                result = OrderedDict([('cold', run_command(server, args,
+                                                           env))])
+                if warm:
+                    result['warm'] = run_command(server, args, env)
+            results[name] = result
+    return results
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.option('-S', '--scenario', 'scenarios', multiple=True,
+              type=click.Choice(list(SCENARIOS)),
+              help='Scenario to run, may be repeated.')
+@click.option('-n', '--issues', default=200,
+              help='Number of issues in fake project.')
+@click.option('--latency', default=0.0,
+              help='Delay added to each request, in seconds.')
+@click.option('--error-rate', default=0.0,
+              help='Probability of a request failing.')
+@click.option('--max-age', default=60,
+              help='Cache lifetime for responses, 0 forces revalidation.')
+@click.option('--cold-only', is_flag=True, help='Skip warm cache runs.')
+@click.option('-o', '--output', type=click.File('w'),
+              help='Write results to file.')
+def main(scenarios: List[str], issues: int, latency: float,
+         error_rate: float, max_age: int, cold_only: bool,
+         output: click.File):
+    """Load test hubugs commands against a fake GitHub server."""
+    results = run(scenarios, issues, latency, error_rate, max_age,
+                  not cold_only)
+    if output:
+        json.dump(results, output, indent=2)
+    click.echo('{:<12} {:<5} {:>4} {:>9} {:>9} {:>9} {:>5} {:>5}'.format(
+        'scenario', 'cache', 'exit', 'wall', 'cpu', 'rss', 'reqs', '304s'))
+    for name, runs in results.items():
+        for kind, r in runs.items():
+            click.echo(
+                '{:<12} {:<5} {:>4} {:>7.0f}ms {:>7.0f}ms {:>7.1f}MB {:>5} '
+                '{:>5}'.format(name, kind, r['exit'], r['wall'] * 1000,
+                               r['cpu'] * 1000, r['max_rss'] / 2 ** 20,
+                               r['requests'], r['not_modified']))
+
+
+if __name__ == '__main__':
+    main()
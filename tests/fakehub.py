@@ -0,0 +1,625 @@
+#
+"""fakehub - Local fake of the GitHub REST API."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# Only the standard library is used here, so that the server can be run from
+# a bare interpreter to load test a hubugs installation.  Responses follow
+# the documented shapes and headers of API v3, including ``Link`` pagination,
+# ``ETag`` validation and rate limit accounting.
+
+import argparse
+import collections
+import datetime
+import hashlib
+import itertools
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from tests import fixtures
+
+
+class Project:
+
+    """Fixture data for a single repository.
+
+    Attributes:
+        name: Full project name
+        repo: Repository object
+        issues: Issues, keyed by number
+        comments: Comments, keyed by issue number
+        labels: Label objects
+        milestones: Milestone objects
+        patches: Patch text for pull requests, keyed by number
+        timelines: Timeline events, keyed by issue number
+    """
+
+    def __init__(self, __name: str, issues: Optional[int] = 50,
+                 seed: int = 42):
+        """Generate fixture data for a project.
+
+        Args:
+            __name: Full project name
+            issues: Number of issues to generate
+            seed: Seed for random number generator
+        """
+        self.name = __name
+        self.repo = {
+            'id': 1296269,
+            'name': __name.split('/')[1],
+            'full_name': __name,
+            'owner': {'login': __name.split('/')[0]},
+            'private': False,
+            'html_url': '{}/{}'.format(fixtures.WEB, __name),
+            'description': 'Fake repository for {}'.format(__name),
+            'has_issues': True,
+            'open_issues_count': 0,
+        }
+        self.issues = collections.OrderedDict(
+            (i['number'], i)
+            for i in reversed(fixtures.issues(issues, __name, seed)))
+        self.comments = {n: fixtures.comments(i, seed=seed)
+                         for n, i in self.issues.items()}
+        self.labels = fixtures.labels(__name)
+        self.milestones = fixtures.milestones(__name)
+        self.patches = {n: fixtures.patch(3, seed=seed + n)
+                        for n, i in self.issues.items()
+                        if 'pull_request' in i}
+        self.timelines = {n: fixtures.timeline(i, seed=seed)
+                          for n, i in self.issues.items()}
+        self.events = []  # type: List[Dict[str, Any]]
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class FakeHub(socketserver.ThreadingMixIn, HTTPServer):
+
+    """Threaded HTTP server faking the GitHub API.
+
+    Attributes:
+        projects: Projects served, keyed by full name
+        latency: Delay added to each request, in seconds
+        error_rate: Probability of a request failing with a 502 response
+        error_page: HTML body for failed requests, instead of a JSON message
+        rate_limit: Requests allowed before 403 responses are returned
+        throttle: Requests per second allowed before secondary rate limit
+            responses are returned
+        max_age: ``max-age`` value sent with cacheable responses
+        per_page: Default page size
+        poll_interval: ``X-Poll-Interval`` value sent for event listings
+        requests: Count of requests, keyed by method and path
+        not_modified: Count of 304 responses sent
+        log: Request lines, in the order they were received
+    """
+
+    daemon_threads = True
+
+    def __init__(self, projects: Optional[List[Project]] = None,
+                 address: Tuple[str, int] = ('127.0.0.1', 0),
+                 latency: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: int = 5000, throttle: Optional[float] = None,
+                 max_age: int = 60, per_page: int = 30,
+                 poll_interval: int = 60, seed: int = 42):
+        """Configure a new fake server.
+
+        Args:
+            projects: Projects to serve, defaults to a single generated
+                ``JNRowe/hubugs`` project
+            address: Address to listen on, the default picks a free port
+            latency: Delay added to each request, in seconds
+            error_rate: Probability of a request failing with a 502
+            rate_limit: Requests allowed before 403 responses are returned
+            throttle: Requests per second allowed
+            max_age: ``max-age`` value sent with cacheable responses
+            per_page: Default page size
+            poll_interval: ``X-Poll-Interval`` value for event listings
+            seed: Seed for error injection
+        """
+        super(FakeHub, self).__init__(address, Handler)
+        if projects is None:
+            projects = [Project('JNRowe/hubugs'), ]
+        self.projects = collections.OrderedDict((p.name, p) for p in projects)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_page = None  # type: Optional[bytes]
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset = int(time.time()) + 3600
+        self.throttle = throttle
+        self.max_age = max_age
+        self.per_page = per_page
+        self.poll_interval = poll_interval
+        self.requests = collections.Counter()
+        self.not_modified = 0
+        self.log = []  # type: List[str]
+        self.lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._recent = collections.deque()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL for server."""
+        return 'http://{}:{}'.format(*self.server_address[:2])
+
+    def start(self) -> str:
+        """Serve requests in a background thread.
+
+        Returns:
+            Base URL for server
+        """
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """Stop background server."""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'FakeHub':
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset_stats(self):
+        """Clear request statistics."""
+        with self.lock:
+            self.requests.clear()
+            self.not_modified = 0
+            del self.log[:]
+
+    @property
+    def total_requests(self) -> int:
+        """Total number of requests handled."""
+        return sum(self.requests.values())
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    """Request handler for :class:`FakeHub`."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeHub/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    # Routing {{{
+    ROUTES = [
+        ('GET', r'/repos/([^/]+/[^/]+)$', 'get_repo'),
+        ('GET', r'/repos/([^/]+/[^/]+)/issues$', 'list_issues'),
+        ('POST', r'/repos/([^/]+/[^/]+)/issues$', 'create_issue'),
+        ('GET', r'/repos/([^/]+/[^/]+)/events$', 'list_events'),
+        ('GET', r'/repos/([^/]+/[^/]+)/issues/events$', 'list_events'),
+        ('GET', r'/repos/([^/]+/[^/]+)/issues/comments$',
+         'list_project_comments'),
+        ('GET', r'/repos/([^/]+/[^/]+)/issues/(\d+)$', 'get_issue'),
+        ('POST', r'/repos/([^/]+/[^/]+)/issues/(\d+)$', 'edit_issue'),
+        ('PATCH', r'/repos/([^/]+/[^/]+)/issues/(\d+)$', 'edit_issue'),
+        ('GET', r'/repos/([^/]+/[^/]+)/issues/(\d+)/comments$',
+         'list_comments'),
+        ('POST', r'/repos/([^/]+/[^/]+)/issues/(\d+)/comments$',
+         'create_comment'),
+        ('GET', r'/repos/([^/]+/[^/]+)/issues/(\d+)/timeline$',
+         'list_timeline'),
+        ('GET', r'/repos/([^/]+/[^/]+)/labels$', 'list_labels'),
+        ('POST', r'/repos/([^/]+/[^/]+)/labels$', 'create_label'),
+        ('GET', r'/repos/([^/]+/[^/]+)/milestones$', 'list_milestones'),
+        ('POST', r'/repos/([^/]+/[^/]+)/milestones$', 'create_milestone'),
+        ('GET', r'/repos/([^/]+/[^/]+)/pulls$', 'list_pulls'),
+        ('GET', r'/repos/([^/]+/[^/]+)/pulls/(\d+)$', 'get_pull'),
+        ('GET', r'/search/issues$', 'search_issues'),
+        ('GET', r'/rate_limit$', 'get_rate_limit'),
+    ]
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def dispatch(self, __method: str):
+        server = self.server
+        url = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.data = json.loads(body.decode()) if body else {}
+        with server.lock:
+            server.requests[(__method, url.path)] += 1
+            server.log.append('{} {}'.format(__method, self.path))
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and server._random.random() < server.error_rate:
+            if server.error_page is not None:
+                return self.send_body(server.error_page,
+                                      'text/html; charset=utf-8', 502)
+            return self.send_json({'message': 'Server Error'}, 502)
+        if server.throttle:
+            with server.lock:
+                now = time.time()
+                recent = server._recent
+                while recent and recent[0] < now - 1:
+                    recent.popleft()
+                recent.append(now)
+                throttled = len(recent) > server.throttle
+            if throttled:
+                return self.send_json(
+                    {'message': 'You have exceeded a secondary rate limit.'},
+                    403, {'Retry-After': '1'})
+        if server.remaining <= 0:
+            return self.send_json(
+                {'message': 'API rate limit exceeded'}, 403)
+        for method, pattern, name in self.ROUTES:
+            match = re.match(pattern, url.path)
+            if method == __method and match:
+                args = list(match.groups())
+                if args and args[0] in server.projects:
+                    args[0] = server.projects[args[0]]
+                elif args:
+                    return self.send_json({'message': 'Not Found'}, 404)
+                with server.lock:
+                    return getattr(self, name)(*args)
+        self.send_json({'message': 'Not Found'}, 404)
+    # }}}
+
+    # Response support {{{
+    def send_json(self, __data: Any, status: int = 200,
+                  headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(__data, indent=2).encode()
+        self.send_body(body, 'application/json; charset=utf-8', status,
+                       headers)
+
+    def send_body(self, __body: bytes, __content_type: str,
+                  status: int = 200,
+                  headers: Optional[Dict[str, str]] = None):
+        server = self.server
+        headers = dict(headers or {})
+        etag = '"{}"'.format(hashlib.sha1(__body).hexdigest())
+        cacheable = self.command == 'GET' and status == 200
+        if cacheable:
+            headers['ETag'] = etag
+            headers['Cache-Control'] = 'private, max-age={}'.format(
+                server.max_age)
+            headers['Vary'] = 'Accept, Authorization, Cookie'
+            match = self.headers.get('If-None-Match')
+            if match and etag in [s.strip() for s in match.split(',')]:
+                # Conditional requests don’t count against the rate limit
+                with server.lock:
+                    server.not_modified += 1
+                status, __body = 304, b''
+        if status != 304:
+            with server.lock:
+                server.remaining = max(server.remaining - 1, 0)
+        headers.update({
+            'X-RateLimit-Limit': str(server.rate_limit),
+            'X-RateLimit-Remaining': str(server.remaining),
+            'X-RateLimit-Reset': str(server.reset),
+        })
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', __content_type)
+        self.send_header('Content-Length', str(len(__body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(__body)
+
+    def send_page(self, __items: List[Any],
+                  headers: Optional[Dict[str, str]] = None,
+                  wrap: Optional[Callable[[List[Any]], Any]] = None):
+        per_page = min(int(self.query.get('per_page', self.server.per_page)),
+                       100)
+        page = int(self.query.get('page', 1))
+        last = max((len(__items) - 1) // per_page + 1, 1)
+        links = []
+        base = urlparse(self.path).path
+
+        def link(number, rel):
+            query = dict(self.query, page=number)
+            links.append('<{}{}?{}>; rel="{}"'.format(
+                self.server.url, base, urlencode(sorted(query.items())), rel))
+        if page < last:
+            link(page + 1, 'next')
+            link(last, 'last')
+        if page > 1:
+            link(1, 'first')
+            link(page - 1, 'prev')
+        headers = dict(headers or {})
+        if links:
+            headers['Link'] = ', '.join(links)
+        items = __items[(page - 1) * per_page:page * per_page]
+        self.send_json(wrap(items) if wrap else items, headers=headers)
+    # }}}
+
+    # Filters {{{
+    def filter_issues(self, __project: Project) -> List[Dict[str, Any]]:
+        query = self.query
+        issues = list(__project.issues.values())
+        state = query.get('state', 'open')
+        if state != 'all':
+            issues = [i for i in issues if i['state'] == state]
+        if 'labels' in query:
+            wanted = set(query['labels'].split(','))
+            issues = [i for i in issues
+                      if wanted <= {label['name'] for label in i['labels']}]
+        milestone = query.get('milestone')
+        if milestone == 'none':
+            issues = [i for i in issues if not i['milestone']]
+        elif milestone == '*':
+            issues = [i for i in issues if i['milestone']]
+        elif milestone:
+            issues = [i for i in issues if i['milestone']
+                      and i['milestone']['number'] == int(milestone)]
+        if 'since' in query:
+            issues = [i for i in issues if i['updated_at'] >= query['since']]
+        sort = query.get('sort', 'created')
+        key = {'created': 'number', 'updated': 'updated_at',
+               'comments': 'comments'}[sort]
+        reverse = query.get('direction', 'desc') == 'desc'
+        return sorted(issues, key=lambda i: i[key], reverse=reverse)
+    # }}}
+
+    # Endpoints {{{
+    def get_repo(self, __project: Project):
+        repo = dict(__project.repo)
+        repo['open_issues_count'] = sum(
+            i['state'] == 'open' for i in __project.issues.values())
+        self.send_json(repo)
+
+    def list_issues(self, __project: Project):
+        self.send_page(self.filter_issues(__project))
+
+    def get_issue(self, __project: Project, __number: str):
+        issue = __project.issues.get(int(__number))
+        if not issue:
+            return self.send_json({'message': 'Not Found'}, 404)
+        self.send_json(issue)
+
+    def _record_event(self, __project: Project, __event: str,
+                      __issue: Dict[str, Any]):
+        __project.events.insert(0, {
+            'id': len(__project.events) + 1,
+            'event': __event,
+            'actor': fixtures._user('JNRowe'),
+            'created_at': _now(),
+            'issue': {'number': __issue['number'],
+                      'title': __issue['title']},
+        })
+        timeline = __project.timelines.setdefault(__issue['number'], [])
+        timeline.append({
+            'id': 900000000 + len(__project.events),
+            'event': __event,
+            'actor': fixtures._user('JNRowe'),
+            'created_at': _now(),
+        })
+
+    def create_issue(self, __project: Project):
+        number = max(__project.issues or [0]) + 1
+        template = fixtures.issues(1, __project.name)[0]
+        url = '{}/repos/{}/issues/{}'.format(fixtures.API, __project.name,
+                                             number)
+        template.pop('pull_request', None)
+        template.update({
+            'url': url,
+            'number': number,
+            'title': self.data.get('title', ''),
+            'body': self.data.get('body', ''),
+            'labels': [label for label in __project.labels
+                       if label['name'] in self.data.get('labels', [])],
+            'milestone': None,
+            'state': 'open',
+            'comments': 0,
+            'created_at': _now(),
+            'updated_at': _now(),
+            'closed_at': None,
+        })
+        __project.issues[number] = template
+        __project.comments[number] = []
+        self._record_event(__project, 'created', template)
+        self.send_json(template, 201)
+
+    def edit_issue(self, __project: Project, __number: str):
+        issue = __project.issues.get(int(__number))
+        if not issue:
+            return self.send_json({'message': 'Not Found'}, 404)
+        for key in ('title', 'body', 'state'):
+            if key in self.data:
+                issue[key] = self.data[key]
+        if 'state' in self.data:
+            issue['closed_at'] = _now() if issue['state'] == 'closed' else None
+            self._record_event(__project, self.data['state'] == 'closed'
+                               and 'closed' or 'reopened', issue)
+        if 'labels' in self.data:
+            issue['labels'] = [label for label in __project.labels
+                               if label['name'] in self.data['labels']]
+            self._record_event(__project, 'labeled', issue)
+        if 'milestone' in self.data:
+            issue['milestone'] = next(
+                (m for m in __project.milestones
+                 if m['number'] == self.data['milestone']), None)
+            self._record_event(__project, 'milestoned', issue)
+        issue['updated_at'] = _now()
+        self.send_json(issue)
+
+    def list_events(self, __project: Project):
+        self.send_page(__project.events,
+                       {'X-Poll-Interval': str(self.server.poll_interval)})
+
+    def list_comments(self, __project: Project, __number: str):
+        if int(__number) not in __project.issues:
+            return self.send_json({'message': 'Not Found'}, 404)
+        comments = __project.comments[int(__number)]
+        if 'since' in self.query:
+            comments = [c for c in comments
+                        if c['updated_at'] >= self.query['since']]
+        self.send_page(comments)
+
+    def list_timeline(self, __project: Project, __number: str):
+        if int(__number) not in __project.issues:
+            return self.send_json({'message': 'Not Found'}, 404)
+        self.send_page(__project.timelines.get(int(__number), []))
+
+    def list_project_comments(self, __project: Project):
+        comments = sorted(itertools.chain.from_iterable(
+            __project.comments.values()), key=lambda c: c['id'])
+        self.send_page(comments)
+
+    def create_comment(self, __project: Project, __number: str):
+        issue = __project.issues.get(int(__number))
+        if not issue:
+            return self.send_json({'message': 'Not Found'}, 404)
+        comment = fixtures.comments(issue, 1)[0]
+        comment.update({
+            'id': issue['number'] * 10000 + len(
+                __project.comments[issue['number']]),
+            'body': self.data.get('body', ''),
+            'created_at': _now(),
+            'updated_at': _now(),
+        })
+        __project.comments[issue['number']].append(comment)
+        issue['comments'] += 1
+        issue['updated_at'] = _now()
+        self._record_event(__project, 'commented', issue)
+        self.send_json(comment, 201)
+
+    def list_labels(self, __project: Project):
+        self.send_page(__project.labels)
+
+    def create_label(self, __project: Project):
+        if any(label['name'] == self.data.get('name')
+               for label in __project.labels):
+            return self.send_json({'message': 'Validation Failed'}, 422)
+        label = {
+            'id': 9000 + len(__project.labels),
+            'url': '{}/repos/{}/labels/{}'.format(
+                fixtures.API, __project.name, self.data['name']),
+            'name': self.data['name'],
+            'color': self.data.get('color', '000000'),
+            'default': False,
+        }
+        __project.labels.append(label)
+        self.send_json(label, 201)
+
+    def list_milestones(self, __project: Project):
+        state = self.query.get('state', 'open')
+        milestones = [m for m in __project.milestones
+                      if state == 'all' or m['state'] == state]
+        for m in milestones:
+            issues = [i for i in __project.issues.values()
+                      if i['milestone']
+                      and i['milestone']['number'] == m['number']]
+            m['open_issues'] = sum(i['state'] == 'open' for i in issues)
+            m['closed_issues'] = len(issues) - m['open_issues']
+        self.send_page(milestones)
+
+    def create_milestone(self, __project: Project):
+        milestone = fixtures.milestones(__project.name,
+                                        len(__project.milestones) + 1)[-1]
+        milestone['title'] = self.data['title']
+        __project.milestones.append(milestone)
+        self.send_json(milestone, 201)
+
+    def list_pulls(self, __project: Project):
+        self.send_page([i for i in self.filter_issues(__project)
+                        if 'pull_request' in i])
+
+    def get_pull(self, __project: Project, __number: str):
+        patch = __project.patches.get(int(__number))
+        if patch is None:
+            return self.send_json({'message': 'Not Found'}, 404)
+        if 'patch' in self.headers.get('Accept', ''):
+            self.send_body(patch.encode(), 'text/x-patch; charset=utf-8')
+        else:
+            self.send_json(__project.issues[int(__number)])
+
+    def search_issues(self):
+        terms = self.query.get('q', '').split()
+        filters = dict(t.split(':', 1) for t in terms if ':' in t)
+        words = [t.lower() for t in terms if ':' not in t]
+        if filters.get('repo') in self.server.projects:
+            projects = [self.server.projects[filters['repo']], ]
+        else:
+            projects = list(self.server.projects.values())
+        items = []
+        for project in projects:
+            for issue in reversed(project.issues.values()):
+                if 'state' in filters and issue['state'] != filters['state']:
+                    continue
+                text = '{} {}'.format(issue['title'], issue['body']).lower()
+                if all(w in text for w in words):
+                    items.append(issue)
+        sort = self.query.get('sort')
+        if sort in ('created', 'updated', 'comments'):
+            key = {'created': 'number', 'updated': 'updated_at',
+                   'comments': 'comments'}[sort]
+            items.sort(key=lambda i: i[key],
+                       reverse=self.query.get('order', 'desc') == 'desc')
+        self.send_page(items, wrap=lambda page: {
+            'total_count': len(items),
+            'incomplete_results': False,
+            'items': page,
+        })
+
+    def get_rate_limit(self):
+        self.send_json({'rate': {'limit': self.server.rate_limit,
+                                 'remaining': self.server.remaining,
+                                 'reset': self.server.reset}})
+    # }}}
+
+
+def main():
+    """Run a fake GitHub server in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--project', action='append', default=[])
+    parser.add_argument('--issues', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=5000)
+    parser.add_argument('--throttle', type=float)
+    args = parser.parse_args()
+    projects = [Project(p, args.issues)
+                for p in args.project or ['JNRowe/hubugs', ]]
+    server = FakeHub(projects, ('127.0.0.1', args.port), args.latency,
+                     args.error_rate, args.rate_limit, args.throttle)
+    print('Serving fake GitHub API on {}'.format(server.url))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
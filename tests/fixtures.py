@@ -0,0 +1,399 @@
+#
+"""fixtures - Deterministic GitHub API fixtures for tests and benchmarks."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+# The data produced here mirrors the shape of API v3 responses for a busy
+# project, including the fields hubugs never uses, so that decoding costs are
+# representative.  A fixed seed is used so that runs are comparable.
+
+import datetime
+import json
+import random
+
+from typing import Any, Dict, List, Optional
+
+API = 'https://api.github.com'
+WEB = 'https://github.com'
+
+WORDS = """
+    able about account action add after again against allow already also
+    always another answer api appear apply argument attempt attribute back
+    backend behaviour branch break broken buffer bug build cache call case
+    change check clean client close code colour command comment commit
+    complete config connection context copy correct crash create current data
+    default delete depend describe detect display document edit empty enable
+    encoding error event example expect fail feature fetch field file filter
+    find fix flag format function github handle header help however issue
+    label layout line link list load local lookup message method milestone
+    missing module network number option order output page parse patch path
+    project pull python query raise read release remote render reopen report
+    request response result return search server session setting show sort
+    state support template terminal test text title token trace update url
+    user value version view warning width window work wrap write
+""".split()
+
+LABELS = ['bug', 'feature', 'task', 'docs', 'question', 'wontfix',
+          'duplicate', 'help wanted', 'performance', 'regression']
+LOGINS = ['JNRowe', 'bgriff', 'mleighy', 'octocat', 'hubot', 'defunkt',
+          'mojombo', 'pjhyett', 'wycats', 'ezmobius', 'ivey', 'evanphx']
+EPOCH = datetime.datetime(2012, 1, 1)
+
+
+def _stamp(__dt: Optional[datetime.datetime]) -> Optional[str]:
+    return __dt.strftime('%Y-%m-%dT%H:%M:%SZ') if __dt else None
+
+
+def _user(__login: str) -> Dict[str, Any]:
+    uid = LOGINS.index(__login) + 1000
+    url = '{}/users/{}'.format(API, __login)
+    return {
+        'login': __login,
+        'id': uid,
+        'node_id': 'MDQ6VXNlcj{:08d}'.format(uid),
+        'avatar_url': 'https://avatars.githubusercontent.com/u/{}?v=4'.format(
+            uid),
+        'gravatar_id': '',
+        'url': url,
+        'html_url': '{}/{}'.format(WEB, __login),
+        'followers_url': url + '/followers',
+        'following_url': url + '/following{/other_user}',
+        'gists_url': url + '/gists{/gist_id}',
+        'starred_url': url + '/starred{/owner}{/repo}',
+        'subscriptions_url': url + '/subscriptions',
+        'organizations_url': url + '/orgs',
+        'repos_url': url + '/repos',
+        'events_url': url + '/events{/privacy}',
+        'received_events_url': url + '/received_events',
+        'type': 'User',
+        'site_admin': False,
+    }
+
+
+def _reactions(__url: str, __rng: random.Random) -> Dict[str, Any]:
+    counts = {k: __rng.choice([0, 0, 0, 1, 2])
+              for k in ('+1', '-1', 'laugh', 'hooray', 'confused', 'heart',
+                        'rocket', 'eyes')}
+    counts['total_count'] = sum(counts.values())
+    counts['url'] = __url + '/reactions'
+    return counts
+
+
+def _sentence(__rng: random.Random, low: int = 4, high: int = 14) -> str:
+    words = __rng.sample(WORDS, __rng.randint(low, high))
+    return ' '.join(words).capitalize()
+
+
+def markdown_body(__rng: random.Random, paragraphs: int = 4) -> str:
+    """Generate a Markdown document similar to those found in issues.
+
+    Args:
+        __rng: Random number generator to use
+        paragraphs: Number of paragraphs to generate
+
+    Returns:
+        Markdown text
+    """
+    chunks = []
+    for _ in range(paragraphs):
+        kind = __rng.random()
+        if kind < 0.15:
+            chunks.append('```python\n{}\n```'.format('\n'.join(
+                '    {} = {}({!r})'.format(*__rng.sample(WORDS, 3))
+                for _ in range(__rng.randint(2, 8)))))
+        elif kind < 0.3:
+            chunks.append('\n'.join('* {}'.format(_sentence(__rng))
+                                    for _ in range(__rng.randint(2, 5))))
+        elif kind < 0.35:
+            chunks.append('> {}.'.format(_sentence(__rng)))
+        else:
+            chunks.append(' '.join('{}.'.format(_sentence(__rng))
+                                   for _ in range(__rng.randint(2, 6))))
+    return '\n\n'.join(chunks)
+
+
+def milestones(__project: str, count: int = 5) -> List[Dict[str, Any]]:
+    """Generate milestone objects.
+
+    Args:
+        __project: Project the milestones belong to
+        count: Number of milestones to generate
+
+    Returns:
+        Milestone objects
+    """
+    result = []
+    for number in range(1, count + 1):
+        url = '{}/repos/{}/milestones/{}'.format(API, __project, number)
+        result.append({
+            'url': url,
+            'html_url': '{}/{}/milestone/{}'.format(WEB, __project, number),
+            'labels_url': url + '/labels',
+            'id': 50000 + number,
+            'node_id': 'MDk6TWlsZXN0b25l{:08d}'.format(number),
+            'number': number,
+            'title': 'v0.{}.0'.format(number + 15),
+            'description': 'Release 0.{}.0'.format(number + 15),
+            'creator': _user('JNRowe'),
+            'open_issues': 0,
+            'closed_issues': 0,
+            'state': 'open',
+            'created_at': _stamp(EPOCH + datetime.timedelta(days=90 * number)),
+            'updated_at': _stamp(EPOCH + datetime.timedelta(days=90 * number)),
+            'due_on': _stamp(EPOCH + datetime.timedelta(days=90 * number
+                                                        + 60)),
+            'closed_at': None,
+        })
+    return result
+
+
+def labels(__project: str) -> List[Dict[str, Any]]:
+    """Generate label objects.
+
+    Args:
+        __project: Project the labels belong to
+
+    Returns:
+        Label objects
+    """
+    return [{
+        'id': 9000 + i,
+        'node_id': 'MDU6TGFiZWw{:08d}'.format(i),
+        'url': '{}/repos/{}/labels/{}'.format(API, __project,
+                                              name.replace(' ', '%20')),
+        'name': name,
+        'color': '{:06x}'.format((i * 0x1f3a5b) & 0xffffff),
+        'default': i < 7,
+    } for i, name in enumerate(LABELS)]
+
+
+def issues(__count: int, project: str = 'JNRowe/hubugs',
+           seed: int = 42) -> List[Dict[str, Any]]:
+    """Generate issue objects.
+
+    Args:
+        __count: Number of issues to generate
+        project: Project the issues belong to
+        seed: Seed for random number generator
+
+    Returns:
+        Issue objects, in the API’s default newest first order
+    """
+    rng = random.Random(seed)
+    all_labels = labels(project)
+    all_milestones = milestones(project)
+    result = []
+    for number in range(1, __count + 1):
+        created = EPOCH + datetime.timedelta(hours=7 * number,
+                                             minutes=rng.randint(0, 59))
+        updated = created + datetime.timedelta(days=rng.randint(0, 400))
+        closed = updated if rng.random() < 0.6 else None
+        url = '{}/repos/{}/issues/{}'.format(API, project, number)
+        login = rng.choice(LOGINS)
+        assignees = [_user(s) for s in rng.sample(LOGINS, rng.randint(0, 2))]
+        issue = {
+            'url': url,
+            'repository_url': '{}/repos/{}'.format(API, project),
+            'labels_url': url + '/labels{/name}',
+            'comments_url': url + '/comments',
+            'events_url': url + '/events',
+            'html_url': '{}/{}/issues/{}'.format(WEB, project, number),
+            'id': 100000 + number,
+            'node_id': 'MDU6SXNzdWU{:08d}'.format(number),
+            'number': number,
+            'title': _sentence(rng, 3, 10),
+            'user': _user(login),
+            'labels': rng.sample(all_labels, rng.randint(0, 3)),
+            'state': 'closed' if closed else 'open',
+            'locked': False,
+            'assignee': assignees[0] if assignees else None,
+            'assignees': assignees,
+            'milestone': (rng.choice(all_milestones)
+                          if rng.random() < 0.4 else None),
+            'comments': rng.choice([0, 0, 1, 2, 3, 5, 8, 13]),
+            'created_at': _stamp(created),
+            'updated_at': _stamp(updated),
+            'closed_at': _stamp(closed),
+            'author_association': 'CONTRIBUTOR',
+            'active_lock_reason': None,
+            'body': markdown_body(rng, rng.randint(1, 6)),
+            'reactions': _reactions(url, rng),
+            'timeline_url': url + '/timeline',
+            'performed_via_github_app': None,
+            'state_reason': 'completed' if closed else None,
+        }
+        if rng.random() < 0.2:
+            pulls = '{}/repos/{}/pulls/{}'.format(API, project, number)
+            issue['pull_request'] = {
+                'url': pulls,
+                'html_url': '{}/{}/pull/{}'.format(WEB, project, number),
+                'diff_url': '{}/{}/pull/{}.diff'.format(WEB, project, number),
+                'patch_url': '{}/{}/pull/{}.patch'.format(WEB, project,
+                                                          number),
+                'merged_at': None,
+            }
+        result.append(issue)
+    return result[::-1]
+
+
+def comments(__issue: Dict[str, Any], count: Optional[int] = None,
+             seed: int = 42) -> List[Dict[str, Any]]:
+    """Generate comment objects for an issue.
+
+    Args:
+        __issue: Issue to generate comments for
+        count: Number of comments, defaults to issue’s ``comments`` value
+        seed: Seed for random number generator
+
+    Returns:
+        Comment objects
+    """
+    rng = random.Random(seed + __issue['number'])
+    if count is None:
+        count = __issue['comments']
+    created = datetime.datetime.strptime(__issue['created_at'],
+                                         '%Y-%m-%dT%H:%M:%SZ')
+    result = []
+    for i in range(count):
+        created += datetime.timedelta(hours=rng.randint(1, 96))
+        cid = __issue['number'] * 10000 + i
+        url = '{}/comments/{}'.format(__issue['url'].rsplit('/', 1)[0], cid)
+        result.append({
+            'url': url,
+            'html_url': '{}#issuecomment-{}'.format(__issue['html_url'], cid),
+            'issue_url': __issue['url'],
+            'id': cid,
+            'node_id': 'MDEyOklzc3VlQ29tbWVudD{:08d}'.format(cid),
+            'user': _user(rng.choice(LOGINS)),
+            'created_at': _stamp(created),
+            'updated_at': _stamp(created),
+            'author_association': 'CONTRIBUTOR',
+            'body': markdown_body(rng, rng.randint(1, 4)),
+            'reactions': _reactions(url, rng),
+            'performed_via_github_app': None,
+        })
+    return result
+
+
+def timeline(__issue: Dict[str, Any], count: Optional[int] = None,
+             seed: int = 42) -> List[Dict[str, Any]]:
+    """Generate timeline events for an issue.
+
+    Args:
+        __issue: Issue to generate events for
+        count: Number of events, defaults to twice the issue’s ``comments``
+            value
+        seed: Seed for random number generator
+
+    Returns:
+        Timeline events, oldest first
+    """
+    rng = random.Random(seed + __issue['number'])
+    if count is None:
+        count = __issue['comments'] * 2
+    project = __issue['repository_url'].split('/repos/')[1]
+    all_labels = labels(project)
+    created = datetime.datetime.strptime(__issue['created_at'],
+                                         '%Y-%m-%dT%H:%M:%SZ')
+    result = []
+    for i in range(count):
+        created += datetime.timedelta(hours=rng.randint(1, 96))
+        kind = rng.choice(['labeled', 'unlabeled', 'assigned', 'commented',
+                           'cross-referenced', 'closed', 'reopened',
+                           'renamed'])
+        event = {
+            'id': __issue['number'] * 100000 + i,
+            'event': kind,
+            'actor': _user(rng.choice(LOGINS)),
+            'created_at': _stamp(created),
+        }
+        if kind in ('labeled', 'unlabeled'):
+            label = rng.choice(all_labels)
+            event['label'] = {'name': label['name'], 'color': label['color']}
+        elif kind == 'assigned':
+            event['assignee'] = _user(rng.choice(LOGINS))
+        elif kind == 'commented':
+            event['user'] = event.pop('actor')
+            event['body'] = _sentence(rng, 3, 10)
+        elif kind == 'cross-referenced':
+            del event['id']
+            event['source'] = {'type': 'issue', 'issue': {
+                'number': rng.randint(1, 500),
+                'title': _sentence(rng, 3, 10),
+                'repository': {'full_name': project},
+            }}
+        elif kind == 'renamed':
+            event['rename'] = {'from': _sentence(rng, 3, 10),
+                               'to': _sentence(rng, 3, 10)}
+        result.append(event)
+    return result
+
+
+def patch(__files: int = 20, hunks: int = 5, seed: int = 42) -> str:
+    """Generate a ``git format-patch`` style patch.
+
+    Args:
+        __files: Number of files changed by patch
+        hunks: Number of hunks per file
+        seed: Seed for random number generator
+
+    Returns:
+        Patch text
+    """
+    rng = random.Random(seed)
+    lines = [
+        'From 2a5f0c1e8b3d Mon Sep 17 00:00:00 2001',
+        'From: James Rowe <jnrowe@gmail.com>',
+        'Date: Mon, 1 Oct 2018 12:00:00 +0100',
+        'Subject: [PATCH] {}'.format(_sentence(rng)),
+        '',
+        '---',
+    ]
+    for f in range(__files):
+        name = 'hubugs/{}_{}.py'.format(rng.choice(WORDS), f)
+        lines.extend([
+            'diff --git a/{0} b/{0}'.format(name),
+            'index 3b18e51..a9c2f4d 100644',
+            '--- a/{}'.format(name),
+            '+++ b/{}'.format(name),
+        ])
+        for h in range(hunks):
+            start = h * 40 + 1
+            lines.append('@@ -{0},7 +{0},8 @@ def {1}():'.format(
+                start, rng.choice(WORDS)))
+            for _ in range(3):
+                lines.append('     {} = {}'.format(*rng.sample(WORDS, 2)))
+            lines.append('-    return {}'.format(rng.choice(WORDS)))
+            lines.append('+    {} = {}()'.format(*rng.sample(WORDS, 2)))
+            lines.append('+    return {}'.format(rng.choice(WORDS)))
+            for _ in range(3):
+                lines.append('     {} = {}'.format(*rng.sample(WORDS, 2)))
+    lines.extend(['--', '2.19.1', ''])
+    return '\n'.join(lines)
+
+
+def dumps(__obj: Any) -> bytes:
+    """Encode fixture data as an API response body.
+
+    Args:
+        __obj: Data to encode
+
+    Returns:
+        JSON encoded data
+    """
+    return json.dumps(__obj, indent=2).encode()
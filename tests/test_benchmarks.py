@@ -0,0 +1,60 @@
+#
+"""test_benchmarks - Ensure benchmarks remain runnable."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+from pytest import mark
+
+from hubugs import models
+
+from tests import benchmarks
+from tests import fixtures
+
+
+@mark.parametrize('name', list(benchmarks.BENCHMARKS))
+def test_benchmark_runs(name: str):
+    results = benchmarks.run([name, ], [2, ], repeat=1)
+    result = results['results']['{}[2]'.format(name)]
+    assert result['runs'] == 1
+    assert result['min'] > 0
+
+
+def test_benchmark_cleanup(tmpdir, monkeypatch):
+    monkeypatch.setattr('tempfile.tempdir', str(tmpdir))
+    benchmarks.run(['snapshot_issues', ], [2, ], repeat=1)
+    assert tmpdir.listdir() == []
+
+
+def test_compare():
+    old = {'results': {'decode[10]': {'min': 0.2}}}
+    new = {'results': {'decode[10]': {'min': 0.1}, 'decode[20]': {'min': 1}}}
+    lines = benchmarks.compare(old, new)
+    assert len(lines) == 2
+    assert lines[1].endswith('-50.0%')
+
+
+def test_fixtures_deterministic():
+    assert fixtures.issues(5) == fixtures.issues(5)
+    assert fixtures.patch(2) == fixtures.patch(2)
+
+
+def test_fixtures_decode():
+    bugs = models.decode(fixtures.dumps(fixtures.issues(20)), 'Issue')
+    assert [b.number for b in bugs] == list(range(20, 0, -1))
+    assert all(isinstance(b.labels, list) for b in bugs)
+    assert bugs[0].reactions._fields[0] == '_0'
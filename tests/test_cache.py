@@ -0,0 +1,186 @@
+#
+"""test_cache - Test local cache handling."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+
+from collections import namedtuple
+
+from click.testing import CliRunner
+from pytest import fixture
+
+import hubugs
+import hubugs_client
+
+from hubugs import (cache, template)
+
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def fetcher():
+    calls = []
+
+    def fetch():
+        calls.append(True)
+        return '[{{"name": "bug{}"}}]'.format(len(calls)).encode()
+    fetch.calls = calls
+    return fetch
+
+
+@fixture(autouse=True)
+def cache_home(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    return tmpdir
+
+
+def test_MetadataCache_hit(fetcher):
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs')
+    assert meta.get('labels', fetcher) == b'[{"name": "bug1"}]'
+    # Fresh instance to force read from disk
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs')
+    assert meta.get('labels', fetcher) == b'[{"name": "bug1"}]'
+    assert len(fetcher.calls) == 1
+
+
+def test_MetadataCache_expired(fetcher):
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs',
+                               ttl=60)
+    meta.get('labels', fetcher)
+    stale = time.time() - 120
+    os.utime(meta._path('labels'), (stale, stale))
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs',
+                               ttl=60)
+    assert meta.get('labels', fetcher) == b'[{"name": "bug2"}]'
+
+
+def test_MetadataCache_disabled(fetcher):
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs',
+                               ttl=0)
+    meta.get('labels', fetcher)
+    assert not os.path.exists(meta._path('labels'))
+
+
+def test_MetadataCache_invalidate(fetcher):
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs')
+    meta.get('labels', fetcher)
+    meta.get('milestones', fetcher)
+    meta.invalidate('labels')
+    assert meta.get('labels', fetcher) == b'[{"name": "bug3"}]'
+    meta.invalidate()
+    assert os.listdir(meta.directory) == []
+
+
+def test_MetadataCache_per_project(fetcher):
+    meta = cache.MetadataCache('https://api.github.com', 'JNRowe/hubugs')
+    meta.get('labels', fetcher)
+    other = cache.MetadataCache('https://ghe.example.com/api/v3',
+                                'JNRowe/hubugs')
+    assert other.get('labels', fetcher) == b'[{"name": "bug2"}]'
+
+
+def test_CompletionIndex_issues():
+    Issue = namedtuple('Issue', 'number title state')
+    index = cache.CompletionIndex('https://api.github.com', 'JNRowe/hubugs')
+    index.update('issues', [Issue(1, 'First: bug', 'open'),
+                            Issue(3, 'Third\nbug', 'closed')])
+    index.update('issues', [Issue(2, 'Second bug', 'open')])
+    assert index.read('issues') == {
+        '3': 'Third bug (closed)',
+        '2': 'Second bug',
+        '1': r'First\: bug',
+    }
+
+
+def test_CompletionIndex_replace():
+    Label = namedtuple('Label', 'name')
+    index = cache.CompletionIndex('https://api.github.com', 'JNRowe/hubugs')
+    index.update('labels', [Label('bug'), Label('area:cli')])
+    index.refresh('labels', [Label('feature'), ]).join()
+    assert index.read('labels') == {'feature': ''}
+
+
+def test_CompletionIndex_complete(capsys):
+    Milestone = namedtuple('Milestone', 'title description')
+    index = cache.CompletionIndex('https://api.github.com', 'JNRowe/hubugs')
+    index.update('milestones', [Milestone('v1:beta', 'Testing'), ])
+    assert hubugs_client.complete(['--project', 'JNRowe/hubugs',
+                                   '_complete', 'milestones']) == 0
+    assert capsys.readouterr().out == 'v1\\:beta:Testing\n'
+
+
+def test_RenderCache_key():
+    assert cache.RenderCache.key('list', {'a': 1, 'b': 2}) \
+        == cache.RenderCache.key('list', {'b': 2, 'a': 1})
+    assert cache.RenderCache.key('list', 80) \
+        != cache.RenderCache.key('list', 120)
+
+
+def test_RenderCache_prune(monkeypatch):
+    monkeypatch.setattr(cache.RenderCache, 'MAX_ENTRIES', 2)
+    rendered = cache.RenderCache('https://api.github.com')
+    for n, key in enumerate(['a', 'b', 'c']):
+        rendered.put(key, {'text': key})
+        os.utime(rendered._path(key), (n, n))
+    rendered.put('d', {'text': 'd'})
+    assert rendered.get('a') is None
+    assert rendered.get('b') is None
+    assert rendered.get('d') == {'text': 'd'}
+
+
+@fixture
+def renders(monkeypatch):
+    calls = []
+    render = template.Template.render
+
+    def counting_render(self, *args, **kwargs):
+        calls.append(self.name)
+        return render(self, *args, **kwargs)
+    monkeypatch.setattr(template.Template, 'render', counting_render)
+    monkeypatch.setattr(template, 'list_formatter', lambda: None)
+    return calls
+
+
+def test_render_cached(monkeypatch, renders):
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    # Revalidate every request, so that changes are seen immediately
+    with FakeHub([Project('JNRowe/hubugs', 30), ], max_age=0) as server:
+        def invoke(*args):
+            result = CliRunner().invoke(hubugs.cli, [
+                '--host-url', server.url, '--project', 'JNRowe/hubugs'
+            ] + list(args))
+            assert result.exit_code == 0
+            return result.output
+
+        for args in (['list', '-s', 'all'], ['search', 'bug'],
+                     ['show', '--full', '1']):
+            first = invoke(*args)
+            count = len(renders)
+            assert invoke(*args) == first
+            assert len(renders) == count
+        # Changes to width, arguments or the data all render anew
+        monkeypatch.setenv('COLUMNS', '60')
+        invoke('list', '-s', 'all')
+        assert len(renders) == count + 1
+        invoke('list', '-s', 'closed')
+        assert len(renders) == count + 2
+        server.projects['JNRowe/hubugs'].issues[1]['title'] = 'Renamed'
+        assert 'Renamed' in invoke('show', '--full', '1')
+        assert len(renders) == count + 3
@@ -0,0 +1,141 @@
+#
+"""test_daemon - Test daemon support."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from pytest import (fixture, mark)
+
+import hubugs_client
+
+from hubugs import (_version, utils)
+
+
+@fixture
+def daemon(tmpdir, monkeypatch):
+    monkeypatch.setenv('HUBUGS_SOCKET', str(tmpdir.join('daemon.sock')))
+    proc = subprocess.Popen([
+        sys.executable, '-c',
+        'import hubugs; hubugs.main(["daemon", "--timeout", "30"])'])
+    for _ in range(100):
+        if tmpdir.join('daemon.sock').exists():
+            break
+        time.sleep(0.05)
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def test_forward_no_daemon(tmpdir, monkeypatch):
+    monkeypatch.setenv('HUBUGS_SOCKET', str(tmpdir.join('daemon.sock')))
+    assert hubugs_client.forward(['--version', ]) is None
+
+
+def test_forward(daemon, capfd):
+    assert hubugs_client.forward(['--version', ]) == 0
+    assert _version.dotted in capfd.readouterr().out
+
+
+def test_forward_exit_status(daemon, capfd):
+    assert hubugs_client.forward(['no_such_command', ]) == 2
+    assert 'No such command' in capfd.readouterr().err
+
+
+def test_forward_directory(daemon, tmpdir, monkeypatch):
+    # The daemon runs from within a repository, so this only fails if our
+    # directory is used
+    monkeypatch.chdir(tmpdir)
+    assert hubugs_client.forward(['list', ]) == errno.EINVAL
+
+
+def test_stop(daemon, capfd):
+    assert hubugs_client.forward(['daemon', '--status']) == 0
+    assert 'served: 0' in capfd.readouterr().out
+    assert hubugs_client.forward(['daemon', '--stop']) == 0
+    assert daemon.wait(5) == 0
+    assert hubugs_client.forward(['--version', ]) is None
+
+
+def test_hangup(daemon, capfd):
+    request = {'argv': ['proxy', '--port', '0'], 'cwd': os.getcwd(),
+               'env': dict(os.environ)}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(hubugs_client.socket_path())
+        hubugs_client.send_message(sock, request, range(3))
+        time.sleep(0.5)
+    # The proxy would run forever, holding the daemon, if it weren’t stopped
+    # when its client went away
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(hubugs_client.socket_path())
+        request['argv'] = ['--version', ]
+        hubugs_client.send_message(sock, request, range(3))
+        status = hubugs_client.recv_exact(sock, hubugs_client.STATUS.size)
+    assert hubugs_client.STATUS.unpack(status)[0] == 0
+    assert _version.dotted in capfd.readouterr().out
+
+
+@mark.parametrize('argv, local', [
+    (['list', ], False),
+    (['--pager', 'list'], True),
+    (['watch', ], True),
+    (['-p', 'watch', 'list'], False),
+    (['--project=JNRowe/hubugs', 'proxy'], True),
+    (['comment', '3'], True),
+    (['comment', '-m', 'text', '3'], False),
+    (['comment', '-mtext', '3'], False),
+    (['edit', '--title=Title', '3'], False),
+    (['open', '--stdin'], False),
+    (['open', '--', '--title'], True),
+])
+def test_runs_locally(argv, local):
+    assert hubugs_client.runs_locally(argv) == local
+
+
+def test_complete_position(monkeypatch):
+    monkeypatch.setattr('sys.argv', ['hubugs', 'comment', '-m', '_complete',
+                                     '3'])
+    monkeypatch.setattr('hubugs_client.complete', lambda argv: 'completed')
+    monkeypatch.setattr('hubugs_client.forward', lambda argv: 'forwarded')
+    assert hubugs_client.main() == 'forwarded'
+    monkeypatch.setattr('sys.argv', ['hubugs', '-p', 'JNRowe/hubugs',
+                                     '_complete', 'issues'])
+    assert hubugs_client.main() == 'completed'
+
+
+def test_config_cache(monkeypatch):
+    calls = []
+
+    def check_output(*args, **kwargs):
+        calls.append(args)
+        return b'JNRowe'
+    monkeypatch.setattr('subprocess.check_output', check_output)
+    monkeypatch.setattr('hubugs.utils.CONFIG_CACHE', {})
+
+    assert utils.get_git_config_val('github.user') == 'JNRowe'
+    assert utils.get_git_config_val('github.user') == 'JNRowe'
+    assert len(calls) == 1
+    monkeypatch.setenv('GIT_CONFIG_GLOBAL', '/nonexistent')
+    assert utils.get_git_config_val('github.user') == 'JNRowe'
+    assert len(calls) == 2
@@ -0,0 +1,153 @@
+#
+"""test_duplicates - Test duplicate issue detection."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import subprocess
+import sys
+import threading
+import time
+
+from collections import namedtuple
+
+from click.testing import CliRunner
+from pytest import fixture
+
+import hubugs
+
+from hubugs import duplicates
+
+from tests.fakehub import FakeHub, Project
+
+Issue = namedtuple('Issue', 'number title state body')
+Listed = namedtuple('Listed', 'number title state')
+
+
+@fixture(autouse=True)
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+
+@fixture
+def index():
+    return duplicates.DuplicateIndex('https://api.github.com',
+                                     'JNRowe/hubugs')
+
+
+def wait_for_refreshes():
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread() and not thread.daemon:
+            thread.join()
+
+
+def test_shingles():
+    assert duplicates.shingles('The pager crashes, crashed and crash') == \
+        {'pager', 'crash'}
+
+
+def test_similarity():
+    pager = duplicates.signature('Pager swallows colour output when piping')
+    assert duplicates.similarity(pager, duplicates.signature(
+        'Colour output swallowed by the pager')) > 0.6
+    assert duplicates.similarity(pager, duplicates.signature(
+        'Crash on startup with Python 3.5')) < 0.1
+    assert duplicates.similarity(duplicates.EMPTY, duplicates.EMPTY) == 0
+
+
+def test_search(index):
+    index.update([
+        Issue(1, 'Pager swallows colour output', 'closed', 'Using less'),
+        Issue(2, 'Crash on startup', 'open', ''),
+        Issue(3, 'Support GitHub Enterprise', 'open', None),
+    ])
+    matches = index.search('Colour output swallowed by pager')
+    assert [m['number'] for m in matches] == [1, ]
+    assert matches[0]['state'] == 'closed'
+    match = index.search('Startup crashes', 'Traceback on startup')[0]
+    assert (match['number'], match['title']) == (2, 'Crash on startup')
+    assert index.search('Unrelated words entirely') == []
+
+
+def test_listing_keeps_body(index):
+    index.update([Issue(1, 'Pager bug', 'open', 'Colour codes lost')])
+    index.update([Listed(1, 'Pager bug', 'closed')])
+    state, title, body, _ = index.read()[1]
+    assert (state, title, body) == ('closed', 'Pager bug', True)
+    assert index.search('Colour codes lost in pager')
+    index.update([Listed(1, 'Renamed', 'closed')])
+    assert index.read()[1][:3] == ('closed', 'Renamed', False)
+
+
+def test_update_locked(index):
+    code = '; '.join([
+        'from collections import namedtuple',
+        'from hubugs import duplicates',
+        'Listed = namedtuple("Listed", "number title state")',
+        'duplicates.DuplicateIndex("https://api.github.com", "JNRowe/hubugs")'
+        '.update([Listed(2, "Colour output swallowed", "open")])',
+    ])
+    with index._locked():
+        proc = subprocess.Popen([sys.executable, '-c', code])
+        time.sleep(0.5)
+        # Other processes wait until we’re finished with the index
+        assert proc.poll() is None
+    assert proc.wait(10) == 0
+    index.update([Listed(1, 'Pager swallows colour output', 'open'), ])
+    assert sorted(index.read()) == [1, 2]
+
+
+def test_open_warns(monkeypatch):
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 30), ]) as server:
+        title = server.projects['JNRowe/hubugs'].issues[7]['title']
+        args = ['--host-url', server.url, '--project', 'JNRowe/hubugs']
+        runner = CliRunner()
+        runner.invoke(hubugs.cli, args + ['list', '--state', 'all'])
+        wait_for_refreshes()
+        result = runner.invoke(hubugs.cli, args + ['open', '--title', title,
+                                                   '--body', ''])
+        assert result.exit_code == 0
+        assert 'Possible duplicates' in result.output
+        assert '  7 {}'.format(title) in result.output
+        result = runner.invoke(hubugs.cli, args + [
+            'open', '--no-check', '--title', title, '--body', ''])
+        assert 'Possible duplicates' not in result.output
+        wait_for_refreshes()
+
+
+def test_open_declined(tmpdir, monkeypatch):
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    monkeypatch.setattr('click.testing._NamedTextIOWrapper.isatty',
+                        lambda self: True, raising=False)
+    with FakeHub([Project('JNRowe/hubugs', 30), ]) as server:
+        project = server.projects['JNRowe/hubugs']
+        title = project.issues[7]['title']
+        args = ['--host-url', server.url, '--project', 'JNRowe/hubugs']
+        runner = CliRunner()
+        runner.invoke(hubugs.cli, args + ['list', '--state', 'all'])
+        wait_for_refreshes()
+        labels = len(project.labels)
+        result = runner.invoke(hubugs.cli, args + [
+            'open', '--create', 'new-label', '--title', title, '--body',
+            'Draft body'], input='n\n')
+        assert result.exit_code != 0
+        assert len(project.labels) == labels
+        path = result.output.split('text saved to ')[1].strip()
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == '{}\nDraft body'.format(title)
@@ -0,0 +1,183 @@
+#
+"""test_fakehub - Test hubugs against the fake GitHub server."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+
+from click.testing import CliRunner
+from pytest import fixture, raises
+
+import hubugs
+
+from hubugs import utils
+
+from tests import fixtures
+from tests.benchmarks import load
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def server():
+    with FakeHub([Project('JNRowe/hubugs', 75), ], max_age=0) as server:
+        yield server
+
+
+@fixture
+def globs(server, tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    return utils.setup_environment('JNRowe/hubugs', server.url)
+
+
+def test_pagination(globs, server):
+    r, bugs = globs.req_get('', params={'state': 'all'}, model='Issue')
+    assert len(bugs) == 30
+    assert 'rel="next"' in r['link']
+    assert 'page=3' in r['link']
+
+
+def test_not_modified(globs, server):
+    globs.req_get(1, model='Issue')
+    globs.req_memo.invalidate()
+    r, bug = globs.req_get(1, model='Issue')
+    assert bug.number == 1
+    assert r.fromcache
+    assert server.not_modified == 1
+    assert r['x-ratelimit-remaining'] == '4999'
+
+
+def test_memoised(globs, server):
+    globs.req_get(1, model='Issue')
+    r, bug = globs.req_get(1, model='Issue')
+    assert bug.number == 1
+    assert server.total_requests == 1
+
+
+def test_memo_invalidated_by_mutation(globs, server):
+    r, comments = globs.req_get('1/comments', model='Comment')
+    globs.req_post('1/comments', body={'body': 'Test'}, model='Comment')
+    r, updated = globs.req_get('1/comments', model='Comment')
+    assert len(updated) == len(comments) + 1
+
+
+def test_rate_limit(globs, server):
+    server.remaining = 0
+    with raises(utils.HttpClientError):
+        globs.req_get(1, model='Issue')
+
+
+def test_search(globs, server):
+    r, c = globs.req_get('{}/search/issues'.format(server.url),
+                         params={'q': 'repo:JNRowe/hubugs state:open'},
+                         model='Issue')
+    issues = server.projects['JNRowe/hubugs'].issues.values()
+    assert c.total_count == sum(i['state'] == 'open' for i in issues)
+
+
+def test_mutation(globs, server):
+    globs.req_post('1/comments', body={'body': 'Test'}, model='Comment')
+    r, comments = globs.req_get('1/comments', model='Comment')
+    assert comments[-1].body == 'Test'
+
+
+def test_load_harness():
+    results = load.run(['label-list', ], issues=10, warm=False)
+    result = results['label-list']['cold']
+    assert result['exit'] == 0
+    assert result['requests'] == 1
+    assert result['max_rss'] > 0
+
+
+def test_paged_get(globs, server):
+    pages = list(globs.req_pages('', params={'state': 'all'}))
+    assert [len(page) for page in pages] == [30, 30, 15]
+    assert len(set(i['number'] for page in pages for i in page)) == 75
+
+
+def test_paged_get_concurrent(globs, server):
+    pages = list(globs.req_pages('', params={'state': 'all', 'per_page': 10},
+                                 workers=3))
+    expected = list(globs.req_pages('', params={'state': 'all',
+                                                'per_page': 10}))
+    assert pages == expected
+    assert len(pages) == 8
+
+
+def test_show_all_comments(server, tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    project = server.projects['JNRowe/hubugs']
+    issue = project.issues[1]
+    issue['comments'] = 250
+    project.comments[1] = fixtures.comments(issue)
+    result = CliRunner().invoke(hubugs.cli, [
+        '--host-url', server.url, '--project', 'JNRowe/hubugs', 'show',
+        '--full', '1'])
+    assert result.exit_code == 0
+    assert result.output.count(' Comment: ') == 250
+    assert ' Comment: 250' in result.output
+
+
+@fixture
+def multi_server(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    projects = [Project('a/one', 40, seed=1), Project('a/two', 40, seed=2)]
+    with FakeHub(projects, latency=0.2) as server:
+        yield server
+
+
+def test_multi_project_list(multi_server):
+    runner = CliRunner()
+    start = time.perf_counter()
+    result = runner.invoke(hubugs.cli, [
+        '--host-url', multi_server.url, '--project', 'a/one', '--project',
+        'a/two', 'list', '--state', 'all', '--order', 'updated', '--format',
+        'jsonl', '--fields', 'repository,updated_at'])
+    # Projects are fetched concurrently, so this is well under two requests’
+    # worth of latency
+    assert time.perf_counter() - start < 0.35
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert len(records) == 80
+    assert {r['repository'] for r in records} == {'a/one', 'a/two'}
+    stamps = [r['updated_at'] for r in records]
+    assert stamps == sorted(stamps)
+
+
+def test_multi_project_text(multi_server):
+    runner = CliRunner()
+    result = runner.invoke(hubugs.cli, [
+        '--host-url', multi_server.url, '--project', 'a/one', '--project',
+        'a/two', 'list'])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].split() == ['Repo', 'Id', 'Title']
+    numbers = [int(line.split()[1]) for line in lines[1:]
+               if line.startswith('a/')]
+    assert numbers == sorted(numbers)
+
+
+def test_multi_project_unsupported(multi_server):
+    runner = CliRunner()
+    result = runner.invoke(hubugs.cli, [
+        '--host-url', multi_server.url, '--project', 'a/one', '--project',
+        'a/two', 'show', '1'])
+    assert result.exit_code == 2
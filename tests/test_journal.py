@@ -0,0 +1,182 @@
+#
+"""test_journal - Test deferred changes."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from click.testing import CliRunner
+from pytest import fixture
+
+import hubugs
+
+from hubugs import journal
+
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def server(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('cache')))
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 10), ], latency=0.1) as server:
+        yield server
+
+
+@fixture
+def spawned(monkeypatch):
+    calls = []
+    monkeypatch.setattr(journal, 'spawn_flusher', lambda: calls.append(True))
+    return calls
+
+
+def invoke(__server, *__args):
+    return CliRunner().invoke(hubugs.cli, [
+        '--host-url', __server.url, '--project', 'JNRowe/hubugs'
+    ] + list(__args))
+
+
+def test_issue_key():
+    url = 'https://api.github.com/repos/JNRowe/hubugs/issues/4/comments'
+    assert journal.issue_key(url) == 'JNRowe/hubugs#4'
+    assert journal.issue_key(url.replace('/4/comments', '')) is None
+
+
+def test_async_comment(server, spawned):
+    start = time.perf_counter()
+    result = invoke(server, '--async', 'comment', '-m', 'Queued', '1', '2')
+    assert result.exit_code == 0
+    # Nothing is sent by the command itself
+    assert time.perf_counter() - start < 0.1
+    assert server.total_requests == 0
+    assert spawned == [True, ]
+
+    result = invoke(server, 'journal', 'status')
+    assert result.output.startswith('2 pending, 0 failed\n')
+    assert 'JNRowe/hubugs#1 comment' in result.output
+
+    result = invoke(server, 'journal', 'flush')
+    assert result.output == '2 sent, 0 rejected, 0 pending\n'
+    comments = server.projects['JNRowe/hubugs'].comments
+    assert comments[1][-1]['body'] == comments[2][-1]['body'] == 'Queued'
+    assert journal.Journal().entries() == []
+
+
+def test_async_unsupported(server, spawned):
+    result = invoke(server, '--async', 'list')
+    assert result.exit_code == 2
+    assert 'support --async' in result.output
+
+
+def test_pending_flushed_by_next_command(server, spawned):
+    invoke(server, '--async', 'comment', '-m', 'Queued', '1')
+    spawned.clear()
+    invoke(server, 'label', '--list')
+    assert spawned == [True, ]
+
+
+def test_read_only_startup(server, spawned, tmpdir, monkeypatch):
+    def entries(self):
+        raise AssertionError('Journal read')
+    monkeypatch.setattr(journal.Journal, 'entries', entries)
+    assert invoke(server, 'label', '--list').exit_code == 0
+    assert not tmpdir.join('data').check()
+    assert spawned == []
+
+
+def test_ordering_and_concurrency(server):
+    count = 6
+    queue = journal.Journal()
+    url = '{}/repos/JNRowe/hubugs/issues/{{}}'.format(server.url)
+    for n in range(1, count + 1):
+        queue.append(server.url, 'JNRowe/hubugs',
+                     url.format(n) + '/comments', {'body': 'Closing'},
+                     'Comment')
+        queue.append(server.url, 'JNRowe/hubugs', url.format(n),
+                     {'state': 'closed'}, 'Issue')
+    start = time.perf_counter()
+    counts = queue.flush()
+    # Issues are handled concurrently, each taking two requests’ latency
+    assert time.perf_counter() - start < 0.1 * count
+    assert counts == {'sent': count * 2, 'rejected': 0, 'pending': 0}
+    issues = server.projects['JNRowe/hubugs'].issues
+    comments = server.projects['JNRowe/hubugs'].comments
+    for n in range(1, count + 1):
+        assert issues[n]['state'] == 'closed'
+        # Comment was made before the issue was closed
+        assert comments[n][-1]['updated_at'] <= issues[n]['updated_at']
+
+
+def test_rejected(server):
+    queue = journal.Journal()
+    url = '{}/repos/JNRowe/hubugs/issues/{{}}/comments'.format(server.url)
+    queue.append(server.url, 'JNRowe/hubugs', url.format(999),
+                 {'body': 'Lost'}, 'Comment')
+    queue.append(server.url, 'JNRowe/hubugs', url.format(1),
+                 {'body': 'Found'}, 'Comment')
+    counts = queue.flush()
+    assert counts == {'sent': 1, 'rejected': 1, 'pending': 0}
+    failed = queue.failed()
+    assert len(failed) == 1
+    assert failed[0]['error'] == 'Not Found'
+    assert journal.describe(failed[0]) == 'JNRowe/hubugs#999 comment'
+    # Failures survive compaction, but aren’t retried unless asked
+    assert queue.flush() == {'sent': 0, 'rejected': 0, 'pending': 0}
+    assert queue.flush(retry_failed=True)['rejected'] == 1
+
+
+def test_server_error_page(server):
+    server.error_rate = 1.0
+    server.error_page = b'<html><body>Bad Gateway</body></html>'
+    queue = journal.Journal()
+    url = '{}/repos/JNRowe/hubugs/issues/1/comments'.format(server.url)
+    queue.append(server.url, 'JNRowe/hubugs', url, {'body': 'Later'},
+                 'Comment')
+    assert queue.flush(delays=(0, )) == {'sent': 0, 'rejected': 0,
+                                         'pending': 1}
+    server.error_rate = 0.0
+    assert queue.flush() == {'sent': 1, 'rejected': 0, 'pending': 0}
+    comments = server.projects['JNRowe/hubugs'].comments
+    assert comments[1][-1]['body'] == 'Later'
+
+
+def test_transient_failure(tmpdir):
+    queue = journal.Journal(str(tmpdir.join('journal.jsonl')))
+    url = 'https://api.github.com/repos/JNRowe/hubugs/issues/{}'
+    for n in (1, 1, 2):
+        queue.append('https://api.github.com', 'JNRowe/hubugs', url.format(n),
+                     {'state': 'closed'}, 'Issue')
+    sent = []
+
+    class Response(dict):
+        status = 200
+
+    def factory(host_url, project):
+        def post(url, body, model, is_json):
+            if url.endswith('/1'):
+                raise OSError('Network unreachable')
+            sent.append(url)
+            return Response(), None
+        return post
+
+    counts = queue.flush(delays=(0, ), post_factory=factory)
+    # The second change to issue 1 waits behind the first
+    assert counts == {'sent': 1, 'rejected': 0, 'pending': 2}
+    assert sent == [url.format(2), ]
+    assert [e['url'] for e in queue.pending()] == [url.format(1), ] * 2
@@ -0,0 +1,95 @@
+#
+"""test_output - Test machine readable output."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from io import StringIO
+
+from pytest import mark, raises
+
+from hubugs import output
+
+from tests import fixtures
+
+
+@mark.parametrize('value, expected', [
+    (None, ''),
+    (True, 'true'),
+    (4, '4'),
+    ({'login': 'JNRowe', 'id': 1}, 'JNRowe'),
+    ([{'name': 'bug'}, {'name': 'feature'}], 'bug,feature'),
+    ({'url': 'https://example.com'}, '{"url": "https://example.com"}'),
+])
+def test_flatten(value, expected):
+    assert output.flatten(value) == expected
+
+
+def test_field():
+    record = {'user': {'login': 'JNRowe'}, 'milestone': None}
+    assert output.field(record, 'user.login') == 'JNRowe'
+    assert output.field(record, 'milestone.title') is None
+    assert output.field(record, 'missing') is None
+
+
+def test_RecordWriter_json():
+    stream = StringIO()
+    issues = fixtures.issues(5)
+    with output.RecordWriter(stream, 'json') as writer:
+        writer.write(issues[:2])
+        writer.write(issues[2:])
+    assert json.loads(stream.getvalue()) == issues
+
+
+def test_RecordWriter_json_empty():
+    stream = StringIO()
+    with output.RecordWriter(stream, 'json'):
+        pass
+    assert json.loads(stream.getvalue()) == []
+
+
+def test_RecordWriter_jsonl_fields():
+    stream = StringIO()
+    with output.RecordWriter(stream, 'jsonl', ['number', 'user.login']) as w:
+        w.write(fixtures.issues(3))
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 3
+    assert sorted(json.loads(lines[0])) == ['number', 'user.login']
+
+
+def test_RecordWriter_incremental():
+    stream = StringIO()
+    writer = output.RecordWriter(stream, 'csv', ['number', 'labels'])
+    writer.write([{'number': 1, 'labels': [{'name': 'a'}, {'name': 'b'}]}, ])
+    assert stream.getvalue() == 'number,labels\n1,"a,b"\n'
+    writer.write([{'number': 2, 'labels': []}, ])
+    assert stream.getvalue().endswith('2,\n')
+
+
+def test_RecordWriter_tsv():
+    stream = StringIO()
+    with output.RecordWriter(stream, 'tsv') as writer:
+        writer.write(fixtures.issues(2))
+    header = stream.getvalue().splitlines()[0]
+    assert header.split('\t') == list(output.DEFAULT_FIELDS)
+
+
+def test_RecordWriter_invalid_format():
+    with raises(ValueError):
+        output.RecordWriter(StringIO(), 'xml')
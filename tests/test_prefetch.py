@@ -0,0 +1,102 @@
+#
+"""test_prefetch - Test prefetching of bugs."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+from click.testing import CliRunner
+from pytest import fixture
+
+import hubugs
+
+from hubugs import (prefetch, utils)
+
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def server(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('cache')))
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 20), ]) as server:
+        yield server
+
+
+@fixture
+def spawned(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, 'spawn_detached', calls.append)
+    return calls
+
+
+def invoke(__server, *__args):
+    return CliRunner().invoke(hubugs.cli, [
+        '--host-url', __server.url, '--project', 'JNRowe/hubugs'
+    ] + list(__args))
+
+
+def test_parse_target():
+    assert prefetch.parse_target('JNRowe/hubugs#12') == ('JNRowe/hubugs', 12)
+
+
+def test_list_spawns_worker(server, spawned):
+    result = invoke(server, 'list', '--prefetch', '3')
+    assert result.exit_code == 0
+    numbers = [int(line.split()[0])
+               for line in result.output.splitlines()[1:4]]
+    assert spawned == [['--host-url', server.url, 'prefetch'] + [
+        'JNRowe/hubugs#{}'.format(n) for n in numbers]]
+
+
+def test_list_without_prefetch(server, spawned):
+    invoke(server, 'list')
+    assert spawned == []
+
+
+def test_show_from_cache(server, spawned):
+    invoke(server, 'list', '--prefetch', '3')
+    targets = spawned[0][3:]
+    result = invoke(server, *spawned[0][2:])
+    assert result.exit_code == 0
+    server.reset_stats()
+    for target in targets:
+        result = invoke(server, 'show', '--full', target.split('#')[1])
+        assert result.exit_code == 0
+    assert server.total_requests == 0
+
+
+def test_budget(server, monkeypatch):
+    monkeypatch.setattr(prefetch, 'RESERVE', server.remaining - 5)
+    targets = [('JNRowe/hubugs', n) for n in range(1, 11)]
+    counts = prefetch.fetch(server.url, targets)
+    # One request is spent on repository information, leaving enough for two
+    # bugs and their comments
+    assert counts['bugs'] == 2
+
+
+def test_budget_unavailable(server):
+    server.error_rate = 1.0
+    assert prefetch.budget(server.url, 'JNRowe/hubugs') == 0
+    server.error_page = b'<html><body>Bad Gateway</body></html>'
+    assert prefetch.budget(server.url, 'JNRowe/hubugs') == 0
+    server.error_rate = 0.0
+    server.remaining = 0
+    assert prefetch.budget(server.url, 'JNRowe/hubugs') == 0
+    server.server_close()
+    assert prefetch.fetch(server.url, [('JNRowe/hubugs', 1), ]) \
+        == {'bugs': 0, 'comments': 0}
@@ -0,0 +1,117 @@
+#
+"""test_progress - Test milestone progress reports."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from click.testing import CliRunner
+from pytest import fixture
+
+import hubugs
+
+from hubugs import (progress, utils)
+
+from tests import fixtures
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def server(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 250), ], max_age=0) as server:
+        yield server
+
+
+@fixture
+def globs(server):
+    globs = utils.setup_environment('JNRowe/hubugs', server.url)
+    globs.update({'host_url': server.url, 'project': 'JNRowe/hubugs'})
+    return globs
+
+
+def test_week():
+    assert progress.week('2018-03-08T12:00:00Z') == '2018-03-05'
+    assert progress.week('2018-03-05T00:00:00Z') == '2018-03-05'
+
+
+def test_merge_matches_single_pass():
+    issues = fixtures.issues(120, 'JNRowe/hubugs', 7)
+    totals = {}
+    for start in range(0, 120, 25):
+        progress.merge(totals, progress.aggregate(issues[start:start + 25]))
+    assert totals == progress.aggregate(issues)
+
+
+def test_burndown():
+    weeks = {'2018-01-01': [3, 0], '2018-01-15': [1, 2]}
+    assert progress.burndown(weeks, datetime.date(2018, 1, 24)) == [
+        ('2018-01-01', 3), ('2018-01-08', 3), ('2018-01-15', 2),
+        ('2018-01-22', 2)]
+
+
+def test_scan(globs, server):
+    totals, stats = progress.scan(globs)
+    issues = server.projects['JNRowe/hubugs'].issues.values()
+    count = sum(1 for i in issues if i['milestone'])
+    assert stats == {'pages': (count - 1) // 100 + 1, 'reused': 0}
+    assert sum(t['open'] + t['closed'] for t in totals.values()) == count
+    for number, entry in totals.items():
+        assert entry['open'] == sum(
+            1 for i in issues if i['state'] == 'open' and i['milestone']
+            and i['milestone']['number'] == int(number))
+
+
+def test_scan_reuses_pages(globs, server):
+    _, first = progress.scan(globs)
+    assert first['pages'] > 1
+    server.reset_stats()
+    # A later invocation has no memoised responses
+    globs.req_memo.invalidate()
+    _, stats = progress.scan(globs)
+    assert stats == {'pages': first['pages'], 'reused': first['pages']}
+    assert server.not_modified == first['pages']
+
+    # Only the page holding the changed issue is decoded again
+    number = next(n for n, i in server.projects['JNRowe/hubugs'].issues.items()
+                  if i['milestone'])
+    globs.req_post('{}/comments'.format(number), body={'body': 'Moved'},
+                   model='Comment')
+    _, stats = progress.scan(globs)
+    assert stats['reused'] == first['pages'] - 1
+
+
+def test_report_order(globs):
+    totals, _ = progress.scan(globs)
+    reports = progress.report(totals, 'completeness')
+    percents = [r['percent'] for r in reports]
+    assert percents == sorted(percents)
+    for report in reports:
+        if report['oldest']:
+            assert report['oldest']['age'] > 0
+        assert report['burndown'][-1][1] == report['open']
+
+
+def test_progress_command(server):
+    result = CliRunner().invoke(hubugs.cli, [
+        '--host-url', server.url, '--project', 'JNRowe/hubugs', 'milestones',
+        '--progress', '--weeks', '2'])
+    assert result.exit_code == 0
+    assert 'Open by week:' in result.output
+    assert result.output.splitlines()[-1].endswith('milestones found')
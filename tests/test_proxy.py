@@ -0,0 +1,196 @@
+#
+"""test_proxy - Test shared caching proxy."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import threading
+
+from concurrent import futures
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from click.testing import CliRunner
+from pytest import fixture, raises
+
+import hubugs
+
+from hubugs import proxy
+
+from tests.fakehub import FakeHub, Project
+
+
+def fetch(__server, __path, token='alice', method='GET', headers=None,
+          body=None):
+    headers = dict(headers or {})
+    if token:
+        headers['Authorization'] = 'token {}'.format(token)
+    request = Request(__server.url + __path, data=body, headers=headers,
+                      method=method)
+    with urlopen(request) as response:
+        return response.status, response.headers, response.read()
+
+
+@fixture
+def upstream():
+    with FakeHub([Project('JNRowe/hubugs', 40), ], latency=0.05) as server:
+        yield server
+
+
+@fixture
+def server(upstream):
+    server = proxy.ProxyServer(('127.0.0.1', 0), upstream.url)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_cache_control():
+    assert proxy.cache_control('private, max-age=60') == \
+        {'private': None, 'max-age': '60'}
+    assert proxy.cache_control(None) == {}
+
+
+def test_scope():
+    assert proxy.scope(None) == 'anonymous'
+    assert proxy.scope('token a') != proxy.scope('token b')
+    assert 'token' not in proxy.scope('token a')
+
+
+def test_hit(server, upstream):
+    status, headers, body = fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    assert headers['X-Hubugs-Cache'] == 'miss'
+    _, headers, cached = fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    assert headers['X-Hubugs-Cache'] == 'hit'
+    assert cached == body
+    assert json.loads(body.decode())['number'] == 1
+    assert upstream.total_requests == 1
+
+
+def test_revalidate(server, upstream):
+    upstream.max_age = 0
+    fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    _, headers, _ = fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    assert headers['X-Hubugs-Cache'] == 'revalidated'
+    assert upstream.not_modified == 1
+
+
+def test_client_not_modified(server):
+    _, headers, _ = fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    with raises(HTTPError) as error:
+        fetch(server, '/repos/JNRowe/hubugs/issues/1',
+              headers={'If-None-Match': headers['ETag']})
+    assert error.value.code == 304
+
+
+def test_tokens_separate(server, upstream):
+    fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    _, headers, _ = fetch(server, '/repos/JNRowe/hubugs/issues/1',
+                          token='bob')
+    assert headers['X-Hubugs-Cache'] == 'miss'
+    assert upstream.total_requests == 2
+
+
+def test_public_not_shared(server, upstream, monkeypatch):
+    request = server.request
+
+    def public_request(*args, **kwargs):
+        status, headers, content = request(*args, **kwargs)
+        return status, [(k, v.replace('private', 'public'))
+                        for k, v in headers], content
+    monkeypatch.setattr(server, 'request', public_request)
+    path = '/search/issues?q=bug'
+    _, headers, _ = fetch(server, path, token=None)
+    assert 'public' in headers['Cache-Control']
+    # Token holders may see private results anonymous clients can’t
+    _, headers, _ = fetch(server, path)
+    assert headers['X-Hubugs-Cache'] == 'miss'
+    _, headers, _ = fetch(server, path, token=None)
+    assert headers['X-Hubugs-Cache'] == 'hit'
+    assert upstream.total_requests == 2
+
+
+def test_coalesce(server, upstream):
+    with futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(
+            lambda _: fetch(server, '/repos/JNRowe/hubugs/issues'),
+            range(8)))
+    assert len(set(body for _, _, body in results)) == 1
+    assert upstream.total_requests == 1
+    assert server.stats['miss'] + server.stats['hit'] \
+        + server.stats['shared'] == 8
+
+
+def test_links(server, upstream):
+    _, headers, _ = fetch(server, '/repos/JNRowe/hubugs/issues?state=all')
+    assert server.url in headers['Link']
+    assert upstream.url not in headers['Link']
+
+
+def test_links_client_host(server, upstream):
+    # Clients of a proxy listening on all interfaces must be sent links they
+    # can reach, not the bind address
+    _, headers, _ = fetch(server, '/repos/JNRowe/hubugs/issues?state=all',
+                          headers={'Host': 'proxy.example.com:8643'})
+    assert 'http://proxy.example.com:8643/repos/' in headers['Link']
+    direct = server.url
+    server.public_url = 'https://hubugs.example.com'
+    request = Request(direct + '/repos/JNRowe/hubugs/issues?state=all',
+                      headers={'Authorization': 'token alice'})
+    with urlopen(request) as response:
+        assert response.headers['X-Hubugs-Cache'] == 'hit'
+        assert 'https://hubugs.example.com/repos/' \
+            in response.headers['Link']
+
+
+def test_mutation_invalidates(server, upstream):
+    path = '/repos/JNRowe/hubugs/issues/1/comments'
+    fetch(server, path)
+    status, _, _ = fetch(server, path, method='POST',
+                         body=json.dumps({'body': 'Hi'}).encode(),
+                         headers={'Content-Type': 'application/json'})
+    assert status == 201
+    _, headers, body = fetch(server, path)
+    assert headers['X-Hubugs-Cache'] == 'miss'
+    assert json.loads(body.decode())[-1]['body'] == 'Hi'
+
+
+def test_metrics(server):
+    for _ in range(4):
+        fetch(server, '/repos/JNRowe/hubugs/issues/1')
+    _, _, body = fetch(server, proxy.METRICS_PATH)
+    metrics = json.loads(body.decode())
+    assert metrics['requests'] == {'hit': 3, 'miss': 1}
+    assert metrics['hit_rate'] == 0.75
+
+
+def test_client(server, upstream, tmpdir, monkeypatch):
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    outputs = []
+    for name, url in [('direct', upstream.url), ('proxied', server.url)]:
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join(name)))
+        result = CliRunner().invoke(hubugs.cli, [
+            '--host-url', url, '--project', 'JNRowe/hubugs', 'list',
+            '--state', 'all'])
+        assert result.exit_code == 0
+        outputs.append(result.output)
+    assert outputs[0] == outputs[1]
+    assert server.stats['miss'] >= 1
@@ -0,0 +1,120 @@
+#
+"""test_snapshot - Test memory-mapped issue listings."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+import jinja2
+
+from click.testing import CliRunner
+from pytest import fixture, mark
+
+import hubugs
+
+from hubugs import (models, snapshot, store, template, utils)
+
+from tests import fixtures
+
+HOST = 'https://api.github.com'
+
+
+@fixture
+def db(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    db = store.IssueStore(HOST)
+    with db._db:
+        for issue in fixtures.issues(300):
+            db.put_issue('JNRowe/hubugs', issue)
+    yield db
+    db.close()
+
+
+def listing(__issues):
+    return [(i.number, i.state, i.title, i.updated_at,
+             [label.name for label in i.labels],
+             i.milestone.title if i.milestone else None)
+            for i in __issues]
+
+
+@mark.parametrize('state, labels, pull_requests, order', [
+    ('open', (), False, 'number'),
+    ('closed', (), False, 'updated'),
+    ('all', ('bug', ), False, 'number'),
+    ('all', ('bug', 'feature'), False, 'updated'),
+    ('all', (), True, 'number'),
+    ('all', ('no such label', ), False, 'number'),
+])
+def test_matches_store(db, state, labels, pull_requests, order):
+    expected = models.wrap(db.issues('JNRowe/hubugs', state, labels,
+                                     pull_requests, order), 'Issue')
+    with snapshot.load(db, HOST, 'JNRowe/hubugs') as snap:
+        issues = snap.issues(state, labels, pull_requests, order)
+    assert listing(issues) == listing(expected)
+    assert all(bool(i.pull_request) for i in issues) or not pull_requests
+
+
+def test_rebuild_when_stale(db):
+    with snapshot.load(db, HOST, 'JNRowe/hubugs') as snap:
+        assert snap.count == 300
+        version = snap.version
+    issue = db.issue('JNRowe/hubugs', 12)
+    issue.update(title='Retitled', updated_at='2030-01-01T00:00:00Z')
+    db.put_issue('JNRowe/hubugs', issue)
+    with snapshot.load(db, HOST, 'JNRowe/hubugs') as snap:
+        assert snap.version != version
+        assert [i.title for i in snap.issues('all')][11] == 'Retitled'
+
+
+def test_reused_when_current(db):
+    snapshot.load(db, HOST, 'JNRowe/hubugs').close()
+    path = snapshot.snapshot_path(HOST, 'JNRowe/hubugs')
+    stamp = os.stat(path).st_mtime_ns
+    snapshot.load(db, HOST, 'JNRowe/hubugs').close()
+    assert os.stat(path).st_mtime_ns == stamp
+
+
+def test_invalid_file(db):
+    path = snapshot.snapshot_path(HOST, 'JNRowe/hubugs')
+    with open(path, 'wb') as f:
+        f.write(b'not a snapshot')
+    with snapshot.load(db, HOST, 'JNRowe/hubugs') as snap:
+        assert snap.count == 300
+
+
+def test_custom_template_fields(db, tmpdir, monkeypatch):
+    tmpdir.join('custom', 'view', 'list.txt').write(
+        '{% for b in bugs %}{{ b.number }} {{ b.user.login }}\n{% endfor %}',
+        ensure=True)
+    monkeypatch.setattr(template.ENV, 'loader', jinja2.ChoiceLoader(
+        [jinja2.FileSystemLoader(str(tmpdir)), template.ENV.loader]))
+    get_git_config_val = utils.get_git_config_val
+    monkeypatch.setattr(utils, 'get_git_config_val', lambda key, *args: (
+        'custom' if key == 'hubugs.templates'
+        else get_git_config_val(key, *args)))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with db._db:
+        db.put_repository({'full_name': 'JNRowe/hubugs'})
+    assert not hubugs.snapshot_listing()
+    result = CliRunner().invoke(hubugs.cli, [
+        '--host-url', HOST, '--project', 'JNRowe/hubugs', '--local', 'list'])
+    assert result.exit_code == 0
+    issue = db.issues('JNRowe/hubugs')[0]
+    assert '{} {}'.format(issue['number'], issue['user']['login']) \
+        in result.output.splitlines()
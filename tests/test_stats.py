@@ -0,0 +1,101 @@
+#
+"""test_stats - Test issue statistics."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import json
+
+from click.testing import CliRunner
+from pytest import fixture, mark
+
+import hubugs
+
+from hubugs import stats
+
+from tests import fixtures
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def issues():
+    return fixtures.issues(200, 'JNRowe/hubugs', 3)
+
+
+def test_timestamp():
+    assert stats.timestamp('1970-01-02T00:00:01Z') == 86401
+    assert stats.timestamp(None) == -1
+
+
+@mark.parametrize('values, expected', [
+    ([], {}),
+    ([5, ], {'p50': 5, 'p75': 5, 'p90': 5, 'p99': 5}),
+    (range(1, 101), {'p50': 50, 'p75': 75, 'p90': 90, 'p99': 99}),
+])
+def test_percentiles(values, expected):
+    assert stats.percentiles(values) == expected
+
+
+def test_dictionary():
+    encoder = stats.Dictionary()
+    assert [encoder.encode(s) for s in 'abca'] == [0, 1, 2, 0]
+    assert encoder.values == ['a', 'b', 'c']
+
+
+def test_columns(issues):
+    columns = stats.IssueColumns()
+    columns.extend(issues[:50])
+    columns.extend(issues[50:])
+    assert len(columns) == 200
+    for n in (0, 17, 199):
+        labels = [columns.labels.dictionary.values[c]
+                  for c in columns.labels.row(n)]
+        assert labels == [label['name'] for label in issues[n]['labels']]
+        assert columns.logins.values[columns.author[n]] \
+            == issues[n]['user']['login']
+    # Far smaller than the records themselves
+    assert columns.nbytes() < 100 * len(columns)
+
+
+def test_summarise(issues):
+    columns = stats.IssueColumns()
+    columns.extend(issues)
+    summary = stats.summarise(columns, limit=3)
+    closed = [i for i in issues if i['state'] == 'closed']
+    assert summary['closed'] == len(closed)
+    assert summary['open'] + summary['closed'] == 200
+    assert sum(count for _, count in summary['close_buckets']) == len(closed)
+    labels = collections.Counter(label['name'] for i in issues
+                                 for label in i['labels'])
+    assert summary['labels'][0][1] == max(labels.values())
+    assert len(summary['authors']) == 3
+    assert list(summary['time_to_close']) == ['p50', 'p75', 'p90', 'p99']
+
+
+def test_stats_command(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 150), ]) as server:
+        args = ['--host-url', server.url, '--project', 'JNRowe/hubugs',
+                'stats']
+        result = CliRunner().invoke(hubugs.cli, args + ['--format', 'json'])
+        assert result.exit_code == 0
+        assert json.loads(result.output)['issues'] == 150
+        result = CliRunner().invoke(hubugs.cli, args)
+        assert result.exit_code == 0
+        assert result.output.startswith('Bugs: 150 (')
@@ -18,6 +18,9 @@
 # You should have received a copy of the GNU General Public License along with
 # hubugs.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import pickle
+
 from collections import namedtuple
 from datetime import (datetime, timedelta)
 from typing import Dict, Optional
@@ -27,7 +30,9 @@ from mock import patch
 from pygments import (formatters, lexers)
 from pytest import mark, raises
 
-from hubugs import template
+from hubugs import (models, template)
+
+from tests import fixtures
 
 
 @mark.parametrize('fg, bg, attributes, expected', [
@@ -130,3 +135,122 @@ def test_jinja_filter(monkeypatch):
 
     template.jinja_filter(null_func)
     assert template.ENV.filters['null_func'] == null_func
+
+
+def test_template_fields():
+    assert template.template_fields('view', 'list.txt') == \
+        {'labels', 'milestone', 'number', 'title'}
+    assert template.listing_fields() >= {'number', 'state', 'updated_at'}
+
+
+def test_template_sources():
+    sources = template.template_sources('view', 'issue.txt')
+    names = [os.path.basename(f) for f, _ in sources]
+    assert names == ['issue.txt', 'theme.txt']
+    assert all(mtime for _, mtime in sources)
+
+
+def test_record_relative_times():
+    stamp = datetime.utcnow() - timedelta(hours=3)
+    with template.record_relative_times() as stamps:
+        text = template.ENV.from_string(
+            '{{ stamp | relative_time }}').render(stamp=stamp)
+    assert text == 'about three hours ago'
+    assert [t for _, t in stamps] == [text, ]
+    assert template.relative_times_current(stamps)
+    # Output from the distant past is stale
+    assert not template.relative_times_current([(0, 'right now'), ])
+
+
+@mark.parametrize('source, expected', [
+    ('{% for b in bugs %}{{ b.title }}{{ b["state"] }}{% endfor %}'
+     '{{ bugs | length }}',
+     {'title', 'state'}),
+    ('{% for b in bugs %}{{ b }}{% endfor %}', None),
+    ('{% for b in bugs %}{{ b | tojson }}{% endfor %}', None),
+    ('{{ bugs[0].title }}', None),
+    ('{% include "other.txt" %}', None),
+    ('{% import "theme.txt" as theme with context %}', None),
+])
+def test_template_fields_source(source: str, expected):
+    assert template._fields(source, 'bugs') == expected
+
+
+def test_decode_fields():
+    data = b'[{"number": 1, "title": "t", "body": "b", "user": {"id": 1}}]'
+    bugs = models.decode(data, 'Issue', fields={'number', 'title'})
+    assert bugs[0]._fields == ('number', 'title')
+    data = b'{"total_count": 1, "items": [{"number": 1, "body": "b"}]}'
+    result = models.decode(data, 'Issue', fields={'number', })
+    assert result.total_count == 1
+    assert result.items[0]._fields == ('number', )
+
+
+def test_model_hash():
+    data = b'[{"name": "bug", "color": "fc2929"}]'
+    first, second = models.decode(data, 'Label')[0], \
+        models.decode(data, 'Label')[0]
+    assert first == second
+    assert len({first, second}) == 1
+    with raises(TypeError):
+        hash(models.decode(b'{"labels": []}', 'Issue'))
+
+
+@mark.parametrize('decoder', list(models.DECODERS))
+def test_decode_lazy(decoder: str, monkeypatch):
+    monkeypatch.setattr(models, 'DECODER', decoder)
+    data = (b'{"number": 1, "created_at": "2018-01-02T03:04:05Z", "body": "",'
+            b' "reactions": {"+1": 2, "_links": {}},'
+            b' "labels": [{"name": "b"}]}')
+    bug = models.decode(data, 'Issue')
+    assert 'created_at' not in vars(bug)
+    assert bug.created_at == datetime(2018, 1, 2, 3, 4, 5)
+    assert bug.body == ''
+    assert bug.reactions._fields == ('_0', )
+    assert bug.reactions._0 == 2
+    assert bug.labels[0].name == 'b'
+    assert 'number' not in vars(bug)
+    assert bug == pickle.loads(pickle.dumps(bug))
+
+
+@mark.parametrize('count, repos, max_title, extras', [
+    (1, False, 78, {'state': 'open'}),
+    (9, False, 20, {'state': 'all', 'term': 'crash'}),
+    (120, True, 40, {'state': None}),
+    (120, False, 200, {}),
+])
+def test_list_formatter(count: int, repos: bool, max_title: int,
+                        extras: Dict[str, str]):
+    data = fixtures.issues(count)
+    data[0]['title'] = 'Ünïcode title'
+    data[0]['labels'] = [{'name': 'x' * 50}, {'name': 'bug'}]
+    bugs = models.decode(fixtures.dumps(data), 'Issue')
+    names = ['JNRowe/hubugs', 'a/b'] * count if repos else None
+    id_len = len(str(count))
+    kwargs = dict(bugs=bugs, spacer=' ' * (id_len - 2), id_len=id_len,
+                  max_title=max_title, repos=names,
+                  repo_len=14 if repos else 0, **extras)
+    formatter = template.list_formatter()
+    assert isinstance(formatter, template.ListFormatter)
+    expected = template.get_template('view', 'list.txt').render(**kwargs)
+    assert formatter.render(**kwargs) == expected
+
+
+def test_list_formatter_custom_templates(monkeypatch):
+    monkeypatch.setattr(template, 'get_template', lambda g, n: namedtuple(
+        'FakeTemplate', 'name filename')('custom/view/list.txt', 'list.txt'))
+    assert template.list_formatter() is None
+
+
+def test_render_batch(monkeypatch):
+    data = fixtures.issues(6)
+    contexts = [dict(bug=bug, comments=models.wrap(fixtures.comments(issue),
+                                                   'Comment'),
+                     full=True, patch=None, patch_only=False, project=None)
+                for issue, bug in zip(data, models.wrap(data, 'Issue'))]
+    name = 'default/view/issue.txt'
+    expected = template.render_batch(name, contexts)
+    assert [text for text, _ in expected] \
+        == [template.ENV.get_template(name).render(**c) for c in contexts]
+    monkeypatch.setattr(template, 'POOL_MIN_BATCH', 2)
+    assert template.render_batch(name, contexts, workers=3) == expected
@@ -0,0 +1,98 @@
+#
+"""test_timeline - Test cached issue timelines."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+
+from click.testing import CliRunner
+from pytest import fixture
+
+import hubugs
+
+from hubugs import (timeline, utils)
+
+from tests import fixtures
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def server(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 5), ], max_age=0) as server:
+        project = server.projects['JNRowe/hubugs']
+        project.timelines[1] = fixtures.timeline(project.issues[1], 250)
+        yield server
+
+
+@fixture
+def globs(server):
+    globs = utils.setup_environment('JNRowe/hubugs', server.url)
+    globs.update(host_url=server.url, project='JNRowe/hubugs')
+    return globs
+
+
+def test_fetch(globs, server):
+    events, stats = timeline.fetch(globs, 1)
+    assert events == server.projects['JNRowe/hubugs'].timelines[1]
+    assert stats == {'pages': 3, 'new': 250}
+
+
+def test_fetch_incremental(globs, server):
+    timeline.fetch(globs, 1)
+    events = server.projects['JNRowe/hubugs'].timelines[1]
+    events.extend(fixtures.timeline(server.projects['JNRowe/hubugs'].issues[1],
+                                    60, seed=7)[:60])
+    for n, event in enumerate(events[250:]):
+        event['id'] = n
+    globs.req_memo.invalidate()
+    events, stats = timeline.fetch(globs, 1)
+    assert len(events) == 310
+    # Only the page holding the newest cached event, and those after it
+    assert stats == {'pages': 2, 'new': 60}
+    assert events == server.projects['JNRowe/hubugs'].timelines[1]
+
+
+def test_fetch_rewritten(globs, server):
+    timeline.fetch(globs, 1)
+    del server.projects['JNRowe/hubugs'].timelines[1][220]
+    # A later invocation has no memoised responses
+    globs.req_memo.invalidate()
+    events, stats = timeline.fetch(globs, 1)
+    assert events == server.projects['JNRowe/hubugs'].timelines[1]
+    # The changed page, and then the full timeline
+    assert stats == {'pages': 4, 'new': 0}
+
+
+def test_prepare():
+    issue = fixtures.issues(1)[0]
+    events = timeline.prepare(fixtures.timeline(issue, 20))
+    assert all(e['actor']['login'] in fixtures.LOGINS for e in events)
+    assert all(e['created_at'].year >= 2012 for e in events)
+
+
+def test_show_history(server):
+    args = ['--host-url', server.url, '--project', 'JNRowe/hubugs', 'show',
+            '--history']
+    result = CliRunner().invoke(hubugs.cli, args + ['1', ])
+    assert result.exit_code == 0
+    assert 'History: 250 events' in result.output
+    result = CliRunner().invoke(hubugs.cli, args + ['-F', 'json', '1'])
+    assert len(json.loads(result.output)[0]['timeline']) == 250
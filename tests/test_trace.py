@@ -0,0 +1,63 @@
+#
+"""test_trace - Test request tracing support."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from hubugs import (models, template, trace)
+
+
+def test_span_disabled():
+    with trace.span('test', size=1) as event:
+        event['status'] = 200
+    assert trace.TRACER is None
+
+
+def test_span_records_late_args():
+    tracer = trace.enable()
+    try:
+        with trace.span('GET', 'http', url='http://localhost') as event:
+            event['status'] = 304
+    finally:
+        trace.disable()
+    event = tracer.events[-1]
+    assert event['ph'] == 'X'
+    assert event['cat'] == 'http'
+    assert event['args'] == {'url': 'http://localhost', 'status': 304}
+
+
+def test_disable_writes_trace(tmpdir):
+    path = str(tmpdir.join('trace.json'))
+    trace.enable()
+    models.decode(b'{"number": 1}', 'Issue')
+    trace.disable(path)
+    with open(path) as f:
+        data = json.load(f)
+    names = [e['name'] for e in data['traceEvents']]
+    assert names == ['process_name', 'decode']
+    assert data['traceEvents'][1]['args'] == {'model': 'Issue', 'bytes': 13}
+
+
+def test_render_span():
+    tracer = trace.enable()
+    try:
+        template.ENV.from_string('{{ 1 }}').render()
+    finally:
+        trace.disable()
+    assert tracer.events[-1]['cat'] == 'template'
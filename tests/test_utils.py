@@ -18,9 +18,16 @@
 # You should have received a copy of the GNU General Public License along with
 # hubugs.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import threading
+import time
+
+from concurrent import futures
 from subprocess import CalledProcessError
 from typing import Optional
 
+import httplib2
+
 from click import BadParameter
 from pytest import mark, raises
 
@@ -129,3 +136,80 @@ def test_GetRepo_config_project(monkeypatch):
                         lambda *args, **kwargs: 'JNRowe/misc-overlay')
 
     assert utils.get_repo() == 'JNRowe/misc-overlay'
+
+
+def test_page_urls():
+    urls = utils.page_urls('https://api.github.com/x?per_page=100&page=2',
+                           'https://api.github.com/x?per_page=100&page=4')
+    assert urls == ['https://api.github.com/x?per_page=100&page={}'.format(n)
+                    for n in (2, 3, 4)]
+
+
+def test_SingleFlight_coalesces():
+    flight = utils.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(True)
+        release.wait()
+        return 'result'
+
+    with futures.ThreadPoolExecutor(4) as executor:
+        pending = [executor.submit(flight.do, 'key', slow) for _ in range(4)]
+        time.sleep(0.1)
+        release.set()
+        results = [f.result() for f in pending]
+    assert len(calls) == 1
+    assert sorted(how for _, how in results) == ['called', 'shared', 'shared',
+                                                 'shared']
+    assert flight.do('key', slow) == ('result', 'memoised')
+    flight.invalidate()
+    assert flight.do('key', slow) == ('result', 'called')
+
+
+def test_SingleFlight_errors_not_memoised():
+    flight = utils.SingleFlight()
+
+    def fail():
+        raise OSError('network down')
+
+    with raises(OSError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 1) == (1, 'called')
+    assert flight.do('other', lambda: 2, lambda r: False) == (2, 'called')
+    assert flight.do('other', lambda: 3) == (3, 'called')
+
+
+def test_cached_get_server_error(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+
+    class BadGateway:
+        network_requests = 0
+
+        def request(self, *args, **kwargs):
+            return httplib2.Response({'status': '502'}), b'Bad gateway'
+    monkeypatch.setattr(utils, 'get_github_api', BadGateway)
+    env = utils.setup_environment('JNRowe/hubugs', 'https://api.github.com')
+    with raises(EnvironmentError):
+        env.cached_get('repo', 'https://api.github.com/repos/JNRowe/hubugs')
+    assert not os.path.exists(env.metadata._path('repo'))
+
+
+@mark.parametrize('setting, expected, warned', [
+    ('86400', 86400, False),
+    ('a day', 3600, True),
+    ('-1', 3600, True),
+])
+def test_metadata_ttl(setting: str, expected: int, warned: bool, tmpdir,
+                      monkeypatch, capfd):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    get_git_config_val = utils.get_git_config_val
+    monkeypatch.setattr(utils, 'get_git_config_val', lambda key, *args: (
+        setting if key == 'hubugs.metadata-ttl'
+        else get_git_config_val(key, *args)))
+    env = utils.setup_environment('JNRowe/hubugs', 'https://api.github.com')
+    assert env.metadata.ttl == expected
+    assert ('Invalid hubugs.metadata-ttl' in capfd.readouterr().err) == warned
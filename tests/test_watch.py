@@ -0,0 +1,84 @@
+#
+"""test_watch - Test issue watching."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+from pytest import fixture
+
+from hubugs import (utils, watch)
+
+from tests.fakehub import FakeHub, Project
+
+
+@fixture
+def server():
+    with FakeHub([Project('JNRowe/hubugs', 20), ], poll_interval=90) as server:
+        yield server
+
+
+@fixture
+def globs(server, tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    globs = utils.setup_environment('JNRowe/hubugs', server.url)
+    globs.update({'host_url': server.url, 'project': 'JNRowe/hubugs'})
+    return globs
+
+
+def test_initial_listing(globs, server):
+    watcher = watch.Watcher(globs, params={'state': 'open'})
+    bugs = watcher.poll()
+    assert len(bugs) == sum(i['state'] == 'open' for i in
+                            server.projects['JNRowe/hubugs'].issues.values())
+    assert all(b['state'] == 'open' for b in bugs)
+
+
+def test_unchanged_poll(globs, server):
+    watcher = watch.Watcher(globs)
+    watcher.poll()
+    server.reset_stats()
+    assert watcher.poll() == []
+    assert server.total_requests == 1
+    assert server.not_modified == 1
+    assert watcher.not_modified == 1
+
+
+def test_poll_interval(globs):
+    watcher = watch.Watcher(globs, interval=10)
+    assert watcher.delay == 10
+    watcher.poll()
+    assert watcher.poll_interval == 90
+    assert watcher.delay == 90
+
+
+def test_changed_issues(globs):
+    watcher = watch.Watcher(globs, params={'state': 'open'})
+    watcher.poll()
+    globs.req_post('3/comments', body={'body': 'Test'}, model='Comment')
+    globs.req_post(4, body={'state': 'closed'}, model='Issue')
+    assert sorted(b['number'] for b in watcher.poll()) == [3, 4]
+    assert watcher.poll() == []
+
+
+def test_comments(globs):
+    watcher = watch.Watcher(globs, bug=3)
+    watcher.poll()
+    globs.req_post('3/comments', body={'body': 'Test'}, model='Comment')
+    assert [c['body'] for c in watcher.poll()] == ['Test', ]
+    assert watcher.poll() == []
+    assert watcher.not_modified == 1
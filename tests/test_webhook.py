@@ -0,0 +1,175 @@
+#
+"""test_webhook - Test webhook receiver and local issue store."""
+# Copyright © 2018  James Rowe <jnrowe@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0+
+#
+# This file is part of hubugs.
+#
+# hubugs is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# hubugs is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# hubugs.  If not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import json
+import os
+import threading
+
+from http.client import HTTPConnection
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from click.testing import CliRunner
+from pytest import fixture, mark, raises
+
+import hubugs
+
+from hubugs import (store, utils, webhook)
+
+from tests.fakehub import FakeHub, Project
+
+SECRET = 'It’s a secret to everybody'
+
+PAYLOADS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'data',
+                                         'webhooks', '*.json')))
+
+
+def deliver(__url, __event, __payload, secret=SECRET):
+    body = json.dumps(__payload).encode()
+    request = Request(__url, data=body, headers={
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': __event,
+        'X-Hub-Signature-256': webhook.signature(secret.encode(), body),
+    })
+    with urlopen(request) as response:
+        return response.status
+
+
+@fixture
+def db(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    db = store.IssueStore('https://api.github.com')
+    yield db
+    db.close()
+
+
+@fixture
+def server(db):
+    server = webhook.WebhookServer(('127.0.0.1', 0), SECRET, db)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def replay(__server):
+    statuses = []
+    for path in PAYLOADS:
+        with open(path) as f:
+            delivery = json.load(f)
+        statuses.append(deliver(__server.url, delivery['event'],
+                                delivery['payload']))
+    return statuses
+
+
+def test_signature():
+    body = b'{"zen": "Design for failure."}'
+    header = webhook.signature(b'secret', body)
+    assert header.startswith('sha256=')
+    assert webhook.verify(b'secret', body, header)
+    assert not webhook.verify(b'secret', body + b' ', header)
+    assert not webhook.verify(b'secret', body, None)
+
+
+def test_invalid_signature(server):
+    with raises(HTTPError) as error:
+        deliver(server.url, 'issues', {}, secret='guess')
+    assert error.value.code == 401
+    assert server.received == 0
+
+
+@mark.parametrize('length', ['-5', 'many'])
+def test_invalid_length(server, length):
+    connection = HTTPConnection(*server.server_address[:2], timeout=5)
+    connection.putrequest('POST', '/')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    assert connection.getresponse().status == 400
+    connection.close()
+    assert server.received == 0
+
+
+def test_replay(server, db):
+    statuses = replay(server)
+    assert statuses[0] == 200
+    assert statuses[-1] == 202
+    assert server.applied == len(PAYLOADS) - 2
+
+    issue = db.issue('JNRowe/hubugs', 101)
+    # The stale edit must not have replaced the newer copy
+    assert issue['title'] == 'Pager swallows colour output'
+    assert issue['state'] == 'closed'
+    assert [label['name'] for label in issue['labels']] == ['defect', ]
+    assert issue['milestone']['title'] == 'v0.17.0'
+    assert db.comments('JNRowe/hubugs', 101) == []
+    assert [label['name'] for label in db.labels('JNRowe/hubugs')] \
+        == ['defect', ]
+    assert len(db.milestones('JNRowe/hubugs')) == 1
+    assert db.issues('JNRowe/hubugs') == []
+    assert len(db.issues('JNRowe/hubugs', 'closed', ['defect', ])) == 1
+
+
+def test_replay_idempotent(server, db):
+    replay(server)
+    replay(server)
+    assert len(db.issues('JNRowe/hubugs', 'all')) == 1
+
+
+def test_local_commands(server, db, monkeypatch):
+    replay(server)
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    runner = CliRunner()
+    args = ['--host-url', 'https://api.github.com', '--project',
+            'JNRowe/hubugs', '--local']
+    result = runner.invoke(hubugs.cli, args + ['list', '--state', 'all'])
+    assert result.exit_code == 0
+    assert 'Pager swallows colour output' in result.output
+    result = runner.invoke(hubugs.cli, args + ['search', '--state', 'all',
+                                               'pager colour'])
+    assert 'Pager swallows colour output' in result.output
+    result = runner.invoke(hubugs.cli, args + ['search', 'colour'])
+    assert 'No bugs found' in result.output
+    result = runner.invoke(hubugs.cli, args + ['show', '-F', 'jsonl', '101'])
+    assert json.loads(result.output)['state'] == 'closed'
+    result = runner.invoke(hubugs.cli, args + ['label', '--list'])
+    assert result.output.strip() == 'defect'
+    result = runner.invoke(hubugs.cli, args + ['comment', '-m', 'Hi', '101'])
+    assert isinstance(result.exception, store.LocalError)
+
+
+def test_sync(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setenv('HUBUGS_TOKEN', 'fake')
+    with FakeHub([Project('JNRowe/hubugs', 40), ]) as fake:
+        globs = utils.setup_environment('JNRowe/hubugs', fake.url)
+        globs.host_url = fake.url
+        db = store.IssueStore(fake.url)
+        counts = db.sync(globs, 'JNRowe/hubugs')
+    project = fake.projects['JNRowe/hubugs']
+    assert counts['issues'] == 40
+    assert counts['comments'] == sum(len(c) for c in
+                                     project.comments.values())
+    assert len(db.issues('JNRowe/hubugs', 'all')) == 40
+    assert db.repository('JNRowe/hubugs')['full_name'] == 'JNRowe/hubugs'
+    number = next(n for n, c in project.comments.items() if c)
+    assert len(db.comments('JNRowe/hubugs', number)) == \
+        len(project.comments[number])